@@ -3,7 +3,9 @@ from python_chess.chess import pop_count
 import antichess_board
 import endgame
 import minmax
+import telemetry
 
+import os
 import random
 import sys
 from time import time
@@ -52,13 +54,37 @@ def print_legal_moves(board):
         print move
 
 
+def pop_option(args, name, env=None):
+    # Removes "name value" from args. Returns the value, by default that of
+    # the environment variable env, and the other args.
+    if name in args[:-1]:
+        i = args.index(name)
+        return args[i + 1], args[:i] + args[i + 2:]
+    return os.environ.get(env) if env else None, args
+
+
 if __name__ == "__main__":
     args = sys.argv
 
     # Commandline Parse
 
+    # --profile DIR profiles every search, same as ANTICHESS_PROFILE=DIR.
+    profile_dir, args = pop_option(args, "--profile")
+    if profile_dir:
+        os.environ[minmax.PROFILE_ENV] = profile_dir
+
+    # --tablebases DIR plays and searches with the tables of tablebase.py.
+    tablebases_dir, args = pop_option(args, "--tablebases", minmax.TABLEBASE_ENV)
+    if tablebases_dir:
+        os.environ[minmax.TABLEBASE_ENV] = tablebases_dir
+
+    # Per move records as JSON lines and Prometheus metrics, never on stdout.
+    telemetry_path, args = pop_option(args, "--telemetry", "ANTICHESS_TELEMETRY")
+    metrics_path, args = pop_option(args, "--metrics", "ANTICHESS_METRICS")
+
     if len(args) < 2:
-        print "Usage: antichess <colour>"
+        print "Usage: antichess <colour> [seconds per move] [--profile <dir>]"
+        print "    [--tablebases <dir>] [--telemetry <file.jsonl>] [--metrics <file.prom>]"
         print "One of (b, w, black, white)"
         exit(0)
 
@@ -66,10 +92,15 @@ if __name__ == "__main__":
 
     if colour != 'w' and colour != 'b' and \
             colour != 'white' and colour != 'black':
-        print "Usage: antichess <colour>"
+        print "Usage: antichess <colour> [seconds per move] [--profile <dir>]"
+        print "    [--tablebases <dir>] [--telemetry <file.jsonl>] [--metrics <file.prom>]"
         print "One of (b, w, black, white)"
         exit(0)
 
+    # Time budget per move. Without one the search runs to a fixed depth.
+    move_time = float(args[2]) if len(args) > 2 else None
+    MAX_DEPTH = 20
+
     # Player colour
     is_white = (colour == 'w' or colour == 'white')
     first_move = True
@@ -78,58 +109,85 @@ if __name__ == "__main__":
     # Initialize the board
     board = antichess_board.AntichessBoard()
 
-    # Input loop
-    while not board.is_game_over():
-        if is_white == board.turn:
-            # It's our turn
-            use_default = False
-
-            while True:
-                endgame_type = get_endgame_type(board)
-
-                if not use_default and endgame_type and endgame_type <= 4:
-                    eg = endgame.EndgameBase(board, endgame_type)
-                    move = eg.get_best_move(board)
-                elif first_move and is_white:
-                    move = DEFAULT_FIRST_MOVE
-                    first_move = False
-                else:
-                    ab = minmax.AlphaBeta(4, 1000, board)
-                    move = str(ab.get_best_move(board))
-
-                try:
-                    m = board.push_uci(move)
-                    print(m.uci())
-                    break
-                except ValueError:
-                    use_default = True
-                    # print ("Illegal Move: %s" % move)
-                    # print_legal_moves(board)
-
-                    continue
-        else:
-            # Not our turn wait for their input
-            while True:
-                enemy_move = raw_input()
-
-                # rand_move = random.randint(2, 3)
-
-                # if rand_move == 1:
-                #     enemy_move = make_random_move(board)
-                # else:
-                #     ab = minmax.AlphaBeta(3, 100, board)
-                #     enemy_move = str(ab.get_best_move(board))
-
-                try:
-                    m = board.push_uci(enemy_move)
-                    break
-                except ValueError:
-                    # print ("Illegal Move: %s" % enemy_move)
-                    # print_legal_moves(board)
-                    continue
-
-        # print board
-        # print("")
+    # Search processes live for the whole game
+    search_pool = minmax.SearchPool()
+
+    tablebases = minmax.default_tablebases()
+
+    moves_telemetry = telemetry.Telemetry(telemetry_path or None, metrics_path or None)
+
+    try:
+        # Input loop
+        while not board.is_game_over():
+            if is_white == board.turn:
+                # It's our turn
+                use_default = False
+
+                while True:
+                    start = time()
+                    endgame_type = get_endgame_type(board)
+                    ab = None
+                    tablebase_move = tablebases.best_move(board) if tablebases is not None else None
+
+                    if tablebase_move is not None:
+                        move = tablebase_move.uci()
+                        path = telemetry.PATH_TABLEBASE
+                    elif not use_default and endgame_type and endgame_type <= 4:
+                        eg = endgame.EndgameBase(board, endgame_type)
+                        move = eg.get_best_move(board)
+                        path = telemetry.PATH_ENDGAME
+                    elif first_move and is_white:
+                        move = DEFAULT_FIRST_MOVE
+                        first_move = False
+                        path = telemetry.PATH_OPENING
+                    else:
+                        ab = minmax.AlphaBeta(4, 1000, board, pool=search_pool)
+                        if move_time is None:
+                            move = str(ab.get_best_move(board))
+                        else:
+                            move = str(ab.get_best_move(board, time_limit=move_time, max_depth=MAX_DEPTH))
+                        path = telemetry.PATH_SEARCH
+
+                    try:
+                        record = telemetry.move_record(board, move, path, time() - start, endgame_type, ab, move_time)
+                        m = board.push_uci(move)
+                        print(m.uci())
+                        sys.stdout.flush()
+                        moves_telemetry.record(record)
+                        break
+                    except ValueError:
+                        use_default = True
+                        # print ("Illegal Move: %s" % move)
+                        # print_legal_moves(board)
+
+                        continue
+            else:
+                # Not our turn wait for their input
+                while True:
+                    enemy_move = raw_input()
+
+                    # rand_move = random.randint(2, 3)
+
+                    # if rand_move == 1:
+                    #     enemy_move = make_random_move(board)
+                    # else:
+                    #     ab = minmax.AlphaBeta(3, 100, board)
+                    #     enemy_move = str(ab.get_best_move(board))
+
+                    try:
+                        m = board.push_uci(enemy_move)
+                        break
+                    except ValueError:
+                        # print ("Illegal Move: %s" % enemy_move)
+                        # print_legal_moves(board)
+                        continue
+
+            # print board
+            # print("")
+    finally:
+        moves_telemetry.close()
+
+    search_pool.close()
 
     # print("GAME OVER!")
     # print(board.result())
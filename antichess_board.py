@@ -9,9 +9,59 @@ class AntichessBoard(chess.Board):
     aliases = ["Anti", "Antichess"]
     uci_variant = "anti"
 
+    # Kept up to date with the pieces when set, see set_evaluator().
+    evaluator = None
+
     def __init__(self, fen=STARTING_FEN, chess960=False):
         super(AntichessBoard, self).__init__(fen, chess960)
 
+    def set_evaluator(self, evaluator):
+        """
+        Attaches an incremental evaluator, which gets ``add()`` and
+        ``remove()`` calls for every piece put on or taken off the board and
+        ``reset()`` when the board is set up again. Its ``state`` is saved
+        on push and restored on pop.
+        """
+        self.evaluator = evaluator
+        self._evaluator_stack = []
+
+    def _remove_piece_at(self, square):
+        if self.evaluator is not None:
+            piece_type = self.piece_type_at(square)
+            if piece_type:
+                self.evaluator.remove(square, piece_type, bool(self.occupied_co[WHITE] & BB_SQUARES[square]))
+        super(AntichessBoard, self)._remove_piece_at(square)
+
+    def _set_piece_at(self, square, piece_type, color, promoted=False):
+        super(AntichessBoard, self)._set_piece_at(square, piece_type, color, promoted)
+        if self.evaluator is not None:
+            self.evaluator.add(square, piece_type, color)
+
+    def _reset_board(self):
+        super(AntichessBoard, self)._reset_board()
+        if self.evaluator is not None:
+            self.evaluator.reset(self)
+
+    def _clear_board(self):
+        super(AntichessBoard, self)._clear_board()
+        if self.evaluator is not None:
+            self.evaluator.reset(self)
+
+    def push(self, move):
+        if self.evaluator is not None:
+            self._evaluator_stack.append(self.evaluator.state[:])
+        super(AntichessBoard, self).push(move)
+
+    def pop(self):
+        move = super(AntichessBoard, self).pop()
+        if self.evaluator is not None:
+            if self._evaluator_stack:
+                self.evaluator.state = self._evaluator_stack.pop()
+            else:
+                # Pushed before the evaluator was attached.
+                self.evaluator.reset(self)
+        return move
+
     def is_legal(self, move):
         if not super(AntichessBoard, self).is_legal(move):
             return False
@@ -19,33 +69,64 @@ class AntichessBoard(chess.Board):
         if self.is_capture(move):
             return True
         else:
-            return not any(self.generate_legal_captures())
-
-    def generate_evasions(self, from_mask=chess.BB_ALL, to_mask=chess.BB_ALL):
-        all_evasions = []
-        capture_evasions = []
-        for move in super(AntichessBoard, self).generate_evasions(from_mask, to_mask):
-            if self.is_capture(move):
-                capture_evasions.append(move)
-            all_evasions.append(move)
-
-        if capture_evasions:
-            return iter(capture_evasions)
+            return not self.has_capture()
+
+    def has_capture(self):
+        """Checks if the side to move has a legal capture, which it must make."""
+        if not self._may_capture():
+            return False
+        return any(self.generate_legal_captures())
+
+    def _may_capture(self):
+        # Cheap test on the attacked squares, shared with the rest of the
+        # position info, that rules out captures in most positions without
+        # captures. Pins and checks are not considered.
+        their_pieces = self.occupied_co[not self.turn]
+        if self.ep_square:
+            their_pieces |= BB_SQUARES[self.ep_square]
+
+        return bool(self.attacked_mask(self.turn) & their_pieces)
+
+    def _generate_captures(self, generate, from_mask, to_mask):
+        their_pieces = self.occupied_co[not self.turn]
+        if self.ep_square:
+            to_mask &= their_pieces | BB_SQUARES[self.ep_square]
         else:
-            return iter(all_evasions)
-
-    def generate_non_evasions(self, from_mask=chess.BB_ALL, to_mask=chess.BB_ALL):
-        all_non_evasions = []
-        capture_non_evasions = []
-        for move in super(AntichessBoard, self).generate_non_evasions(from_mask, to_mask):
-            if self.is_capture(move):
-                capture_non_evasions.append(move)
-            all_non_evasions.append(move)
-
-        if capture_non_evasions:
-            return iter(capture_non_evasions)
+            to_mask &= their_pieces
+
+        for move in generate(from_mask, to_mask):
+            # Other moves to the en passant square are not captures.
+            if BB_SQUARES[move.to_square] & their_pieces or self.is_en_passant(move):
+                yield move
+
+    def _generate_staged(self, generate, from_mask, to_mask):
+        # Captures first. Quiet moves only if there are no captures at all.
+        if self._may_capture():
+            captures = list(self._generate_captures(generate, from_mask, to_mask))
+            if captures:
+                return iter(captures)
+
+            if from_mask != BB_ALL or to_mask != BB_ALL:
+                if any(self._generate_captures(generate, BB_ALL, BB_ALL)):
+                    return iter(())
+
+        return generate(from_mask, to_mask)
+
+    def generate_legal_captures(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        if not self._may_capture():
+            return iter(())
+
+        if self.is_check():
+            generate = super(AntichessBoard, self).generate_evasions
         else:
-            return iter(all_non_evasions)
+            generate = super(AntichessBoard, self).generate_non_evasions
+        return self._generate_captures(generate, from_mask, to_mask)
+
+    def generate_evasions(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        return self._generate_staged(super(AntichessBoard, self).generate_evasions, from_mask, to_mask)
+
+    def generate_non_evasions(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        return self._generate_staged(super(AntichessBoard, self).generate_non_evasions, from_mask, to_mask)
 
 
     def __str__(self):
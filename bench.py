@@ -0,0 +1,217 @@
+"""
+Search benchmark. Runs the engine, as antichess.py plays it, over the
+positions of data/bench-<version>.epd to a fixed depth.
+
+    python bench.py [--depth N] [--factor N] [--seed N] [--json]
+                    [--baseline FILE] [--threshold FRACTION] [--save-baseline]
+
+Positions of the endgames antichess.py plays by rule go to EndgameBase,
+with a random.Random seeded with --seed for its tie-breaks. The others
+are searched one iteration per depth in this process, so the node counts
+are the same on every run.
+
+Reports the nodes (search and quiescence), nodes per second, the time to
+complete every depth and the best move of every position. The run is
+compared with the baseline JSON, by default data/bench-baseline.json, and
+the exit status is 1 if the nodes or any best move differ from it. Nodes
+per second depend on the machine, so they only fail the run if they
+dropped by more than --threshold from a baseline saved on the same
+machine. --save-baseline stores the run as the new baseline, for a local
+speed baseline give it its own --baseline file.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import antichess
+import antichess_board
+import endgame
+import minmax
+from python_chess import chess
+
+BENCH_VERSION = 1
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BENCH_EPD = os.path.join(DATA_DIR, "bench-%d.epd" % BENCH_VERSION)
+BENCH_BASELINE = os.path.join(DATA_DIR, "bench-baseline.json")
+
+# Depth and factor of antichess.py.
+DEFAULT_DEPTH = 4
+DEFAULT_FACTOR = 1000
+DEFAULT_SEED = 2017
+DEFAULT_THRESHOLD = 0.1
+
+
+def read_positions(path=BENCH_EPD):
+    """Returns the id and FEN of every position of the EPD file."""
+    positions = []
+    with open(path) as data:
+        for line in data:
+            if not line.strip() or line.startswith("#"):
+                continue
+            board, extra = antichess_board.AntichessBoard.from_epd(line)
+            positions.append((extra.get("id", str(len(positions) + 1)), board.fen()))
+    return positions
+
+
+def bench_position(fen, depth, factor, seed):
+    """
+    Finds the best move of one position. Returns a dict with the move, the
+    score, the nodes and the seconds taken, in total and to complete every
+    depth.
+    """
+    board = antichess_board.AntichessBoard(fen)
+    start = time.time()
+
+    endgame_type = antichess.get_endgame_type(board)
+    if endgame_type:
+        move = endgame.EndgameBase(board, endgame_type, random.Random(seed)).get_best_move(board)
+        return {
+            "move": move,
+            "score": None,
+            "nodes": 0,
+            "seconds": time.time() - start,
+            "time_to_depth": [],
+        }
+
+    board = minmax.to_search_board(board)
+    ab = minmax.AlphaBeta(depth, factor, board)
+    counted = [0]
+
+    def search(alpha, beta):
+        # search_root starts counting from zero, also when the aspiration
+        # window is widened.
+        try:
+            return ab.search_root(board, alpha, beta)
+        finally:
+            counted[0] += ab.nodes
+
+    score = move = None
+    time_to_depth = []
+    for iteration in range(1, depth + 1):
+        ab.depth = iteration
+        score, move = ab._aspiration_search(search, score)
+        time_to_depth.append(time.time() - start)
+
+    return {
+        "move": chess.MOVES[move].uci(),
+        "score": score,
+        "nodes": counted[0] + ab.qsearch.nodes,
+        "seconds": time.time() - start,
+        "time_to_depth": time_to_depth,
+    }
+
+
+def run(positions, depth=DEFAULT_DEPTH, factor=DEFAULT_FACTOR, seed=DEFAULT_SEED, out=None):
+    """
+    Benchmarks every (id, FEN) of *positions*. Progress is written to *out*,
+    if given.
+    """
+    results = []
+    time_to_depth = [0.0] * depth
+    for position_id, fen in positions:
+        # Nothing else should depend on it, but seed it anyway.
+        random.seed(seed)
+        result = bench_position(fen, depth, factor, seed)
+        result["id"] = position_id
+        result["fen"] = fen
+        result["nps"] = int(result["nodes"] / result["seconds"]) if result["seconds"] else None
+        results.append(result)
+
+        for i, seconds in enumerate(result["time_to_depth"]):
+            time_to_depth[i] += seconds
+
+        if out is not None:
+            out.write("%-22s %-6s %8d nodes %7.3fs %9s nps\n" % (
+                position_id, result["move"], result["nodes"], result["seconds"], result["nps"]))
+            out.flush()
+
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    return {
+        "version": BENCH_VERSION,
+        "machine": platform.node(),
+        "depth": depth,
+        "factor": factor,
+        "seed": seed,
+        "positions": results,
+        "nodes": nodes,
+        "seconds": seconds,
+        "nps": int(nodes / seconds) if seconds else None,
+        "time_to_depth": time_to_depth,
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares a report with a baseline report of the same settings. Returns
+    the best move agreement, whether the nodes or best moves drifted and,
+    if the baseline was saved on the same machine, whether the nodes per
+    second dropped by more than *threshold*, a fraction.
+    """
+    for key in ["version", "depth", "factor", "seed"]:
+        if report[key] != baseline[key]:
+            raise ValueError("baseline has {0} {1}, not {2}".format(key, baseline[key], report[key]))
+
+    baseline_moves = dict((result["id"], result["move"]) for result in baseline["positions"])
+    agree = sum(1 for result in report["positions"] if baseline_moves.get(result["id"]) == result["move"])
+    same_machine = baseline.get("machine") == report["machine"]
+
+    return {
+        "best_move_agreement": float(agree) / len(report["positions"]) if report["positions"] else 1.0,
+        "nodes_change": report["nodes"] - baseline["nodes"],
+        "drift": report["nodes"] != baseline["nodes"] or agree < len(report["positions"]),
+        "nps_change": float(report["nps"]) / baseline["nps"] - 1,
+        "nps_compared": same_machine,
+        "regression": same_machine and report["nps"] < baseline["nps"] * (1 - threshold),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Antichess search benchmark.")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--factor", type=int, default=DEFAULT_FACTOR)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--epd", default=BENCH_EPD)
+    parser.add_argument("--baseline", default=BENCH_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail if the nodes per second drop by more than this fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(read_positions(args.epd), args.depth, args.factor, args.seed,
+                 None if args.json else sys.stdout)
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report["baseline"] = compare(report, json.load(f), args.threshold)
+        if report["baseline"]["drift"] or report["baseline"]["regression"]:
+            status = 1
+
+    if args.json:
+        print json.dumps(report, indent=2, sort_keys=True)
+    else:
+        print "%d nodes in %.3fs, %s nps" % (report["nodes"], report["seconds"], report["nps"])
+        print "time to depth: %s" % " ".join("%d: %.3fs" % (depth + 1, seconds)
+                                             for depth, seconds in enumerate(report["time_to_depth"]))
+        if "baseline" in report:
+            comparison = report["baseline"]
+            print "baseline: best move agreement %.0f%%, nodes %+d, nps %+.1f%%%s%s%s" % (
+                100 * comparison["best_move_agreement"], comparison["nodes_change"],
+                100 * comparison["nps_change"], "" if comparison["nps_compared"] else " (other machine)",
+                ", DRIFT" if comparison["drift"] else "", ", REGRESSION" if comparison["regression"] else "")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
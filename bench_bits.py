@@ -0,0 +1,123 @@
+"""
+Compares the bit operations python_chess falls back to without gmpy with
+gmpy2/gmpy and with the string based fallback they replaced.
+
+    python bench_bits.py
+
+Bit counting and iterating over the set bits are timed on random
+bitboards. Then move generation and evaluate_material() are timed on
+positions from random games, once with gmpy (if installed) and once with
+the fallback, each in a fresh process.
+"""
+import random
+import subprocess
+import sys
+import timeit
+
+BACKENDS = ["gmpy", "fallback"]
+
+
+def _old_pop_count(b):
+    return bin(b).count("1")
+
+
+def _old_bit_scan(b, n=0):
+    string = bin(b)
+    l = len(string)
+    r = string.rfind("1", 0, l - n)
+    if r == -1:
+        return -1
+    else:
+        return l - r - 1
+
+
+def _bit_scan_squares(bit_scan, b):
+    squares = []
+    square = bit_scan(b)
+    while square != -1 and square is not None:
+        squares.append(square)
+        square = bit_scan(b, square + 1)
+    return squares
+
+
+def _time(func, args, number):
+    return min(timeit.repeat(lambda: [func(arg) for arg in args], number=number, repeat=3))
+
+
+def bench_bits():
+    from python_chess import chess
+
+    rng = random.Random(2017)
+    bitboards = [rng.getrandbits(64) & rng.getrandbits(64) for _ in range(1000)]
+
+    pop_counts = [("old fallback", _old_pop_count), ("fallback", chess.pop_count)]
+    bit_scans = [("old fallback", _old_bit_scan)]
+    try:
+        import gmpy2
+        pop_counts.insert(0, ("gmpy2", gmpy2.popcount))
+        bit_scans.insert(0, ("gmpy2", gmpy2.bit_scan1))
+    except ImportError:
+        try:
+            import gmpy
+            pop_counts.insert(0, ("gmpy", gmpy.popcount))
+            bit_scans.insert(0, ("gmpy", gmpy.scan1))
+        except ImportError:
+            pass
+
+    if len(pop_counts) == 3:
+        # chess.pop_count is gmpy's here, time the table directly.
+        table = bytearray([0])
+        for _ in range(16):
+            table += bytearray(count + 1 for count in table)
+        pop_counts[-1] = ("fallback", lambda b: table[b & 0xffff] + table[b >> 16 & 0xffff] +
+                          table[b >> 32 & 0xffff] + table[b >> 48])
+
+    print "pop_count of 1000 bitboards x 200"
+    for name, func in pop_counts:
+        print "  %-18s %.3fs" % (name, _time(func, bitboards, 200))
+
+    print "squares of 1000 bitboards x 50"
+    for name, bit_scan in bit_scans:
+        print "  %-18s %.3fs" % (name + " loop", _time(lambda b: _bit_scan_squares(bit_scan, b), bitboards, 50))
+    print "  %-18s %.3fs" % ("scan_forward", _time(lambda b: list(chess.scan_forward(b)), bitboards, 50))
+
+
+def bench_board(backend):
+    if backend == "fallback":
+        # Makes the imports in python_chess fail.
+        sys.modules["gmpy2"] = None
+        sys.modules["gmpy"] = None
+
+    from antichess_board import AntichessBoard
+    from python_chess import chess
+    import minmax
+
+    if backend == "gmpy" and chess.pop_count.__module__ == "python_chess.chess":
+        print "  %-18s not installed" % backend
+        return
+
+    rng = random.Random(2017)
+    positions = []
+    while len(positions) < 300:
+        board = AntichessBoard()
+        for _ in range(rng.randint(1, 60)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        positions.append(board)
+
+    movegen = _time(lambda board: list(board.legal_moves), positions, 5)
+    material = _time(minmax.evaluate_material, positions, 50)
+    print "  %-18s legal_moves %.3fs  evaluate_material %.3fs" % (backend, movegen, material)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        bench_board(sys.argv[1])
+    else:
+        bench_bits()
+        print "300 positions, legal_moves x 5, evaluate_material x 50"
+        for backend in BACKENDS:
+            sys.stdout.flush()
+            subprocess.call([sys.executable, __file__, backend])
@@ -0,0 +1,137 @@
+"""
+Times push() and pop() of python_chess boards.
+
+    python bench_push_pop.py
+
+First the undo record alone is timed, saved and restored as the object with
+a __dict__ it used to be and as the tuple it is now. Then random games are
+played through and taken back on each board class that overrides push and
+pop.
+"""
+import random
+import timeit
+
+from python_chess import chess
+from python_chess.chess import variant
+from antichess_board import AntichessBoard
+
+BOARDS = [chess.Board, AntichessBoard, variant.ThreeCheckBoard, variant.CrazyhouseBoard]
+
+
+class _OldBoardState(object):
+
+    def __init__(self, board):
+        self.pawns = board.pawns
+        self.knights = board.knights
+        self.bishops = board.bishops
+        self.rooks = board.rooks
+        self.queens = board.queens
+        self.kings = board.kings
+
+        self.occupied_w = board.occupied_co[chess.WHITE]
+        self.occupied_b = board.occupied_co[chess.BLACK]
+        self.occupied = board.occupied
+
+        self.promoted = board.promoted
+
+        self.incremental_zobrist_hash = board.incremental_zobrist_hash
+
+        self.turn = board.turn
+        self.castling_rights = board.castling_rights
+        self.ep_square = board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+
+        self.zobrist_hash = board._zobrist_hash
+        self.zobrist_key = board._zobrist_key
+
+        self.info = board._info
+        self.info_key = board._info_key
+
+
+def _old_restore(board, state):
+    board.pawns = state.pawns
+    board.knights = state.knights
+    board.bishops = state.bishops
+    board.rooks = state.rooks
+    board.queens = state.queens
+    board.kings = state.kings
+
+    board.occupied_co[chess.WHITE] = state.occupied_w
+    board.occupied_co[chess.BLACK] = state.occupied_b
+    board.occupied = state.occupied
+
+    board.promoted = state.promoted
+
+    board.incremental_zobrist_hash = state.incremental_zobrist_hash
+
+    board.turn = state.turn
+    board.castling_rights = state.castling_rights
+    board.ep_square = state.ep_square
+    board.halfmove_clock = state.halfmove_clock
+    board.fullmove_number = state.fullmove_number
+
+    board._zobrist_hash = state.zobrist_hash
+    board._zobrist_key = state.zobrist_key
+
+    board._info = state.info
+    board._info_key = state.info_key
+
+
+def _restore(board, state):
+    (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+     board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.occupied, board.promoted,
+     board.incremental_zobrist_hash,
+     board.turn, board.castling_rights, board.ep_square, board.halfmove_clock, board.fullmove_number,
+     board._zobrist_hash, board._zobrist_key, board._info, board._info_key) = state
+
+
+def _games(board_class, rng, count=20, plies=80):
+    games = []
+    for _ in range(count):
+        board = board_class()
+        moves = []
+        for _ in range(plies):
+            if board.is_game_over():
+                break
+            legal_moves = list(board.legal_moves)
+            move = rng.choice(legal_moves)
+            board.push(move)
+            moves.append(move)
+        games.append(moves)
+    return games
+
+
+def _push_pop(board_class, games):
+    for moves in games:
+        board = board_class()
+        for move in moves:
+            board.push(move)
+        for _ in moves:
+            board.pop()
+
+
+def bench_records(number=100000):
+    board = chess.Board()
+    print "undo record x %d" % number
+    for name, record, restore in [("object", _OldBoardState, _old_restore),
+                                  ("tuple", chess._BoardState, _restore)]:
+        save = min(timeit.repeat(lambda: record(board), number=number, repeat=3))
+        state = record(board)
+        load = min(timeit.repeat(lambda: restore(board, state), number=number, repeat=3))
+        print "  %-10s save %.3fs  restore %.3fs" % (name, save, load)
+
+
+def bench_boards():
+    rng = random.Random(2017)
+    print "random games, push and pop every move"
+    for board_class in BOARDS:
+        games = _games(board_class, rng)
+        plies = sum(len(moves) for moves in games)
+        seconds = min(timeit.repeat(lambda: _push_pop(board_class, games), number=5, repeat=3))
+        print "  %-18s %.0f push/pop per second" % (board_class.__name__, 5 * plies / seconds)
+
+
+if __name__ == "__main__":
+    bench_records()
+    bench_boards()
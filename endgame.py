@@ -10,9 +10,12 @@ class EndgameBase:
     ONE_QUEEN_ENDGAME = 2       # Not implemented
     TWO_ROOKS_ENDGAME = 3       # Not implemented
     ROOK_AND_QUEEN_ENDGAME = 4  # Not implemented 
-    def __init__(self, board, endgame_type):
+    def __init__(self, board, endgame_type, rng=random):
         self.board = board
         self.endgame_type = endgame_type
+        # Breaks ties between equally good moves. Pass a seeded
+        # random.Random to get the same moves every time.
+        self.rng = rng
 
     def _distance(self, board, sq1, sq2):
         assert(sq1 != sq2)
@@ -243,7 +246,7 @@ class EndgameBase:
         rook_sq = list(board.pieces(chess.ROOK, board.turn))[0]
         king_sq = list(board.pieces(chess.KING, board.turn))[0]
         enemy_king_sq = list(board.pieces(chess.KING, not board.turn))[0]
-        is_rook_attacked = list(board.attackers(not board.turn, rook_sq))
+        is_rook_attacked = board.is_attacked_by(not board.turn, rook_sq)
         is_rook_protected = self._is_piece_protected_by_king(board, rook_sq, king_sq)
         min_enemy_king_area = self._get_king_movement_area(board, rook_sq, enemy_king_sq)
         
@@ -273,7 +276,7 @@ class EndgameBase:
                 king_sq = list(child_board.pieces(chess.KING, not child_board.turn))[0]
                 enemy_king_sq = list(child_board.pieces(chess.KING, child_board.turn))[0]
                 enemy_king_area = self._get_king_movement_area(child_board, rook_sq, enemy_king_sq)
-                child_is_rook_attacked = list(child_board.attackers(child_board.turn, rook_sq))
+                child_is_rook_attacked = child_board.is_attacked_by(child_board.turn, rook_sq)
                 child_is_rook_protected = self._is_piece_protected_by_king(child_board, rook_sq, king_sq)
                 
                 if self._is_king_picking(child_board, rook_sq, king_sq, enemy_king_sq):
@@ -288,7 +291,7 @@ class EndgameBase:
                 
                     if (enemy_king_area <= min_enemy_king_area) and (d <= min_total_d):
                         if (enemy_king_area == min_enemy_king_area) and (d == min_total_d):
-                            if (random.random() < 0.5):
+                            if (self.rng.random() < 0.5):
                                 continue
                         min_total_d = d
                         min_enemy_king_area = enemy_king_area
@@ -300,7 +303,7 @@ class EndgameBase:
                 
                     if (d <= min_total_d):
                         if (d == min_total_d):
-                            if (random.random() < 0.5):
+                            if (self.rng.random() < 0.5):
                                 continue
                         min_total_d = d
                         prev_best_move = best_move
@@ -310,7 +313,7 @@ class EndgameBase:
                 
                     if  (d <= min_total_d) and (enemy_king_area <= min_enemy_king_area):
                         if (enemy_king_area == min_enemy_king_area) and (d == min_total_d):
-                            if (random.random() < 0.5):
+                            if (self.rng.random() < 0.5):
                                 continue
                         min_total_d = d
                         prev_best_move = best_move
@@ -359,7 +362,7 @@ class EndgameBase:
                 enemy_king_sq = list(child_board.pieces(chess.KING, child_board.turn))[0]
                 enemy_king_area = self._get_king_movement_area(child_board, queen_sq, enemy_king_sq)
                 d = self._distance(child_board, king_sq, enemy_king_sq)
-                child_is_queen_attacked = list(child_board.attackers(child_board.turn, queen_sq))
+                child_is_queen_attacked = child_board.is_attacked_by(child_board.turn, queen_sq)
                 child_is_queen_protected = self._is_piece_protected_by_king(child_board, queen_sq, king_sq)
 
                 if child_is_queen_attacked and not child_is_queen_protected:
@@ -384,7 +387,6 @@ class EndgameBase:
 
         if queen_knight_distance_away:
             for move in legal_moves:
-                print move
                 child_board = board.copy()
                 child_board.push(move)
                 if (child_board.is_checkmate()):
@@ -420,11 +422,11 @@ class EndgameBase:
                 king_sq = list(child_board.pieces(chess.KING, not child_board.turn))[0]
                 enemy_king_sq = list(child_board.pieces(chess.KING, child_board.turn))[0]
                 enemy_king_area = self._get_king_movement_area(child_board, queen_sq, enemy_king_sq)
-                child_is_queen_attacked = list(child_board.attackers(child_board.turn, queen_sq))
+                child_is_queen_attacked = child_board.is_attacked_by(child_board.turn, queen_sq)
                 child_is_queen_protected = self._is_piece_protected_by_king(child_board, queen_sq, king_sq)
                 
                 if not (child_board.is_stalemate() and (not child_is_queen_attacked or child_is_queen_protected)):
-                    if (random.random() < 0.5):
+                    if (self.rng.random() < 0.5):
                         best_move = move
                         break
 
@@ -435,7 +437,7 @@ class EndgameBase:
         king_sq = list(board.pieces(chess.KING, board.turn))[0]
         enemy_king_sq = list(board.pieces(chess.KING, not board.turn))[0]
         
-        is_rook_attacked = list(board.attackers(not board.turn, rook_sq))
+        is_rook_attacked = board.is_attacked_by(not board.turn, rook_sq)
         is_rook_protected = self._is_piece_protected_by_king(board, rook_sq, king_sq)
         min_enemy_king_area = self._get_king_movement_area(board, rook_sq, enemy_king_sq)
         
@@ -460,7 +462,7 @@ class EndgameBase:
                 king_sq = list(child_board.pieces(chess.KING, not child_board.turn))[0]
                 enemy_king_sq = list(child_board.pieces(chess.KING, child_board.turn))[0]
                 enemy_king_area = self._get_king_movement_area(child_board, rook_sq, enemy_king_sq)
-                child_is_rook_attacked = list(child_board.attackers(child_board.turn, rook_sq))
+                child_is_rook_attacked = child_board.is_attacked_by(child_board.turn, rook_sq)
                 child_is_rook_protected = self._is_piece_protected_by_king(child_board, rook_sq, king_sq)
                 
                 if child_is_rook_attacked and not child_is_rook_protected:
@@ -472,7 +474,7 @@ class EndgameBase:
             
                 if  (d <= min_total_d) and (enemy_king_area <= min_enemy_king_area):
                     if (enemy_king_area == min_enemy_king_area) and (d == min_total_d):
-                        if (random.random() < 0.5):
+                        if (self.rng.random() < 0.5):
                             continue
                     min_total_d = d
                     prev_best_move = best_move
@@ -1,42 +1,597 @@
 from python_chess import chess
 from python_chess.chess import pop_count
 from quiescent_search import is_quiet_position
-from quiescent_search import quiescent_search
+from quiescent_search import QuiescenceSearch
+from transposition import TranspositionTable, SharedTranspositionTable
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+from transposition import DEFAULT_SIZE_MB, REPLACE_DEPTH_PREFERRED, MATE_SCORE
+from search_stats import SearchStats
+from move_ordering import MoveOrderer
+from search_board import SearchBoard
+import tablebase
 from multiprocessing import Pool
+import array
+import cProfile
+import ctypes
 import operator
 import multiprocessing
+import os
+import pstats
+import struct
+import sys
+import time
 
 DRAW_SCORE = -50
-CHECK_SCORE = 100000
+CHECK_SCORE = MATE_SCORE
 
+# Ways to spread a search over the pool.
+ROOT_SPLIT = "root"
+LAZY_SMP = "lazy_smp"
 
-def unwrap_self_f(arg, **kwarg):
-    return AlphaBeta._get_move_utility(*arg, **kwarg)
+# Directory to profile every search into, see AlphaBeta.get_best_move().
+PROFILE_ENV = "ANTICHESS_PROFILE"
+PROFILE_LINES = 30
+
+# Directory of the endgame tablebases the search probes, see tablebase.py.
+TABLEBASE_ENV = "ANTICHESS_TABLEBASES"
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def _next_float(x):
+    # Smallest float greater than x, which makes (x, _next_float(x)) a null
+    # window for float scores.
+    if x == 0:
+        return 5e-324
+    bits = struct.unpack("<q", struct.pack("<d", x))[0]
+    return struct.unpack("<d", struct.pack("<q", bits + 1 if x > 0 else bits - 1))[0]
+
+
+def _prev_float(x):
+    return -_next_float(-x)
+
+
+# Per process state of pool workers.
+_worker_tt = None
+_worker_stop = None
+_worker_orderer = None
+_worker_orderer_generation = None
+
+# Tablebases opened by this process, by directory.
+_tablebases = {}
+
+
+def _open_tablebases(directory):
+    if not directory:
+        return None
+    if directory not in _tablebases:
+        _tablebases[directory] = tablebase.open_tablebases(directory)
+    return _tablebases[directory]
+
+
+def default_tablebases():
+    """Tablebases of the directory in ANTICHESS_TABLEBASES, opened once per process."""
+    return _open_tablebases(os.environ.get(TABLEBASE_ENV))
+
+
+def _init_worker(tt_size_mb, tt_replacement, shared_array, stop):
+    global _worker_tt, _worker_stop
+    if shared_array is not None:
+        _worker_tt = SharedTranspositionTable(tt_size_mb, tt_replacement, shared_array)
+    else:
+        _worker_tt = TranspositionTable(tt_size_mb, tt_replacement)
+    _worker_stop = stop
+
+
+def _start_profile(enabled):
+    if not enabled:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler):
+    # Raw stats of the profiler, which unlike the profiler can be pickled.
+    if profiler is None:
+        return None
+    profiler.disable()
+    profiler.create_stats()
+    return profiler.stats
+
+
+class _RawProfile(object):
+    # Lets pstats load the raw stats sent back by a pool worker.
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _worker_table(generation):
+    global _worker_tt
+    if _worker_tt is None:
+        _worker_tt = TranspositionTable()
+    _worker_tt.generation = generation
+    return _worker_tt
+
+
+def _worker_move_orderer(generation):
+    # Killers and history carry over between the tasks of a search and
+    # age like in a search of a single process.
+    global _worker_orderer, _worker_orderer_generation
+    if _worker_orderer is None:
+        _worker_orderer = MoveOrderer()
+    elif _worker_orderer_generation != generation:
+        _worker_orderer.new_search()
+    _worker_orderer_generation = generation
+    return _worker_orderer
+
+
+def _task_board(board_class, fen, moves):
+    # Only the FEN of the last irreversible position and UCI strings cross
+    # the process boundary. The search runs on a SearchBoard with the moves
+    # pushed, so it sees repetitions and the last capture.
+    board = SearchBoard.from_board(board_class(fen))
+    board.set_evaluator(IncrementalEvaluator(board))
+    for uci in moves:
+        board.push(chess.Move.from_uci(uci).code())
+    return board
+
+
+def to_search_board(board):
+    """
+    Gets the :class:`~search_board.SearchBoard` the search runs on for a
+    python_chess *board*, with an incremental evaluator and the moves since
+    the last capture or pawn move.
+    """
+    fen, moves = _position_history(board)
+    return _task_board(type(board), fen, moves)
+
+
+def _search_child(task):
+    # Runs in a pool worker and searches one child of the root.
+    board_class, fen, moves, depth, factor, deadline, pv, guess, generation, profile, tablebases = task
+    start = time.time()
+    profiler = _start_profile(profile)
+
+    board = _task_board(board_class, fen, moves)
+    ab = AlphaBeta(depth, factor, board, tt=_worker_table(generation), orderer=_worker_move_orderer(generation),
+                   tablebases=_open_tablebases(tablebases))
+    ab.deadline = deadline
+    result = ab._get_move_utility(board, [chess.Move.from_uci(uci).code() for uci in pv], guess)
+    if result is not None:
+        utility, line = result
+        result = utility, [chess.MOVES[move].uci() for move in line]
+
+    ab.stats.worker_time = time.time() - start
+    return result, ab.stats.as_dict(), _stop_profile(profiler)
+
+
+def _search_lazy_smp(task):
+    # Runs in a pool worker and deepens the whole root search from
+    # *start_depth*, sharing the table with the other workers. Returns the
+    # last completed iteration, if any, and the stats.
+    board_class, fen, moves, start_depth, max_depth, factor, deadline, generation, profile, tablebases = task
+    start = time.time()
+    profiler = _start_profile(profile)
+
+    board = _task_board(board_class, fen, moves)
+    ab = AlphaBeta(start_depth, factor, board, tt=_worker_table(generation),
+                   orderer=_worker_move_orderer(generation), tablebases=_open_tablebases(tablebases))
+    ab.deadline = deadline
+    ab.stop = _worker_stop
+
+    result = None
+    score = None
+    for depth in range(start_depth, max_depth + 1):
+        ab.depth = depth
+        nodes = ab.stats.nodes + ab.qsearch.nodes
+        iteration_start = time.time()
+        try:
+            score, move = ab._aspiration_search(lambda alpha, beta: ab.search_root(board, alpha, beta), score)
+        except SearchTimeout:
+            break
+        ab.stats.add_iteration(depth, ab.stats.nodes + ab.qsearch.nodes - nodes)
+
+        board.push(move)
+        line = [move] + ab._principal_variation(board)
+        board.pop()
+        result = depth, score, [chess.MOVES[m].uci() for m in line]
+
+        if depth < max_depth and not ab._next_iteration_fits(start, iteration_start):
+            break
+    else:
+        # Done, so the other workers can stop.
+        if _worker_stop is not None:
+            _worker_stop.value = True
+
+    ab._update_stats()
+    ab.stats.worker_time = time.time() - start
+    return result, ab.stats.as_dict(), _stop_profile(profiler)
+
+
+def _position_history(board):
+    # Gets the FEN of the last position that can not be repeated and the
+    # UCI moves played since, which is all repetition detection needs.
+    plies = min(board.halfmove_clock, len(board.move_stack))
+    moves = [move.uci() for move in list(board.move_stack)[len(board.move_stack) - plies:]]
+
+    board = board.copy()
+    for _ in range(plies):
+        board.pop()
+
+    return board.fen(), moves
+
+
+class SearchPool(object):
+    """
+    Long lived pool of search processes, meant to be created once per game.
+
+    Every worker keeps its own transposition table between searches, unless
+    *shared_tt* is set. Then all workers use one table in shared memory,
+    which lazy SMP searches need.
+    """
+
+    def __init__(self, processes=None, tt_size_mb=DEFAULT_SIZE_MB, tt_replacement=REPLACE_DEPTH_PREFERRED,
+                 shared_tt=False):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shared_tt = shared_tt
+        self.stop = multiprocessing.RawValue(ctypes.c_bool, False)
+
+        shared_array = None
+        if shared_tt:
+            shared_array = SharedTranspositionTable(tt_size_mb, tt_replacement).array
+
+        self.pool = Pool(self.processes, _init_worker, (tt_size_mb, tt_replacement, shared_array, self.stop))
+        self.generation = 0
+
+    def new_search(self):
+        # Ages the entries in the worker tables.
+        self.generation += 1
+        return self.generation
+
+    def map(self, tasks):
+        # Subtrees differ a lot in size, so hand them out one by one.
+        return self.pool.map(_search_child, tasks, chunksize=1)
+
+    def map_lazy_smp(self, tasks):
+        self.stop.value = False
+        return self.pool.map(_search_lazy_smp, tasks, chunksize=1)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 class AlphaBeta:
-    def __init__(self, depth, factor, board):
+    # Check the clock every this many nodes.
+    TIME_CHECK_INTERVAL = 64
+
+    # Half width of the first aspiration window and the width after which
+    # it is opened completely.
+    ASPIRATION_WINDOW = 25
+    ASPIRATION_MAX = 1000
+
+    def __init__(self, depth, factor, board, tt=None, pool=None, parallel=ROOT_SPLIT, orderer=None,
+                 profile_dir=None, tablebases=None):
+        if parallel not in (ROOT_SPLIT, LAZY_SMP):
+            raise ValueError("unknown parallel search: {0}".format(repr(parallel)))
+
         self.factor = factor
         self.board = board
         self.depth = depth
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.pool = pool
+        self.parallel = parallel
+        self.orderer = orderer if orderer is not None else MoveOrderer()
+        self.qsearch = QuiescenceSearch(self._evaluate, self.orderer, self.tt, on_node=self._count_qnode)
+        self.profile_dir = profile_dir if profile_dir is not None else os.environ.get(PROFILE_ENV)
+        self.tablebases = tablebases if tablebases is not None else default_tablebases()
+        self._worker_profiles = []
+
+        self.deadline = None
+        self.stop = None
+        self.nodes = 0
+        self.stats = SearchStats()
+        self.pv_hint = {}
+        self._mark_cutoffs()
+
+        # Results of the last completed iteration of get_best_move.
+        self.completed_depth = 0
+        self.best_score = None
+        self.best_line = []
+
+    def _get_move_utility(self, board, pv=(), guess=None):
+        self.nodes = 0
+        self.pv_hint = self._pv_hint(board, pv)
+
+        nodes = self.stats.nodes + self.qsearch.nodes
+        try:
+            utility, _ = self._aspiration_search(
+                lambda alpha, beta: (self.min_alpha_beta(board, 1, 1, alpha, beta), None), guess)
+        except SearchTimeout:
+            return None
+        finally:
+            self._update_stats()
+
+        self.stats.add_iteration(self.depth, self.stats.nodes + self.qsearch.nodes - nodes)
+        return utility, self._principal_variation(board)
+
+    def _aspiration_search(self, search, guess):
+        # Calls search(alpha, beta) with a window around the score *guess* of
+        # the previous iteration, widening it until the score falls inside.
+        # search returns a (score, anything) tuple.
+        if guess is None or abs(guess) >= self.ASPIRATION_MAX:
+            return search(float('-inf'), float('inf'))
+
+        delta = self.ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            result = search(alpha, beta)
+            if alpha < result[0] < beta:
+                return result
+
+            delta *= 4
+            wide_open = delta >= self.ASPIRATION_MAX
+            if result[0] <= alpha:
+                self.stats.aspiration_fail_lows += 1
+                alpha = float('-inf') if wide_open else guess - delta
+            else:
+                self.stats.aspiration_fail_highs += 1
+                beta = float('inf') if wide_open else guess + delta
+
+    def _mark_cutoffs(self):
+        # The orderer can be shared with earlier searches, the stats only
+        # count the cutoffs since.
+        orderer = self.orderer
+        self._cutoffs_start = orderer.cutoffs, orderer.first_move_cutoffs, list(orderer.cutoffs_by_index)
+
+    def _update_stats(self):
+        cutoffs, first_move_cutoffs, cutoffs_by_index = self._cutoffs_start
+        self.stats.cutoffs = self.orderer.cutoffs - cutoffs
+        self.stats.first_move_cutoffs = self.orderer.first_move_cutoffs - first_move_cutoffs
+        self.stats.cutoffs_by_index = [n - start for n, start in zip(self.orderer.cutoffs_by_index, cutoffs_by_index)]
+        self.stats.qnodes = self.qsearch.nodes
+        self.stats.qsearch_max_depth = self.qsearch.max_depth_reached
+
+    def _next_iteration_fits(self, start, iteration_start):
+        # Predicts the time of the next iteration from the one that just
+        # ended and the measured branching factor. Before there is one, the
+        # next iteration is taken to be as long as the search so far.
+        if self.deadline is None:
+            return True
+        now = time.time()
+        factor = self.stats.effective_branching_factor()
+        if factor:
+            predicted = (now - iteration_start) * factor
+        else:
+            predicted = now - start
+        return now + predicted <= self.deadline
+
+    def _count_node(self):
+        self.nodes += 1
+        self.stats.nodes += 1
+        if not self.nodes % self.TIME_CHECK_INTERVAL:
+            self._check_time()
+
+    def _generate_moves(self, board):
+        start = time.time()
+        legal_moves = board.generate_moves()
+        self.stats.movegen_time += time.time() - start
+        return legal_moves
+
+    def _probe_tablebases(self, board, curr_depth):
+        # Score of the side to move from the tablebases, or None.
+        if self.tablebases is None or pop_count(board.occupied) > self.tablebases.max_pieces:
+            return None
+        self.stats.tb_probes += 1
+        dtm = self.tablebases.probe_dtm(board)
+        if dtm is None or (dtm == 0 and board.is_check()):
+            # Not in the tables, or maybe mated, which the search sees.
+            return None
+        self.stats.tb_hits += 1
+        if dtm > 0:
+            return CHECK_SCORE - (curr_depth + dtm)
+        elif dtm < 0:
+            return -(CHECK_SCORE - (curr_depth - dtm))
+        return -DRAW_SCORE
+
+    def _evaluate(self, board):
+        start = time.time()
+        score = evaluate(board)
+        self.stats.evals += 1
+        self.stats.eval_time += time.time() - start
+        return score
+
+    def _quiescence(self, board, alpha, beta, curr_depth):
+        start = time.time()
+        try:
+            return self.qsearch.search(board, alpha, beta, ply=curr_depth)
+        finally:
+            self.stats.qsearch_time += time.time() - start
+
+    def _count_qnode(self):
+        if not self.qsearch.nodes % self.TIME_CHECK_INTERVAL:
+            self._check_time()
+
+    def _check_time(self):
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop is not None and self.stop.value:
+            raise SearchTimeout()
+
+    def _pv_hint(self, board, pv):
+        # Maps the positions along a previous principal variation to the
+        # move played from them, so that line is searched first again.
+        hint = {}
+        pushed = 0
+        for move in pv:
+            if move not in board.generate_moves():
+                break
+            hint[board.zobrist_hash()] = move
+            board.push(move)
+            pushed += 1
+
+        for _ in range(pushed):
+            board.pop()
+
+        return hint
+
+    def _principal_variation(self, board):
+        pv = []
+        seen = set()
+        while True:
+            key = board.zobrist_hash()
+            entry = self.tt.probe(key)
+            if entry is None or entry.move is None or key in seen:
+                break
+            if entry.move not in board.generate_moves():
+                break
+            seen.add(key)
+            pv.append(entry.move)
+            board.push(entry.move)
+
+        for _ in pv:
+            board.pop()
+
+        return pv
+
+    def get_best_move(self, board, time_limit=None, max_depth=None):
+        """
+        Searches one ply deeper per iteration up to *max_depth* (the depth
+        given to the constructor by default). With a *time_limit* in seconds
+        the search does not start an iteration that is not expected to end
+        in time and returns the best move of the last completed iteration.
+        If it runs out of time anyway, a move searched to the end in the
+        unfinished iteration is taken when it beats that best move or the
+        best move was searched to the end too.
+
+        With the lazy SMP parallel search every worker of the pool searches
+        the whole tree, sharing one transposition table. The deepest
+        completed iteration of any worker wins.
+
+        Counters of the search are left in *stats*. If *profile_dir* is set,
+        by default from the ``ANTICHESS_PROFILE`` environment variable, the
+        search runs under cProfile, in this process and in the pool workers.
+        The merged profile is written to that directory and summed up on
+        stderr.
+        """
+        if not self.profile_dir:
+            return self._get_best_move(board, time_limit, max_depth)
+
+        self._worker_profiles = []
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(self._get_best_move, board, time_limit, max_depth)
+        finally:
+            self._dump_profile(board, profiler, self._worker_profiles)
+
+    def _dump_profile(self, board, profiler, worker_profiles):
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        for worker_profile in worker_profiles:
+            stats.add(_RawProfile(worker_profile))
+
+        if not os.path.isdir(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        path = os.path.join(self.profile_dir, "search-{0}-{1}{2}.prof".format(
+            os.getpid(), board.fullmove_number, "w" if board.turn == chess.WHITE else "b"))
+        stats.dump_stats(path)
+
+        sys.stderr.write("Profile of the search in {0} written to {1}\n".format(board.fen(), path))
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+
+    def _get_best_move(self, board, time_limit, max_depth):
+        start = time.time()
+        self.deadline = start + time_limit if time_limit is not None else None
+        if max_depth is None:
+            max_depth = self.depth
+
+        self.completed_depth = 0
+        self.best_score = None
+        self.best_line = []
+        self.stats.reset()
+        self.orderer.new_search()
+        self._mark_cutoffs()
+        self.qsearch.nodes = 0
+        self.qsearch.max_depth_reached = 0
+        profile = bool(self.profile_dir)
+        tablebases = self.tablebases.directory if self.tablebases is not None else None
 
-    def _get_move_utility(self, board):
-        return self.min_alpha_beta(board, 1, 1, float('-inf'), float('inf'))
-
-    def get_best_move(self, board):
         legal_moves = list(board.legal_moves)
-
-        child_boards = []
-        for move in legal_moves:
-            child_board = board.copy()
-            child_board.push(move)
-            child_boards.append(child_board)
-
-        pool = Pool(processes=4)
-        utilities = pool.map(unwrap_self_f, zip([self]*len(child_boards), child_boards))
-        index, value = max(enumerate(utilities), key=operator.itemgetter(1))
-
-        pool.terminate()
+        if len(legal_moves) == 1:
+            self.best_line = legal_moves
+            return legal_moves[0]
+
+        fen, history = _position_history(board)
+        children = [(move, []) for move in legal_moves]
+
+        # Avoiding repetitions below needs a score for every move, which only
+        # the root split search has.
+        lazy_smp = self.parallel == LAZY_SMP and not board.can_claim_threefold_repetition()
+        if lazy_smp and self.pool is not None and not self.pool.shared_tt:
+            raise ValueError("lazy SMP search needs a pool with a shared transposition table")
+
+        utilities = None
+        pool = self.pool if self.pool is not None else SearchPool(shared_tt=lazy_smp)
+        generation = pool.new_search()
+        try:
+            if lazy_smp:
+                return self._lazy_smp(pool, board, fen, history, max_depth, generation, profile, tablebases)
+
+            for depth in range(1, max_depth + 1):
+                iteration_start = time.time()
+                guesses = utilities or [None] * len(children)
+                tasks = [(type(board), fen, history + [move.uci()], depth, self.factor,
+                          self.deadline, [m.uci() for m in pv], guess, generation, profile, tablebases)
+                         for (move, pv), guess in zip(children, guesses)]
+                results = []
+                for result, stats, worker_profile in pool.map(tasks):
+                    results.append(result)
+                    self.stats.merge(stats)
+                    if worker_profile is not None:
+                        self._worker_profiles.append(worker_profile)
+                if any(result is None for result in results):
+                    # Out of time. Keep the last completed iteration, unless
+                    # a move searched to the end does better.
+                    utilities = self._keep_partial_iteration(children, utilities, results)
+                    break
+
+                # Search the best lines of this iteration first in the next.
+                children = [(move, [chess.Move.from_uci(uci) for uci in line])
+                            for (move, _), (_, line) in zip(children, results)]
+                utilities = [utility for utility, _ in results]
+                order = sorted(range(len(children)), key=lambda i: utilities[i], reverse=True)
+                children = [children[i] for i in order]
+                utilities = [utilities[i] for i in order]
+
+                self.completed_depth = depth
+                self.best_score = utilities[0]
+                self.best_line = [children[0][0]] + children[0][1]
+
+                if depth < max_depth and not self._next_iteration_fits(start, iteration_start):
+                    break
+        finally:
+            if pool is not self.pool:
+                pool.close()
+            self.deadline = None
+
+        legal_moves = [move for move, _ in children]
+        if utilities is None:
+            return legal_moves[0]
+
+        # The best move comes first.
+        value = utilities[0]
 
         if board.can_claim_threefold_repetition() and len(legal_moves) > 1:
             second_max = float('-inf')
@@ -48,33 +603,172 @@ class AlphaBeta:
 
             return legal_moves[second_max_index]
 
-        return legal_moves[index]
+        return legal_moves[0]
+
+    def _keep_partial_iteration(self, children, utilities, results):
+        # Moves the best child searched to the end in an unfinished
+        # iteration to the front of *children* if it beats the best move of
+        # the last iteration, which comes first, or that move was searched
+        # to the end as well. Returns the utilities to go with the children.
+        done = [i for i, result in enumerate(results) if result is not None]
+        if not done:
+            return utilities
+        i = max(done, key=lambda i: results[i][0])
+        utility, line = results[i]
+        if utilities is None:
+            # Any move searched beats one that was not.
+            utilities = [float('-inf')] * len(children)
+        elif results[0] is None and utility <= utilities[0]:
+            return utilities
+
+        move = children.pop(i)[0]
+        line = [chess.Move.from_uci(uci) for uci in line]
+        children.insert(0, (move, line))
+        utilities.pop(i)
+        utilities.insert(0, utility)
+        self.best_score = utility
+        self.best_line = [move] + line
+        return utilities
+
+    def _lazy_smp(self, pool, board, fen, history, max_depth, generation, profile, tablebases):
+        # Every other worker starts one ply deeper, so the workers do not all
+        # search the same iteration and fill the table ahead of each other.
+        tasks = [(type(board), fen, history, min(1 + i % 2, max_depth), max_depth, self.factor,
+                  self.deadline, generation, profile, tablebases)
+                 for i in range(pool.processes)]
+
+        results = []
+        for result, stats, worker_profile in pool.map_lazy_smp(tasks):
+            if result is not None:
+                results.append(result)
+            self.stats.merge(stats)
+            if worker_profile is not None:
+                self._worker_profiles.append(worker_profile)
+        if not results:
+            return next(iter(board.legal_moves))
+
+        depth, score, line = max(results, key=operator.itemgetter(0))
+        self.completed_depth = depth
+        self.best_score = score
+        self.best_line = [chess.Move.from_uci(uci) for uci in line]
+        return self.best_line[0]
+
+    def search_root(self, board, alpha=float('-inf'), beta=float('inf')):
+        """
+        Searches all moves of the root in this process. Returns the score and
+        the best move. *board* is a :class:`~search_board.SearchBoard`, see
+        :func:`to_search_board()`, and the move is an int.
+        """
+        self.nodes = 0
+        draft = self.depth
+        _, hash_move = self._probe(board, 0)
+
+        value = alpha
+        best_move = None
+        for i, move in enumerate(self.orderer.order(board, board.generate_moves(), hash_move, 0)):
+            board.push(move)
+            # Children of the root start with a factor of 1, as in the root
+            # split search.
+            if i == 0:
+                child_value = self.min_alpha_beta(board, 1, 1, value, beta)
+            else:
+                child_value = self.min_alpha_beta(board, 1, 1, value, _next_float(value))
+                if value < child_value < beta:
+                    self.stats.pvs_researches += 1
+                    child_value = self.min_alpha_beta(board, 1, 1, value, beta)
+            board.pop()
+            if child_value > value or best_move is None:
+                value = child_value
+                best_move = move
+            if value >= beta:
+                self.orderer.cutoff(board, move, 0, draft, i)
+                break
+
+        if value >= beta:
+            flag = LOWER_BOUND
+        elif value <= alpha:
+            flag = UPPER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(board.zobrist_hash(), draft, value, flag, best_move)
+        self._update_stats()
+        return value, best_move
 
     def min_max(self):
-        return self.max_alpha_beta(self.board, 0, float('-inf'), float('inf'))
+        return self.max_alpha_beta(to_search_board(self.board), 0, 1, float("-inf"), float("inf"))
+
+    def _probe(self, board, curr_depth):
+        # Returns the table entry and the hash move, if any.
+        key = board.zobrist_hash()
+        entry = self.tt.probe(key, curr_depth)
+        self.stats.tt_probes += 1
+        if entry is not None:
+            self.stats.tt_hits += 1
+        if entry is None or entry.move is None:
+            return entry, self.pv_hint.get(key)
+        return entry, entry.move
 
     def max_alpha_beta(self, board, curr_depth, curr_factor, alpha, beta):
+        self._count_node()
+        if board.is_repetition(2):
+            # Repeating a position can not win anything, the side that went
+            # for it can always repeat again.
+            return -DRAW_SCORE
+        score = self._probe_tablebases(board, curr_depth)
+        if score is not None:
+            return score
         value = alpha
         move_found = False
-        legal_moves = list(board.legal_moves)
+        legal_moves = self._generate_moves(board)
         legal_moves_len = len(legal_moves)
 
         if ( curr_factor >= self.factor or (curr_factor*legal_moves_len) >= self.factor*2 ) \
                 and curr_depth >= self.depth:
             if is_quiet_position(board):
-                return evaluate(board)
+                return self._evaluate(board)
             else:
-                return quiescent_search(board, alpha, beta, evaluate)
-
-        for i, move in enumerate(legal_moves):
+                return self._quiescence(board, alpha, beta, curr_depth)
+
+        # Scores in the table are from the side to move, which is us here.
+        draft = self.depth - curr_depth
+        entry, hash_move = self._probe(board, curr_depth)
+        if entry is not None and entry.depth >= draft:
+            if entry.flag == EXACT:
+                return entry.score
+            elif entry.flag == LOWER_BOUND and entry.score >= beta:
+                return entry.score
+            elif entry.flag == UPPER_BOUND and entry.score <= alpha:
+                return entry.score
+
+        best_move = None
+        for i, move in enumerate(self.orderer.order(board, legal_moves, hash_move, curr_depth)):
             move_found = True
-            child_board = board.copy()
-            child_board.push(move)
-            value = max(value, self.min_alpha_beta(child_board, curr_depth + 1, curr_factor*legal_moves_len, value, beta))
+            board.push(move)
+            if i == 0:
+                child_value = self.min_alpha_beta(board, curr_depth + 1, curr_factor*legal_moves_len, value, beta)
+            else:
+                # Null window, which only proves whether the move is better.
+                child_value = self.min_alpha_beta(
+                    board, curr_depth + 1, curr_factor*legal_moves_len, value, _next_float(value))
+                if value < child_value < beta:
+                    self.stats.pvs_researches += 1
+                    child_value = self.min_alpha_beta(board, curr_depth + 1, curr_factor*legal_moves_len, value, beta)
+            board.pop()
+            if child_value > value:
+                value = child_value
+                best_move = move
             if value >= beta:
+                self.orderer.cutoff(board, move, curr_depth, draft, i)
                 break
 
         if move_found:
+            if value >= beta:
+                flag = LOWER_BOUND
+            elif best_move is None:
+                flag = UPPER_BOUND
+            else:
+                flag = EXACT
+            self.tt.store(board.zobrist_hash(), draft, value, flag, best_move, curr_depth)
             return value
         elif is_draw(board):
             return -DRAW_SCORE
@@ -83,27 +777,66 @@ class AlphaBeta:
         # return value if move_found else float('-inf')
 
     def min_alpha_beta(self, board, curr_depth, curr_factor, alpha, beta):
+        self._count_node()
+        if board.is_repetition(2):
+            # Repeating a position can not win anything, the side that went
+            # for it can always repeat again.
+            return DRAW_SCORE
+        score = self._probe_tablebases(board, curr_depth)
+        if score is not None:
+            return -score
         value = beta
         move_found = False
-        legal_moves = list(board.legal_moves)
+        legal_moves = self._generate_moves(board)
         legal_moves_len = len(legal_moves)
 
         if ( curr_factor >= self.factor or (curr_factor*legal_moves_len) >= self.factor*2 ) \
                 and curr_depth >= self.depth:
             if is_quiet_position(board):
-                return -evaluate(board)
+                return -self._evaluate(board)
             else:
-                return -quiescent_search(board, alpha, beta, evaluate)
-
-        for i, move in enumerate(legal_moves):
+                return -self._quiescence(board, -beta, -alpha, curr_depth)
+
+        # Scores in the table are from the side to move, which is the
+        # opponent here, so they are negated.
+        draft = self.depth - curr_depth
+        entry, hash_move = self._probe(board, curr_depth)
+        if entry is not None and entry.depth >= draft:
+            if entry.flag == EXACT:
+                return -entry.score
+            elif entry.flag == LOWER_BOUND and -entry.score <= alpha:
+                return -entry.score
+            elif entry.flag == UPPER_BOUND and -entry.score >= beta:
+                return -entry.score
+
+        best_move = None
+        for i, move in enumerate(self.orderer.order(board, legal_moves, hash_move, curr_depth)):
             move_found = True
-            child_board = board.copy()
-            child_board.push(move)
-            value = min(value, self.max_alpha_beta(child_board, curr_depth + 1, curr_factor*legal_moves_len, alpha, value))
+            board.push(move)
+            if i == 0:
+                child_value = self.max_alpha_beta(board, curr_depth + 1, curr_factor*legal_moves_len, alpha, value)
+            else:
+                child_value = self.max_alpha_beta(
+                    board, curr_depth + 1, curr_factor*legal_moves_len, _prev_float(value), value)
+                if alpha < child_value < value:
+                    self.stats.pvs_researches += 1
+                    child_value = self.max_alpha_beta(board, curr_depth + 1, curr_factor*legal_moves_len, alpha, value)
+            board.pop()
+            if child_value < value:
+                value = child_value
+                best_move = move
             if value <= alpha:
+                self.orderer.cutoff(board, move, curr_depth, draft, i)
                 break
 
         if move_found:
+            if value <= alpha:
+                flag = LOWER_BOUND
+            elif best_move is None:
+                flag = UPPER_BOUND
+            else:
+                flag = EXACT
+            self.tt.store(board.zobrist_hash(), draft, -value, flag, best_move, curr_depth)
             return value
         elif is_draw(board):
             return DRAW_SCORE
@@ -120,7 +853,7 @@ def is_draw(board):
     if board.is_insufficient_material():
         return True
 
-    if not any(board.generate_legal_moves()) and not board.is_check():
+    if board.is_stalemate():
         return True
 
     if board.is_fivefold_repetition():
@@ -130,6 +863,14 @@ def is_draw(board):
 
 
 def evaluate(board):
+    evaluator = getattr(board, "evaluator", None)
+    if evaluator is not None:
+        return evaluator.evaluate(board)
+    return evaluate_full(board)
+
+
+def evaluate_full(board):
+    """Evaluates the board from scratch."""
     total_value = 0
     material_value = 20 * evaluate_material(board)
     mobility_value = evaluate_mobility_advantage(board)
@@ -144,6 +885,28 @@ def evaluate(board):
 
 
 def evaluate_material(board):
+    counts = [0] * 16
+    for color in chess.COLORS:
+        pieces = board.occupied_co[color]
+        i = color * 8
+        counts[i] = pop_count(pieces)
+        counts[i + chess.PAWN] = pop_count(pieces & board.pawns)
+        counts[i + chess.KNIGHT] = pop_count(pieces & board.knights)
+        counts[i + chess.BISHOP] = pop_count(pieces & board.bishops)
+        counts[i + chess.ROOK] = pop_count(pieces & board.rooks)
+        counts[i + chess.QUEEN] = pop_count(pieces & board.queens)
+        counts[i + chess.KING] = pop_count(pieces & board.kings)
+
+    return _material_value(counts, board.turn)
+
+
+def _material_value(counts, turn):
+    # counts holds the number of pieces per colour and piece type at
+    # colour * 8 + piece type, and the number of pieces of a colour at
+    # colour * 8.
+    o = turn * 8
+    t = (not turn) * 8
+
     # Base Multipliers
     BASE_KING_VALUE = 2000.0
     BASE_PAWN_VALUE = 1.0
@@ -154,11 +917,8 @@ def evaluate_material(board):
 
     mat_val = 0
 
-    our_pieces = board.occupied_co[board.turn]
-    o_piece_count = pop_count(our_pieces)
-
-    their_pieces = board.occupied_co[not board.turn]
-    t_piece_count = pop_count(their_pieces)
+    o_piece_count = counts[o]
+    t_piece_count = counts[t]
 
     # Modified Multipliers
     t_ratio = (16.0 - t_piece_count) / 16.0
@@ -183,34 +943,22 @@ def evaluate_material(board):
     queen_t_multi = max(7, o_ratio * BASE_QUEEN_VALUE)
 
     # King
-    o_kings = pop_count(our_pieces & board.kings)
-    t_kings = pop_count(their_pieces & board.kings)
-    king_value = (o_kings - t_kings) * BASE_KING_VALUE
+    king_value = (counts[o + chess.KING] - counts[t + chess.KING]) * BASE_KING_VALUE
 
     # Pawns
-    o_pawns = pop_count(our_pieces & board.pawns)
-    t_pawns = pop_count(their_pieces & board.pawns)
-    pawn_value = pawn_o_multi * o_pawns - pawn_t_multi * t_pawns
+    pawn_value = pawn_o_multi * counts[o + chess.PAWN] - pawn_t_multi * counts[t + chess.PAWN]
 
     # Knight
-    o_knights = pop_count(our_pieces & board.knights)
-    t_knights = pop_count(their_pieces & board.knights)
-    knight_value = knight_o_multi * o_knights - knight_t_multi * t_knights
+    knight_value = knight_o_multi * counts[o + chess.KNIGHT] - knight_t_multi * counts[t + chess.KNIGHT]
 
     # Bishop
-    o_bishops = pop_count(our_pieces & board.bishops)
-    t_bishops = pop_count(their_pieces & board.bishops)
-    bishop_value = bishop_o_multi * o_bishops - bishop_t_multi * t_bishops
+    bishop_value = bishop_o_multi * counts[o + chess.BISHOP] - bishop_t_multi * counts[t + chess.BISHOP]
 
     # Rook
-    o_rooks = pop_count(our_pieces & board.rooks)
-    t_rooks = pop_count(their_pieces & board.rooks)
-    rook_value = rook_o_multi * o_rooks - rook_t_multi * t_rooks
+    rook_value = rook_o_multi * counts[o + chess.ROOK] - rook_t_multi * counts[t + chess.ROOK]
 
     # Queen
-    o_queens = pop_count(our_pieces & board.queens)
-    t_queens = pop_count(their_pieces & board.queens)
-    queen_value = queen_o_multi * o_queens - queen_t_multi * t_queens
+    queen_value = queen_o_multi * counts[o + chess.QUEEN] - queen_t_multi * counts[t + chess.QUEEN]
 
     mat_val += pawn_value + knight_value + bishop_value \
         + rook_value + queen_value + king_value
@@ -392,11 +1140,36 @@ KING_TABLE_B_END = [
     -30,-20,-10,  0,  0,-10,-20,-30,
     -50,-40,-30,-20,-20,-30,-40,-50]
 
+def piece_table_offset(piece_type, color):
+    # Offset of the squares of a piece in the compiled piece tables.
+    return (color * 6 + piece_type - 1) * 64
+
+
+def _compile_piece_tables(white_king_table, black_king_table):
+    # One flat table of 2 colours x 6 piece types x 64 squares. The lists
+    # above are indexed with 63 - square.
+    table = array.array("h", [0] * 2 * 6 * 64)
+    for color, color_tables in [
+            (chess.WHITE, [PAWN_TABLE_W, KNIGHT_TABLE_W, BISHOP_TABLE_W,
+                           ROOKS_TABLE_W, QUEEN_TABLE_W, white_king_table]),
+            (chess.BLACK, [PAWN_TABLE_B, KNIGHT_TABLE_B, BISHOP_TABLE_B,
+                           ROOKS_TABLE_B, QUEEN_TABLE_B, black_king_table])]:
+        for piece_type, piece_table in zip(chess.PIECE_TYPES, color_tables):
+            offset = piece_table_offset(piece_type, color)
+            for square in chess.SQUARES:
+                table[offset + square] = piece_table[63 - square]
+    return table
+
+PIECE_TABLES_MIDDLE = _compile_piece_tables(KING_TABLE_W_MIDDLE, KING_TABLE_B_MIDDLE)
+PIECE_TABLES_END = _compile_piece_tables(KING_TABLE_W_END, KING_TABLE_B_END)
+
+
 def evaluate_piece_tables(board, weight):
     turn = board.turn
 
-    white_value = _evaluate_white_piece_tables(board)
-    black_value = _evaluate_black_piece_tables(board)
+    table = PIECE_TABLES_END if is_end_game(board) else PIECE_TABLES_MIDDLE
+    white_value = _sum_piece_tables(board, table, chess.WHITE)
+    black_value = _sum_piece_tables(board, table, chess.BLACK)
 
     if turn:
         return (white_value - black_value) * weight
@@ -417,85 +1190,75 @@ def is_end_game(board):
     return False
 
 
-def _evaluate_white_piece_tables(board):
+def _sum_piece_tables(board, table, color):
     value = 0
-    # SquareSet of pawns
-    pawns = board.pieces(chess.PAWN, chess.WHITE)
-    knights = board.pieces(chess.KNIGHT, chess.WHITE)
-    bishops = board.pieces(chess.BISHOP, chess.WHITE)
-    rooks = board.pieces(chess.ROOK, chess.WHITE)
-    queens = board.pieces(chess.QUEEN, chess.WHITE)
-    kings = board.pieces(chess.KING, chess.WHITE)
-
-    # Pawns
-    for p in pawns:
-        value += PAWN_TABLE_W[63 - p]
-
-    # Knights
-    for k in knights:
-        value += KNIGHT_TABLE_W[63 - k]
-
-    # Bishops
-    for b in bishops:
-        value += BISHOP_TABLE_W[63 - b]
-
-    # Rooks
-    for r in rooks:
-        value += ROOKS_TABLE_W[63 - r]
-
-    # Queen
-    for q in queens:
-        value += QUEEN_TABLE_W[63 - q]
-
-    # King
-    if is_end_game(board):
-        king_table = KING_TABLE_W_END
-    else:
-        king_table = KING_TABLE_W_MIDDLE
-    # TODO ADD ENDGAME TABLE
-    for king in kings:
-        value += king_table[63 - king]
+    pieces = board.occupied_co[color]
+    offset = piece_table_offset(chess.PAWN, color)
+    for mask in (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings):
+        mask &= pieces
+        while mask:
+            lowest = mask & -mask
+            value += table[offset + lowest.bit_length() - 1]
+            mask ^= lowest
+        offset += 64
 
     return value
 
 
-def _evaluate_black_piece_tables(board):
-    value = 0
-    # SquareSet of pawns
-    pawns = board.pieces(chess.PAWN, chess.BLACK)
-    knights = board.pieces(chess.KNIGHT, chess.BLACK)
-    bishops = board.pieces(chess.BISHOP, chess.BLACK)
-    rooks = board.pieces(chess.ROOK, chess.BLACK)
-    queens = board.pieces(chess.QUEEN, chess.BLACK)
-    kings = board.pieces(chess.KING, chess.BLACK)
-
-    # Pawns
-    for p in pawns:
-        value += PAWN_TABLE_B[63 - p]
-
-    # Knights
-    for k in knights:
-        value += KNIGHT_TABLE_B[63 - k]
-
-    # Bishops
-    for b in bishops:
-        value += BISHOP_TABLE_B[63 - b]
-
-    # Rooks
-    for r in rooks:
-        value += ROOKS_TABLE_B[63 - r]
-
-    # Queen
-    for q in queens:
-        value += QUEEN_TABLE_B[63 - q]
+class IncrementalEvaluator(object):
+    """
+    Material counts and piece-square sums of a board, updated as pieces are
+    set and removed, so evaluating a leaf does not look at the pieces.
+
+    Gives the same values as :func:`evaluate_full()`. Attach it with
+    :func:`antichess_board.AntichessBoard.set_evaluator()` or
+    :func:`search_board.SearchBoard.set_evaluator()`.
+    """
+
+    __slots__ = ["state"]
+
+    def __init__(self, board):
+        self.reset(board)
+
+    def reset(self, board):
+        # Piece counts as for _material_value(), then the piece-square sums
+        # of black and white. The piece tables only count in the end game,
+        # so kings are scored with the end game table.
+        self.state = [0] * 18
+        for square in chess.SQUARES:
+            piece_type = board.piece_type_at(square)
+            if piece_type:
+                self.add(square, piece_type, bool(board.occupied_co[chess.WHITE] & chess.BB_SQUARES[square]))
+
+    def add(self, square, piece_type, color):
+        state = self.state
+        i = color * 8
+        state[i] += 1
+        state[i + piece_type] += 1
+        state[16 + color] += PIECE_TABLES_END[(color * 6 + piece_type - 1) * 64 + square]
+
+    def remove(self, square, piece_type, color):
+        state = self.state
+        i = color * 8
+        state[i] -= 1
+        state[i + piece_type] -= 1
+        state[16 + color] -= PIECE_TABLES_END[(color * 6 + piece_type - 1) * 64 + square]
+
+    def evaluate(self, board):
+        state = self.state
+        total_value = 0
+        material_value = 20 * _material_value(state, board.turn)
+        mobility_value = evaluate_mobility_advantage(board)
+
+        # Same as is_end_game().
+        if state[chess.WHITE * 8] <= 5 and state[chess.BLACK * 8] <= 5:
+            if board.turn:
+                piece_table_value = (state[17] - state[16]) * 0.5
+            else:
+                piece_table_value = (state[16] - state[17]) * 0.5
+        else:
+            piece_table_value = 0
 
-    # King
-    if is_end_game(board):
-        king_table = KING_TABLE_B_END
-    else:
-        king_table = KING_TABLE_B_MIDDLE
-    # TODO ADD ENDGAME TABLE
-    for king in kings:
-        value += king_table[63 - king]
+        total_value += material_value + mobility_value + piece_table_value
 
-    return value
+        return total_value
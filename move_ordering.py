@@ -0,0 +1,110 @@
+from python_chess import chess
+
+
+class MoveOrderer(object):
+    """
+    Orders the int moves of a :class:`~search_board.SearchBoard` so that
+    cutoffs come early.
+
+    The hash move goes first, then captures by most valuable victim and
+    least valuable attacker, then the killer moves of the ply and then the
+    other quiet moves by their history score.
+
+    Moves are :func:`move codes <chess.Move.code()>`. The history is
+    indexed by their from and to squares.
+
+    Captures are forced, so when the captured piece is defended the
+    opponent has to take back and the attacker is given away. Only then
+    does the value of the attacker count against the capture. Subclasses
+    can change the piece values.
+    """
+
+    # Indexed by piece type.
+    PIECE_VALUES = [0, 10, 32, 33, 50, 90, 0]
+
+    KILLERS_PER_PLY = 2
+
+    # Cutoffs are counted by the index of the move up to this one.
+    CUTOFF_INDEXES = 8
+
+    # Offsets keeping the groups apart.
+    CAPTURE_SCORE = 1 << 30
+    KILLER_SCORE = 1 << 29
+
+    def __init__(self):
+        self.killers = []
+        self.history = [0] * 64 * 64
+        self.new_search()
+
+    def new_search(self):
+        # History scores of older searches still help, but less.
+        self.history = [score // 2 for score in self.history]
+        self.killers = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.cutoffs_by_index = [0] * self.CUTOFF_INDEXES
+
+    def capture_score(self, board, move):
+        to_square = move >> 6 & 63
+        if board.is_en_passant(move):
+            victim = chess.PAWN
+        else:
+            victim = board.piece_type_at(to_square)
+
+        score = self.PIECE_VALUES[victim] * 16
+        if board.is_attacked_by(not board.turn, to_square):
+            score -= self.PIECE_VALUES[board.piece_type_at(move & 63)]
+        return score
+
+    def order(self, board, moves, hash_move=None, ply=0):
+        """Returns the moves of *board* searched at *ply* in search order."""
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+
+        scored = []
+        first = None
+        for move in moves:
+            if move == hash_move:
+                first = move
+            elif board.is_capture(move):
+                scored.append((self.CAPTURE_SCORE + self.capture_score(board, move), move))
+            elif move in killers:
+                scored.append((self.KILLER_SCORE - killers.index(move), move))
+            else:
+                scored.append((history[move & 0xfff], move))
+
+        # Stable, so ties keep the generator order.
+        scored.sort(key=lambda item: item[0], reverse=True)
+        ordered = [move for _, move in scored]
+        if first is not None:
+            ordered.insert(0, first)
+        return ordered
+
+    def order_captures(self, board, captures):
+        return sorted(captures, key=lambda move: self.capture_score(board, move), reverse=True)
+
+    def cutoff(self, board, move, ply, depth, index):
+        """
+        Records that *move*, searched *index*-th at *ply* with *depth* plies
+        left, caused a cutoff. *board* is the position before the move.
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        self.cutoffs_by_index[min(index, self.CUTOFF_INDEXES - 1)] += 1
+
+        if board.is_capture(move):
+            return
+
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.KILLERS_PER_PLY:]
+
+        depth = max(depth, 1)
+        self.history[move & 0xfff] += depth * depth
+
+    def first_move_cutoff_rate(self):
+        return float(self.first_move_cutoffs) / self.cutoffs if self.cutoffs else 0.0
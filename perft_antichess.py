@@ -0,0 +1,232 @@
+"""
+Perft suite for the antichess move generators. The perft node count for a
+given depth is the number of legal move sequences from a position, which
+checks the correctness and the speed of move generation.
+
+    python perft_antichess.py [--board search] [--processes N] [--no-bulk]
+                              [--max-nodes N] [--json]
+    python perft_antichess.py divide FEN DEPTH [--board search] [--processes N]
+
+The suite runs every count of data/antichess-perft.epd up to --max-nodes
+and exits with status 1 if one is wrong. divide prints the count below
+every legal move, to find where two move generators disagree.
+
+By default the last ply is counted from the length of the move list
+without pushing the moves (bulk counting). --no-bulk pushes and pops them
+too. With more than one process the moves at the root are split across a
+process pool.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from python_chess import chess
+import antichess_board
+import search_board
+
+EPD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "antichess-perft.epd")
+
+
+def perft(board, depth, bulk=True):
+    """Counts the leaves of the legal move tree of an AntichessBoard."""
+    if depth < 1:
+        return 1
+    elif depth == 1 and bulk:
+        return len(board.legal_moves)
+
+    nodes = 0
+    for move in list(board.legal_moves):
+        board.push(move)
+        nodes += perft(board, depth - 1, bulk)
+        board.pop()
+    return nodes
+
+
+def search_perft(search, depth, bulk=True):
+    """Counts the leaves of the legal move tree of a SearchBoard."""
+    if depth < 1:
+        return 1
+    elif depth == 1 and bulk:
+        return len(search.generate_moves())
+
+    nodes = 0
+    for move in search.generate_moves():
+        search.push(move)
+        nodes += search_perft(search, depth - 1, bulk)
+        search.pop()
+    return nodes
+
+
+class _Antichess(object):
+    perft = staticmethod(perft)
+
+    @staticmethod
+    def board(fen):
+        return antichess_board.AntichessBoard(fen)
+
+    @staticmethod
+    def moves(board):
+        return [move.uci() for move in board.legal_moves]
+
+    @staticmethod
+    def push(board, uci):
+        board.push(chess.Move.from_uci(uci))
+
+
+class _Search(object):
+    perft = staticmethod(search_perft)
+
+    @staticmethod
+    def board(fen):
+        return search_board.SearchBoard.from_board(antichess_board.AntichessBoard(fen))
+
+    @staticmethod
+    def moves(search):
+        return [search_board.decode_move(move).uci() for move in search.generate_moves()]
+
+    @staticmethod
+    def push(search, uci):
+        search.push(search_board.encode_move(chess.Move.from_uci(uci)))
+
+
+BOARDS = {
+    "antichess": _Antichess,
+    "search": _Search,
+}
+
+
+def _subtree(task):
+    kind, fen, uci, depth, bulk = task
+    board_type = BOARDS[kind]
+    board = board_type.board(fen)
+    board_type.push(board, uci)
+    return uci, board_type.perft(board, depth, bulk)
+
+
+def divide(fen, depth, kind="antichess", bulk=True, pool=None):
+    """
+    Returns the moves of the position, as UCI strings, with the number of
+    leaves below each of them, *depth* plies deep from the position. The
+    moves are searched in *pool* if given.
+    """
+    board_type = BOARDS[kind]
+    board = board_type.board(fen)
+    tasks = [(kind, fen, uci, depth - 1, bulk) for uci in board_type.moves(board)]
+    if pool is None:
+        return [_subtree(task) for task in tasks]
+    else:
+        return pool.map(_subtree, tasks, chunksize=1)
+
+
+def read_epd(path=EPD_PATH):
+    """Yields the id, EPD, depth and expected node count of every count."""
+    current_id = None
+    epd = None
+    with open(path) as data:
+        for line in data:
+            s = line.split()
+            if not s or s[0].startswith("#"):
+                pass
+            elif s[0] == "id":
+                current_id = s[1]
+            elif s[0] == "epd":
+                epd = " ".join(s[1:])
+            elif s[0] == "perft":
+                yield current_id, epd, int(s[1]), int(s[2])
+
+
+def run_suite(path=EPD_PATH, kind="antichess", bulk=True, max_nodes=None, pool=None, out=None):
+    """
+    Runs the counts of the EPD file with no more than *max_nodes* nodes.
+    Returns a report with the result, time and nodes per second of every
+    count and of the whole run. Progress is written to *out*, if given.
+    """
+    results = []
+    for position_id, epd, depth, expected in read_epd(path):
+        if max_nodes is not None and expected > max_nodes:
+            continue
+
+        fen = antichess_board.AntichessBoard.from_epd(epd)[0].fen()
+        start = time.time()
+        if depth > 1 or pool is not None:
+            nodes = sum(count for _, count in divide(fen, depth, kind, bulk, pool))
+        else:
+            nodes = BOARDS[kind].perft(BOARDS[kind].board(fen), depth, bulk)
+        seconds = time.time() - start
+
+        results.append({
+            "id": position_id,
+            "fen": fen,
+            "depth": depth,
+            "nodes": nodes,
+            "expected": expected,
+            "ok": nodes == expected,
+            "seconds": round(seconds, 4),
+            "nps": int(nodes / seconds) if seconds else None,
+        })
+
+        if out is not None:
+            out.write("%-20s %d %10d %-5s %7.3fs %9s nps\n" % (
+                position_id, depth, nodes, "ok" if nodes == expected else "FAIL",
+                seconds, results[-1]["nps"]))
+            out.flush()
+
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    return {
+        "board": kind,
+        "bulk": bulk,
+        "processes": pool._processes if pool is not None else 1,
+        "positions": results,
+        "failures": sum(1 for result in results if not result["ok"]),
+        "nodes": nodes,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds else None,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Antichess perft suite.")
+    parser.add_argument("--board", choices=sorted(BOARDS), default="antichess",
+                        help="move generator: AntichessBoard or the SearchBoard the search runs on")
+    parser.add_argument("--processes", type=int, default=1, help="split the root moves across processes")
+    parser.add_argument("--no-bulk", dest="bulk", action="store_false", help="push and pop the last ply too")
+    parser.add_argument("--max-nodes", type=int, default=None, help="skip counts larger than this")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--epd", default=EPD_PATH)
+    parser.add_argument("command", nargs="*", help="divide FEN DEPTH")
+    args = parser.parse_args(argv)
+
+    pool = multiprocessing.Pool(args.processes) if args.processes > 1 else None
+    try:
+        if args.command:
+            if args.command[0] != "divide" or len(args.command) != 3:
+                parser.error("expected: divide FEN DEPTH")
+            fen = antichess_board.AntichessBoard(args.command[1]).fen()
+            counts = divide(fen, int(args.command[2]), args.board, args.bulk, pool)
+            for uci, nodes in sorted(counts):
+                print "%s: %d" % (uci, nodes)
+            print
+            print "Moves: %d" % len(counts)
+            print "Nodes: %d" % sum(nodes for _, nodes in counts)
+            return 0
+
+        report = run_suite(args.epd, args.board, args.bulk, args.max_nodes, pool,
+                           None if args.json else sys.stdout)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if args.json:
+        print json.dumps(report, indent=2, sort_keys=True)
+    else:
+        print "%d nodes in %.3fs, %s nps, %d failures" % (
+            report["nodes"], report["seconds"], report["nps"], report["failures"])
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
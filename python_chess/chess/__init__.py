@@ -28,9 +28,15 @@ __email__ = "niklas.fiekas@backscattering.de"
 
 __version__ = "0.15.4"
 
+import array
 import copy
 import re
 import itertools
+import os
+import struct
+import sys
+import tempfile
+import zlib
 
 try:
     import backport_collections as collections
@@ -244,17 +250,28 @@ except ImportError:
         from gmpy import popcount as pop_count
         from gmpy import scan1 as bit_scan
     except ImportError:
+        # Bit counts of all 16 bit numbers.
+        _POP_COUNT_TABLE = bytearray([0])
+        for _ in range(16):
+            _POP_COUNT_TABLE += bytearray(count + 1 for count in _POP_COUNT_TABLE)
+
         def pop_count(b):
-            return bin(b).count("1")
+            return (_POP_COUNT_TABLE[b & 0xffff] + _POP_COUNT_TABLE[b >> 16 & 0xffff] +
+                    _POP_COUNT_TABLE[b >> 32 & 0xffff] + _POP_COUNT_TABLE[b >> 48])
 
         def bit_scan(b, n=0):
-            string = bin(b)
-            l = len(string)
-            r = string.rfind("1", 0, l - n)
-            if r == -1:
+            b >>= n
+            if not b:
                 return -1
-            else:
-                return l - r - 1
+            return (b & -b).bit_length() - 1 + n
+
+
+def scan_forward(b):
+    """Yields the indexes of the set bits of *b*, lowest first."""
+    while b:
+        r = b & -b
+        yield r.bit_length() - 1
+        b ^= r
 
 def shift_down(b):
     return b >> 8
@@ -372,63 +389,240 @@ def _attack_table(square_lists):
 
     return attack_table
 
-DIAG_ATTACKS_NE = _attack_table([
-                                [BB_H1],
-                            [BB_H2, BB_G1],
-                        [BB_H3, BB_G2, BB_F1],
-                    [BB_H4, BB_G3, BB_F2, BB_E1],
-                [BB_H5, BB_G4, BB_F3, BB_E2, BB_D1],
-            [BB_H6, BB_G5, BB_F4, BB_E3, BB_D2, BB_C1],
-        [BB_H7, BB_G6, BB_F5, BB_E4, BB_D3, BB_C2, BB_B1],
-    [BB_H8, BB_G7, BB_F6, BB_E5, BB_D4, BB_C3, BB_B2, BB_A1],
-        [BB_G8, BB_F7, BB_E6, BB_D5, BB_C4, BB_B3, BB_A2],
-            [BB_F8, BB_E7, BB_D6, BB_C5, BB_B4, BB_A3],
-                [BB_E8, BB_D7, BB_C6, BB_B5, BB_A4],
-                    [BB_D8, BB_C7, BB_B6, BB_A5],
-                        [BB_C8, BB_B7, BB_A6],
-                            [BB_B8, BB_A7],
-                                [BB_A8],
-])
-
-DIAG_ATTACKS_NW = _attack_table([
-                                [BB_A1],
-                            [BB_B1, BB_A2],
-                        [BB_C1, BB_B2, BB_A3],
-                    [BB_D1, BB_C2, BB_B3, BB_A4],
-                [BB_E1, BB_D2, BB_C3, BB_B4, BB_A5],
-            [BB_F1, BB_E2, BB_D3, BB_C4, BB_B5, BB_A6],
-        [BB_G1, BB_F2, BB_E3, BB_D4, BB_C5, BB_B6, BB_A7],
-    [BB_H1, BB_G2, BB_F3, BB_E4, BB_D5, BB_C6, BB_B7, BB_A8],
-        [BB_H2, BB_G3, BB_F4, BB_E5, BB_D6, BB_C7, BB_B8],
-            [BB_H3, BB_G4, BB_F5, BB_E6, BB_D7, BB_C8],
-                [BB_H4, BB_G5, BB_F6, BB_E7, BB_D8],
-                    [BB_H5, BB_G6, BB_F7, BB_E8],
-                        [BB_H6, BB_G7, BB_F8],
-                            [BB_H7, BB_G8],
-                                [BB_H8],
-])
-
-FILE_ATTACKS = _attack_table([
-    [BB_A1, BB_A2, BB_A3, BB_A4, BB_A5, BB_A6, BB_A7, BB_A8],
-    [BB_B1, BB_B2, BB_B3, BB_B4, BB_B5, BB_B6, BB_B7, BB_B8],
-    [BB_C1, BB_C2, BB_C3, BB_C4, BB_C5, BB_C6, BB_C7, BB_C8],
-    [BB_D1, BB_D2, BB_D3, BB_D4, BB_D5, BB_D6, BB_D7, BB_D8],
-    [BB_E1, BB_E2, BB_E3, BB_E4, BB_E5, BB_E6, BB_E7, BB_E8],
-    [BB_F1, BB_F2, BB_F3, BB_F4, BB_F5, BB_F6, BB_F7, BB_F8],
-    [BB_G1, BB_G2, BB_G3, BB_G4, BB_G5, BB_G6, BB_G7, BB_G8],
-    [BB_H1, BB_H2, BB_H3, BB_H4, BB_H5, BB_H6, BB_H7, BB_H8],
-])
-
-RANK_ATTACKS = _attack_table([
-    [BB_A1, BB_B1, BB_C1, BB_D1, BB_E1, BB_F1, BB_G1, BB_H1],
-    [BB_A2, BB_B2, BB_C2, BB_D2, BB_E2, BB_F2, BB_G2, BB_H2],
-    [BB_A3, BB_B3, BB_C3, BB_D3, BB_E3, BB_F3, BB_G3, BB_H3],
-    [BB_A4, BB_B4, BB_C4, BB_D4, BB_E4, BB_F4, BB_G4, BB_H4],
-    [BB_A5, BB_B5, BB_C5, BB_D5, BB_E5, BB_F5, BB_G5, BB_H5],
-    [BB_A6, BB_B6, BB_C6, BB_D6, BB_E6, BB_F6, BB_G6, BB_H6],
-    [BB_A7, BB_B7, BB_C7, BB_D7, BB_E7, BB_F7, BB_G7, BB_H7],
-    [BB_A8, BB_B8, BB_C8, BB_D8, BB_E8, BB_F8, BB_G8, BB_H8],
-])
+def _carry_rippler(mask):
+    # Yields all subsets of the mask.
+    subset = BB_VOID
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            break
+
+def _sliding_masks(lines):
+    # The squares that can block a slider on each square. Squares on the
+    # ends of the lines never block anything and are left out.
+    masks = []
+
+    for bb_square in BB_SQUARES:
+        mask = BB_VOID
+        for line_masks, ends in lines:
+            mask |= line_masks[bb_square] & ~ends
+        masks.append(mask & ~bb_square)
+
+    return masks
+
+def _sliding_attack_table(masks, lines):
+    # Combines line attack tables into one table per square, keyed by the
+    # occupied squares in the mask of that square.
+    attack_table = []
+
+    for square, bb_square in enumerate(BB_SQUARES):
+        attacks = {}
+        for occupied in _carry_rippler(masks[square]):
+            attacks[occupied] = BB_VOID
+            for line_masks, line_attacks in lines:
+                attacks[occupied] |= line_attacks[bb_square][line_masks[bb_square] & occupied]
+
+        attack_table.append(attacks)
+
+    return attack_table
+
+BB_DIAG_EDGES = BB_FILE_A | BB_FILE_H | BB_RANK_1 | BB_RANK_8
+
+BB_ROOK_MASKS = _sliding_masks([(RANK_MASK, BB_FILE_A | BB_FILE_H), (FILE_MASK, BB_RANK_1 | BB_RANK_8)])
+
+BB_BISHOP_MASKS = _sliding_masks([(DIAG_MASK_NE, BB_DIAG_EDGES), (DIAG_MASK_NW, BB_DIAG_EDGES)])
+
+def _generate_attack_tables():
+    diag_attacks_ne = _attack_table([
+                                    [BB_H1],
+                                [BB_H2, BB_G1],
+                            [BB_H3, BB_G2, BB_F1],
+                        [BB_H4, BB_G3, BB_F2, BB_E1],
+                    [BB_H5, BB_G4, BB_F3, BB_E2, BB_D1],
+                [BB_H6, BB_G5, BB_F4, BB_E3, BB_D2, BB_C1],
+            [BB_H7, BB_G6, BB_F5, BB_E4, BB_D3, BB_C2, BB_B1],
+        [BB_H8, BB_G7, BB_F6, BB_E5, BB_D4, BB_C3, BB_B2, BB_A1],
+            [BB_G8, BB_F7, BB_E6, BB_D5, BB_C4, BB_B3, BB_A2],
+                [BB_F8, BB_E7, BB_D6, BB_C5, BB_B4, BB_A3],
+                    [BB_E8, BB_D7, BB_C6, BB_B5, BB_A4],
+                        [BB_D8, BB_C7, BB_B6, BB_A5],
+                            [BB_C8, BB_B7, BB_A6],
+                                [BB_B8, BB_A7],
+                                    [BB_A8],
+    ])
+
+    diag_attacks_nw = _attack_table([
+                                    [BB_A1],
+                                [BB_B1, BB_A2],
+                            [BB_C1, BB_B2, BB_A3],
+                        [BB_D1, BB_C2, BB_B3, BB_A4],
+                    [BB_E1, BB_D2, BB_C3, BB_B4, BB_A5],
+                [BB_F1, BB_E2, BB_D3, BB_C4, BB_B5, BB_A6],
+            [BB_G1, BB_F2, BB_E3, BB_D4, BB_C5, BB_B6, BB_A7],
+        [BB_H1, BB_G2, BB_F3, BB_E4, BB_D5, BB_C6, BB_B7, BB_A8],
+            [BB_H2, BB_G3, BB_F4, BB_E5, BB_D6, BB_C7, BB_B8],
+                [BB_H3, BB_G4, BB_F5, BB_E6, BB_D7, BB_C8],
+                    [BB_H4, BB_G5, BB_F6, BB_E7, BB_D8],
+                        [BB_H5, BB_G6, BB_F7, BB_E8],
+                            [BB_H6, BB_G7, BB_F8],
+                                [BB_H7, BB_G8],
+                                    [BB_H8],
+    ])
+
+    file_attacks = _attack_table([
+        [BB_A1, BB_A2, BB_A3, BB_A4, BB_A5, BB_A6, BB_A7, BB_A8],
+        [BB_B1, BB_B2, BB_B3, BB_B4, BB_B5, BB_B6, BB_B7, BB_B8],
+        [BB_C1, BB_C2, BB_C3, BB_C4, BB_C5, BB_C6, BB_C7, BB_C8],
+        [BB_D1, BB_D2, BB_D3, BB_D4, BB_D5, BB_D6, BB_D7, BB_D8],
+        [BB_E1, BB_E2, BB_E3, BB_E4, BB_E5, BB_E6, BB_E7, BB_E8],
+        [BB_F1, BB_F2, BB_F3, BB_F4, BB_F5, BB_F6, BB_F7, BB_F8],
+        [BB_G1, BB_G2, BB_G3, BB_G4, BB_G5, BB_G6, BB_G7, BB_G8],
+        [BB_H1, BB_H2, BB_H3, BB_H4, BB_H5, BB_H6, BB_H7, BB_H8],
+    ])
+
+    rank_attacks = _attack_table([
+        [BB_A1, BB_B1, BB_C1, BB_D1, BB_E1, BB_F1, BB_G1, BB_H1],
+        [BB_A2, BB_B2, BB_C2, BB_D2, BB_E2, BB_F2, BB_G2, BB_H2],
+        [BB_A3, BB_B3, BB_C3, BB_D3, BB_E3, BB_F3, BB_G3, BB_H3],
+        [BB_A4, BB_B4, BB_C4, BB_D4, BB_E4, BB_F4, BB_G4, BB_H4],
+        [BB_A5, BB_B5, BB_C5, BB_D5, BB_E5, BB_F5, BB_G5, BB_H5],
+        [BB_A6, BB_B6, BB_C6, BB_D6, BB_E6, BB_F6, BB_G6, BB_H6],
+        [BB_A7, BB_B7, BB_C7, BB_D7, BB_E7, BB_F7, BB_G7, BB_H7],
+        [BB_A8, BB_B8, BB_C8, BB_D8, BB_E8, BB_F8, BB_G8, BB_H8],
+    ])
+
+    rook_attacks = _sliding_attack_table(BB_ROOK_MASKS, [(RANK_MASK, rank_attacks), (FILE_MASK, file_attacks)])
+    bishop_attacks = _sliding_attack_table(BB_BISHOP_MASKS, [(DIAG_MASK_NE, diag_attacks_ne), (DIAG_MASK_NW, diag_attacks_nw)])
+
+    return diag_attacks_ne, diag_attacks_nw, file_attacks, rank_attacks, rook_attacks, bishop_attacks
+
+# Generating the attack tables is most of the import time, so they are
+# cached next to this module. Bump the version when the tables change.
+_ATTACK_TABLE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "attack_tables.bin")
+
+_ATTACK_TABLE_CACHE_VERSION = 1
+
+# Magic, version and CRC-32 of the payload, a little endian array of
+# 64 bit numbers: the number of dicts, their sizes, then the keys and the
+# values of each dict.
+_ATTACK_TABLE_CACHE_HEADER = struct.Struct("<4sII")
+
+# The line tables are keyed by square mask (and 0), the others by square.
+_LINE_TABLE_KEYS = [BB_VOID] + BB_SQUARES
+
+def _uint64_array():
+    # There is no array("Q") on Python 2, but "L" is 64 bit on most platforms.
+    for typecode in "QL":
+        try:
+            data = array.array(typecode)
+        except ValueError:
+            continue
+
+        if data.itemsize == 8:
+            return data
+
+def _read_attack_tables(path):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_ATTACK_TABLE_CACHE_HEADER.size)
+            payload = f.read()
+    except (IOError, OSError):
+        return None
+
+    if len(header) != _ATTACK_TABLE_CACHE_HEADER.size:
+        return None
+
+    magic, version, checksum = _ATTACK_TABLE_CACHE_HEADER.unpack(header)
+    if magic != b"PCAT" or version != _ATTACK_TABLE_CACHE_VERSION:
+        return None
+    if zlib.crc32(payload) & 0xffffffff != checksum:
+        return None
+
+    data = _uint64_array()
+    if data is None or len(payload) % data.itemsize:
+        return None
+    if hasattr(data, "frombytes"):
+        data.frombytes(payload)
+    else:
+        data.fromstring(payload)
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    count = 4 * len(_LINE_TABLE_KEYS) + 2 * 64
+    if not data or data[0] != count:
+        return None
+
+    dicts = []
+    position = 1 + count
+    for size in data[1:1 + count]:
+        dicts.append(dict(zip(data[position:position + size], data[position + size:position + 2 * size])))
+        position += 2 * size
+
+    if position != len(data):
+        return None
+
+    tables = []
+    for i in range(4):
+        tables.append(dict(zip(_LINE_TABLE_KEYS, dicts[i * len(_LINE_TABLE_KEYS):(i + 1) * len(_LINE_TABLE_KEYS)])))
+    tables.append(dicts[4 * len(_LINE_TABLE_KEYS):4 * len(_LINE_TABLE_KEYS) + 64])
+    tables.append(dicts[4 * len(_LINE_TABLE_KEYS) + 64:])
+    return tables
+
+def _write_attack_tables(path, tables):
+    data = _uint64_array()
+    if data is None:
+        return
+
+    dicts = []
+    for table in tables[:4]:
+        dicts.extend(table[key] for key in _LINE_TABLE_KEYS)
+    for table in tables[4:]:
+        dicts.extend(table)
+
+    data.append(len(dicts))
+    data.extend(len(table) for table in dicts)
+    for table in dicts:
+        keys = list(table)
+        data.extend(keys)
+        data.extend(table[key] for key in keys)
+
+    if sys.byteorder == "big":
+        data.byteswap()
+    payload = data.tobytes() if hasattr(data, "tobytes") else data.tostring()
+    header = _ATTACK_TABLE_CACHE_HEADER.pack(b"PCAT", _ATTACK_TABLE_CACHE_VERSION, zlib.crc32(payload) & 0xffffffff)
+
+    # Write to a temporary file and rename it, so that concurrent imports
+    # never read a partial cache. The cache is optional, so failing to
+    # write it (for example to a read-only installation) is fine.
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    except (IOError, OSError):
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def _load_attack_tables():
+    tables = _read_attack_tables(_ATTACK_TABLE_CACHE)
+    if tables is None:
+        tables = _generate_attack_tables()
+        _write_attack_tables(_ATTACK_TABLE_CACHE, tables)
+    return tables
+
+# Slider attacks by square mask and line, for example
+# FILE_ATTACKS[bb_square][FILE_MASK[bb_square] & occupied], and by square
+# number: BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & occupied].
+DIAG_ATTACKS_NE, DIAG_ATTACKS_NW, FILE_ATTACKS, RANK_ATTACKS, BB_ROOK_ATTACKS, BB_BISHOP_ATTACKS = _load_attack_tables()
 
 
 SAN_REGEX = re.compile("^([NBKRQ])?([a-h])?([1-8])?x?([a-h][1-8])(=?[nbrqkNBRQK])?(\\+|#)?$")
@@ -738,16 +932,31 @@ class Move(object):
         else:
             return "0000"
 
+    def code(self):
+        """
+        Gets the move as an integer of 15 bits:
+        ``from_square | to_square << 6 | promotion << 12``.
+
+        Raises :exc:`ValueError` for drops, which have no code.
+        """
+        if self.drop:
+            raise ValueError("drops have no move code: {0}".format(repr(self)))
+        return self.from_square | self.to_square << 6 | (self.promotion or 0) << 12
+
     def __bool__(self):
         return bool(self.from_square or self.to_square or self.promotion or self.drop)
 
     __nonzero__ = __bool__
 
     def __eq__(self, other):
+        if self is other:
+            return True
         ne = self.__ne__(other)
         return NotImplemented if ne is NotImplemented else not ne
 
     def __ne__(self, other):
+        if self is other:
+            return False
         try:
             if self.from_square != other.from_square:
                 return True
@@ -817,6 +1026,44 @@ class Move(object):
         """
         return cls(0, 0, None)
 
+    @classmethod
+    def from_code(cls, code):
+        """
+        Gets the move with the given :func:`~chess.Move.code()`.
+
+        Moves that can be played on a board are taken from :data:`MOVES`
+        and must not be modified.
+        """
+        if cls is Move:
+            move = MOVES[code]
+            if move is not None:
+                return move
+        return cls(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+def _move_table():
+    table = [None] * (1 << 15)
+    for from_square in SQUARES:
+        for to_square in SQUARES:
+            table[from_square | to_square << 6] = Move(from_square, to_square)
+
+    # Promotions of pawns on the seventh rank.
+    for from_square, to_rank in itertools.chain(zip(range(A7, H7 + 1), itertools.repeat(7)),
+                                                zip(range(A2, H2 + 1), itertools.repeat(0))):
+        for to_file in range(max(0, file_index(from_square) - 1), min(7, file_index(from_square) + 1) + 1):
+            to_square = square(to_file, to_rank)
+            for promotion in range(KNIGHT, KING + 1):
+                table[from_square | to_square << 6 | promotion << 12] = Move(from_square, to_square, promotion)
+
+    return tuple(table)
+
+MOVES = _move_table()
+"""
+Canonical :class:`~chess.Move` objects by :func:`~chess.Move.code()`, or
+``None`` for codes of moves that can not be played. Move generation yields
+these instead of creating new objects.
+"""
+
 
 class BaseBoard(object):
     """
@@ -1264,18 +1511,14 @@ class BaseBoard(object):
         zobrist_hash = 0
 
         squares = self.occupied_co[BLACK]
-        square = bit_scan(squares)
-        while square != -1 and square is not None:
+        for square in scan_forward(squares):
             piece_index = (self.piece_type_at(square) - 1) * 2
             zobrist_hash ^= array[64 * piece_index + 8 * rank_index(square) + file_index(square)]
-            square = bit_scan(squares, square + 1)
 
         squares = self.occupied_co[WHITE]
-        square = bit_scan(squares)
-        while square != -1 and square is not None:
+        for square in scan_forward(squares):
             piece_index = (self.piece_type_at(square) - 1) * 2 + 1
             zobrist_hash ^= array[64 * piece_index + 8 * rank_index(square) + file_index(square)]
-            square = bit_scan(squares, square + 1)
 
         return zobrist_hash
 
@@ -1419,29 +1662,39 @@ class BaseBoard(object):
         return board
 
 
-class _BoardState(object):
+class _PositionInfo(object):
+    # Facts about one position, each computed when first needed. None is
+    # not known yet.
 
-    def __init__(self, board):
-        self.pawns = board.pawns
-        self.knights = board.knights
-        self.bishops = board.bishops
-        self.rooks = board.rooks
-        self.queens = board.queens
-        self.kings = board.kings
+    __slots__ = ["checkers", "pinned", "attacks", "has_legal_move"]
 
-        self.occupied_w = board.occupied_co[WHITE]
-        self.occupied_b = board.occupied_co[BLACK]
-        self.occupied = board.occupied
+    def __init__(self):
+        self.checkers = None
+        self.pinned = None
+        self.attacks = [None, None]
+        self.has_legal_move = None
 
-        self.promoted = board.promoted
 
-        self.incremental_zobrist_hash = board.incremental_zobrist_hash
+class _BoardState(collections.namedtuple("_BoardState", [
+        "pawns", "knights", "bishops", "rooks", "queens", "kings",
+        "occupied_w", "occupied_b", "occupied", "promoted",
+        "incremental_zobrist_hash",
+        "turn", "castling_rights", "ep_square", "halfmove_clock", "fullmove_number",
+        "zobrist_hash", "zobrist_key", "info", "info_key"])):
+    """
+    Undo record pushed for every move. A plain tuple, so that saving and
+    restoring the board is cheap.
+    """
+
+    __slots__ = ()
 
-        self.turn = board.turn
-        self.castling_rights = board.castling_rights
-        self.ep_square = board.ep_square
-        self.halfmove_clock = board.halfmove_clock
-        self.fullmove_number = board.fullmove_number
+    def __new__(cls, board):
+        return tuple.__new__(cls, (
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[WHITE], board.occupied_co[BLACK], board.occupied, board.promoted,
+            board.incremental_zobrist_hash,
+            board.turn, board.castling_rights, board.ep_square, board.halfmove_clock, board.fullmove_number,
+            board._zobrist_hash, board._zobrist_key, board._info, board._info_key))
 
 
 class Board(BaseBoard):
@@ -1474,6 +1727,17 @@ class Board(BaseBoard):
     connected_kings = False
     one_king = True
 
+    # Polyglot key of the position, valid while _zobrist_key matches the
+    # state it was computed for. See zobrist_hash().
+    _zobrist_hash = 0
+    _zobrist_key = None
+
+    # Checkers, pins, attacks and whether there are legal moves, shared by
+    # move generation, legality checks and evaluation. Valid while
+    # _info_key matches the position. See _position_info().
+    _info = None
+    _info_key = None
+
     def __init__(self, fen=STARTING_FEN, chess960=False):
         BaseBoard.__init__(self, None)
 
@@ -1485,7 +1749,9 @@ class Board(BaseBoard):
         self.move_stack = collections.deque()
         self.stack = collections.deque()
 
-        self.transpositions = collections.Counter()
+        # Zobrist hashes of the positions since the start of the stack,
+        # ending with the current one.
+        self.hash_stack = collections.deque()
 
         if fen is None:
             self.clear()
@@ -1531,12 +1797,12 @@ class Board(BaseBoard):
         self.clear_stack()
 
     def clear_stack(self):
-        """Clears the move stack and transposition table."""
+        """Clears the move stack and the position history."""
         self.move_stack.clear()
         self.stack.clear()
 
-        self.transpositions.clear()
-        self.transpositions.update((self.zobrist_hash(), ))
+        self.hash_stack.clear()
+        self.hash_stack.append(self.zobrist_hash())
 
     def remove_piece_at(self, square):
         super(Board, self).remove_piece_at(square)
@@ -1551,15 +1817,10 @@ class Board(BaseBoard):
 
         # Generate piece moves.
         non_pawns = our_pieces & ~self.pawns & from_mask
-        from_square = bit_scan(non_pawns)
-        while from_square != -1 and from_square is not None:
+        for from_square in scan_forward(non_pawns):
             moves = self.attacks_mask(from_square) & ~our_pieces & to_mask
-            to_square = bit_scan(moves)
-            while to_square != -1 and to_square is not None:
-                yield Move(from_square, to_square)
-                to_square = bit_scan(moves, to_square + 1)
-
-            from_square = bit_scan(non_pawns, from_square + 1)
+            for to_square in scan_forward(moves):
+                yield MOVES[from_square | to_square << 6]
 
         # Generate castling moves.
         for move in self.generate_castling_moves(from_mask, to_mask):
@@ -1572,25 +1833,19 @@ class Board(BaseBoard):
 
         # Generate pawn captures.
         capturers = pawns
-        from_square = bit_scan(capturers)
-        while from_square != -1 and from_square is not None:
+        for from_square in scan_forward(capturers):
             targets = (
                 BB_PAWN_ATTACKS[self.turn][from_square] &
                 self.occupied_co[not self.turn] & to_mask)
 
-            to_square = bit_scan(targets)
-            while to_square != -1 and to_square is not None:
+            for to_square in scan_forward(targets):
                 if rank_index(to_square) in [0, 7]:
-                    yield Move(from_square, to_square, QUEEN)
-                    yield Move(from_square, to_square, ROOK)
-                    yield Move(from_square, to_square, BISHOP)
-                    yield Move(from_square, to_square, KNIGHT)
+                    yield MOVES[from_square | to_square << 6 | QUEEN << 12]
+                    yield MOVES[from_square | to_square << 6 | ROOK << 12]
+                    yield MOVES[from_square | to_square << 6 | BISHOP << 12]
+                    yield MOVES[from_square | to_square << 6 | KNIGHT << 12]
                 else:
-                    yield Move(from_square, to_square)
-
-                to_square = bit_scan(targets, to_square + 1)
-
-            from_square = bit_scan(capturers, from_square + 1)
+                    yield MOVES[from_square | to_square << 6]
 
         # Prepare pawn advance generation.
         if self.turn == WHITE:
@@ -1604,26 +1859,21 @@ class Board(BaseBoard):
         double_moves &= to_mask
 
         # Generate single pawn moves.
-        to_square = bit_scan(single_moves)
-        while to_square != -1 and to_square is not None:
+        for to_square in scan_forward(single_moves):
             from_square = to_square + (8 if self.turn == BLACK else -8)
 
             if rank_index(to_square) in [0, 7]:
-                yield Move(from_square, to_square, QUEEN)
-                yield Move(from_square, to_square, ROOK)
-                yield Move(from_square, to_square, BISHOP)
-                yield Move(from_square, to_square, KNIGHT)
+                yield MOVES[from_square | to_square << 6 | QUEEN << 12]
+                yield MOVES[from_square | to_square << 6 | ROOK << 12]
+                yield MOVES[from_square | to_square << 6 | BISHOP << 12]
+                yield MOVES[from_square | to_square << 6 | KNIGHT << 12]
             else:
-                yield Move(from_square, to_square)
-
-            to_square = bit_scan(single_moves, to_square + 1)
+                yield MOVES[from_square | to_square << 6]
 
         # Generate double pawn moves.
-        to_square = bit_scan(double_moves)
-        while to_square != -1 and to_square is not None:
+        for to_square in scan_forward(double_moves):
             from_square = to_square + (16 if self.turn == BLACK else -16)
-            yield Move(from_square, to_square)
-            to_square = bit_scan(double_moves, to_square + 1)
+            yield MOVES[from_square | to_square << 6]
 
         # Generate en passant captures.
         for move in self.generate_pseudo_legal_ep(from_mask, to_mask):
@@ -1637,10 +1887,8 @@ class Board(BaseBoard):
             self.pawns & self.occupied_co[self.turn] & from_mask &
             BB_PAWN_ATTACKS[not self.turn][self.ep_square])
 
-        capturer = bit_scan(capturers)
-        while capturer != -1 and capturer is not None:
-            yield Move(capturer, self.ep_square)
-            capturer = bit_scan(capturers, capturer + 1)
+        for capturer in scan_forward(capturers):
+            yield MOVES[capturer | self.ep_square << 6]
 
     def generate_pseudo_legal_captures(self, from_mask=BB_ALL, to_mask=BB_ALL):
         return itertools.chain(
@@ -1648,23 +1896,14 @@ class Board(BaseBoard):
             self.generate_pseudo_legal_ep(from_mask, to_mask))
 
     def attackers_mask(self, color, square):
-        bb_square = BB_SQUARES[square]
-
-        rank_pieces = RANK_MASK[bb_square] & self.occupied
-        file_pieces = FILE_MASK[bb_square] & self.occupied
-        ne_pieces = DIAG_MASK_NE[bb_square] & self.occupied
-        nw_pieces = DIAG_MASK_NW[bb_square] & self.occupied
-
         parallel_sliders = self.queens | self.rooks
         diagonal_sliders = self.queens | self.bishops
 
         attackers = (
             (BB_KING_ATTACKS[square] & self.kings) |
             (BB_KNIGHT_ATTACKS[square] & self.knights) |
-            (RANK_ATTACKS[bb_square][rank_pieces] & parallel_sliders) |
-            (FILE_ATTACKS[bb_square][file_pieces] & parallel_sliders) |
-            (DIAG_ATTACKS_NE[bb_square][ne_pieces] & diagonal_sliders) |
-            (DIAG_ATTACKS_NW[bb_square][nw_pieces] & diagonal_sliders) |
+            (BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & self.occupied] & parallel_sliders) |
+            (BB_BISHOP_ATTACKS[square][BB_BISHOP_MASKS[square] & self.occupied] & diagonal_sliders) |
             (BB_PAWN_ATTACKS[not color][square] & self.pawns))
 
         return attackers & self.occupied_co[color]
@@ -1676,8 +1915,27 @@ class Board(BaseBoard):
         Pinned pieces still count as attackers. Pawns that can be captured
         en passant are attacked.
         """
+        attacks = self._position_info().attacks[color]
+        if attacks is not None:
+            return bool(attacks & BB_SQUARES[square])
+
         return bool(self.attackers_mask(color, square))
 
+    def attacked_mask(self, color):
+        """
+        Gets a mask of the squares attacked by the given side. Pinned pieces
+        still count as attackers.
+        """
+        info = self._position_info()
+        if info.attacks[color] is None:
+            attacks = BB_VOID
+            for square in scan_forward(self.pawns & self.occupied_co[color]):
+                attacks |= BB_PAWN_ATTACKS[color][square]
+            for square in scan_forward(self.occupied_co[color] & ~self.pawns):
+                attacks |= self.attacks_mask(square)
+            info.attacks[color] = attacks
+        return info.attacks[color]
+
     def attackers(self, color, square):
         """
         Gets a set of attackers of the given color for the given square.
@@ -1704,12 +1962,10 @@ class Board(BaseBoard):
             attacks = BB_VOID
 
             if bb_square & self.bishops or bb_square & self.queens:
-                attacks |= DIAG_ATTACKS_NE[bb_square][DIAG_MASK_NE[bb_square] & self.occupied]
-                attacks |= DIAG_ATTACKS_NW[bb_square][DIAG_MASK_NW[bb_square] & self.occupied]
+                attacks |= BB_BISHOP_ATTACKS[square][BB_BISHOP_MASKS[square] & self.occupied]
 
             if bb_square & self.rooks or bb_square & self.queens:
-                attacks |= RANK_ATTACKS[bb_square][RANK_MASK[bb_square] & self.occupied]
-                attacks |= FILE_ATTACKS[bb_square][FILE_MASK[bb_square] & self.occupied]
+                attacks |= BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & self.occupied]
 
             return attacks
 
@@ -1724,9 +1980,43 @@ class Board(BaseBoard):
         """
         return SquareSet(self.attacks_mask(square))
 
+    def _pinned_mask(self):
+        # Pieces of the side to move that pin_mask() has to look at: the
+        # pinned ones, or all of them when in check.
+        if self.checkers_mask():
+            return BB_ALL
+
+        king_mask = self.kings & self.occupied_co[self.turn]
+        if not king_mask:
+            return BB_VOID
+        king = bit_scan(king_mask)
+
+        pinned = BB_VOID
+        for masks, attack_table, sliders in [(BB_ROOK_MASKS, BB_ROOK_ATTACKS, self.rooks | self.queens),
+                                             (BB_BISHOP_MASKS, BB_BISHOP_ATTACKS, self.bishops | self.queens)]:
+            snipers = attack_table[king][BB_VOID] & sliders & self.occupied_co[not self.turn]
+            for sniper in scan_forward(snipers):
+                # The squares between the king and the sniper.
+                between = (attack_table[king][masks[king] & BB_SQUARES[sniper]] &
+                           attack_table[sniper][masks[sniper] & king_mask])
+                blockers = between & self.occupied
+                if blockers and not blockers & (blockers - 1):
+                    pinned |= blockers & self.occupied_co[self.turn]
+
+        return pinned
+
     def pin_mask(self, color, square):
         square_mask = BB_SQUARES[square]
 
+        # Most pieces of the side to move are not pinned, which is known
+        # once per position.
+        if color == self.turn and square_mask & self.occupied_co[color] & ~self.kings:
+            info = self._position_info()
+            if info.pinned is None:
+                info.pinned = self._pinned_mask()
+            if not square_mask & info.pinned:
+                return BB_ALL
+
         king = self.kings & self.occupied_co[color]
         sliders = self.rooks | self.bishops | self.queens
 
@@ -1786,13 +2076,27 @@ class Board(BaseBoard):
         """
         return self.pin_mask(color, square) != BB_ALL
 
+    def checkers_mask(self):
+        """Gets a mask of the pieces giving check to the side to move."""
+        info = self._position_info()
+        if info.checkers is None:
+            king_square = bit_scan(self.kings & self.occupied_co[self.turn])
+            if king_square is None or king_square == -1:
+                info.checkers = BB_VOID
+            else:
+                info.checkers = self.attackers_mask(not self.turn, king_square)
+        return info.checkers
+
     def is_check(self):
         """Returns if the current side to move is in check."""
-        king_square = bit_scan(self.kings & self.occupied_co[self.turn])
-        if king_square is None or king_square == -1:
-            return False
+        return bool(self.checkers_mask())
 
-        return self.is_attacked_by(not self.turn, king_square)
+    def has_legal_move(self):
+        """Checks if the side to move has at least one legal move."""
+        info = self._position_info()
+        if info.has_legal_move is None:
+            info.has_legal_move = any(self.generate_legal_moves())
+        return info.has_legal_move
 
     def is_into_check(self, move):
         """
@@ -1919,7 +2223,7 @@ class Board(BaseBoard):
             return True
 
         # Stalemate or checkmate.
-        if not any(self.generate_legal_moves()):
+        if not self.has_legal_move():
             return True
 
         # Fivefold repetition.
@@ -1965,7 +2269,7 @@ class Board(BaseBoard):
             return "1/2-1/2"
 
         # Stalemate.
-        if not any(self.generate_legal_moves()):
+        if not self.has_legal_move():
             return "1/2-1/2"
 
         # Undetermined.
@@ -1976,14 +2280,14 @@ class Board(BaseBoard):
         if not self.is_check():
             return False
 
-        return not any(self.generate_legal_moves())
+        return not self.has_legal_move()
 
     def is_stalemate(self):
         """Checks if the current position is a stalemate."""
         if self.is_check():
             return False
 
-        return not any(self.generate_legal_moves())
+        return not self.has_legal_move()
 
     def is_insufficient_material(self):
         """Checks for a draw due to insufficient mating material."""
@@ -2015,42 +2319,48 @@ class Board(BaseBoard):
         take precedence.
         """
         if self.halfmove_clock >= 150:
-            if any(self.generate_legal_moves()):
+            if self.has_legal_move():
                 return True
 
         return False
 
-    def is_fivefold_repetition(self):
+    def is_repetition(self, count=3):
         """
-        Since the first of July 2014 a game is automatically drawn (without
-        a claim by one of the players) if a position occurs for the fifth time
-        on consecutive alternating moves.
+        Checks if the current position occurred at least *count* times,
+        counting the current one. Only positions since the last capture or
+        pawn move are looked at, the others can not come back.
+
+        Takes no more than *halfmove_clock* steps and does not change the
+        board.
         """
         zobrist_hash = self.zobrist_hash()
+        found = 1
 
-        # A minimum amount of moves must have been played and the position
-        # in question must have appeared at least five times.
-        if len(self.move_stack) < 16 or self.transpositions[zobrist_hash] < 5:
-            return False
-
-        switchyard = collections.deque()
-
-        for _ in range(4):
-            # Go back two full moves, each.
-            for _ in range(4):
-                switchyard.append(self.pop())
+        if found >= count:
+            return True
 
-            # Check the position was the same before.
-            if self.zobrist_hash() != zobrist_hash:
-                while switchyard:
-                    self.push(switchyard.pop())
+        # The same side was to move every second position.
+        for other in itertools.islice(reversed(self.hash_stack), 2, self.halfmove_clock + 1, 2):
+            if other == zobrist_hash:
+                found += 1
+                if found >= count:
+                    return True
 
-                return False
+        return False
 
-        while switchyard:
-            self.push(switchyard.pop())
+    def is_fivefold_repetition(self):
+        """
+        Since the first of July 2014 a game is automatically drawn (without
+        a claim by one of the players) if a position occurs for the fifth time
+        on consecutive alternating moves.
+        """
+        # The position must have been the same 4, 8, 12 and 16 plies ago,
+        # without capture or pawn move in between.
+        if self.halfmove_clock < 16 or len(self.hash_stack) < 17:
+            return False
 
-        return True
+        zobrist_hash = self.zobrist_hash()
+        return all(self.hash_stack[-1 - plies] == zobrist_hash for plies in [4, 8, 12, 16])
 
     def can_claim_draw(self):
         """
@@ -2067,7 +2377,7 @@ class Board(BaseBoard):
         """
         # Fifty-move rule.
         if self.halfmove_clock >= 100:
-            if any(self.generate_legal_moves()):
+            if self.has_legal_move():
                 return True
 
         return False
@@ -2079,19 +2389,28 @@ class Board(BaseBoard):
         with one of the possible legal moves.
         """
         # Threefold repetition occured.
-        if self.transpositions[self.zobrist_hash()] >= 3:
+        if self.is_repetition(3):
             return True
 
+        # Only positions that already occurred twice, with the other side to
+        # move, can be reached for the third time with the next move.
+        counts = collections.Counter(itertools.islice(reversed(self.hash_stack), 1, self.halfmove_clock + 1, 2))
+        twice = set(zobrist_hash for zobrist_hash, count in counts.items() if count >= 2)
+        if not twice:
+            return False
+
         # The next legal move is a threefold repetition.
         for move in self.generate_legal_moves():
+            if self.is_zeroing(move):
+                continue
+
             self.push(move)
+            repetition = self.zobrist_hash() in twice
+            self.pop()
 
-            if self.transpositions[self.zobrist_hash()] >= 3:
-                self.pop()
+            if repetition:
                 return True
 
-            self.pop()
-
         return False
 
     def _push_capture(self, move, capture_square, piece_type, was_promoted):
@@ -2116,6 +2435,13 @@ class Board(BaseBoard):
         """
         move = self._to_chess960(move)
 
+        # The castling, en passant and turn parts of the hash, which are
+        # updated with the move. The pieces keep their own incremental hash.
+        state_hash = self._polyglot_zobrist_hash() ^ self.incremental_zobrist_hash
+        if self.ep_square:
+            state_hash ^= self._ep_zobrist_hash(POLYGLOT_RANDOM_ARRAY)
+        state_hash ^= POLYGLOT_RANDOM_ARRAY[780]
+
         # Remember game state.
         self.stack.append(_BoardState(self))
         self.move_stack.append(move)
@@ -2129,6 +2455,7 @@ class Board(BaseBoard):
             self.turn = not self.turn
             self.halfmove_clock += 1
             self.ep_square = 0
+            self._push_zobrist_hash(state_hash)
             return
 
         # Drops.
@@ -2137,6 +2464,7 @@ class Board(BaseBoard):
             self.turn = not self.turn
             self.halfmove_clock += 1
             self.ep_square = 0
+            self._push_zobrist_hash(state_hash)
             return
 
         promoted = self.promoted & BB_SQUARES[move.from_square]
@@ -2151,19 +2479,22 @@ class Board(BaseBoard):
             self.halfmove_clock += 1
 
         # Update castling rights.
-        self.castling_rights = self.clean_castling_rights()
-        self.castling_rights &= ~BB_SQUARES[move.to_square]
-        self.castling_rights &= ~BB_SQUARES[move.from_square]
-        if piece_type == KING and not promoted:
-            if self.turn == WHITE:
-                self.castling_rights &= ~BB_RANK_1
-            else:
-                self.castling_rights &= ~BB_RANK_8
-        elif captured_piece_type == KING and not self.promoted & BB_SQUARES[move.to_square]:
-            if self.turn == WHITE and rank_index(move.to_square) == 7:
-                self.castling_rights &= ~BB_RANK_8
-            elif self.turn == BLACK and rank_index(move.to_square) == 0:
-                self.castling_rights &= ~BB_RANK_1
+        castling_rights = BB_VOID
+        if self.castling_rights:
+            castling_rights = self.castling_rights = self.clean_castling_rights()
+            castling_hash = self._castling_zobrist_hash(POLYGLOT_RANDOM_ARRAY, castling_rights)
+            self.castling_rights &= ~BB_SQUARES[move.to_square]
+            self.castling_rights &= ~BB_SQUARES[move.from_square]
+            if piece_type == KING and not promoted:
+                if self.turn == WHITE:
+                    self.castling_rights &= ~BB_RANK_1
+                else:
+                    self.castling_rights &= ~BB_RANK_8
+            elif captured_piece_type == KING and not self.promoted & BB_SQUARES[move.to_square]:
+                if self.turn == WHITE and rank_index(move.to_square) == 7:
+                    self.castling_rights &= ~BB_RANK_8
+                elif self.turn == BLACK and rank_index(move.to_square) == 0:
+                    self.castling_rights &= ~BB_RANK_1
 
         # Promotion.
         if move.promotion:
@@ -2220,39 +2551,35 @@ class Board(BaseBoard):
         # Swap turn.
         self.turn = not self.turn
 
-        # Update transposition table.
-        self.transpositions.update((self.zobrist_hash(), ))
+        # Castling rights only ever shrink, and only then does their part of
+        # the hash change.
+        if self.castling_rights != castling_rights:
+            state_hash ^= castling_hash
+            if self.castling_rights:
+                state_hash ^= self._castling_zobrist_hash(POLYGLOT_RANDOM_ARRAY, self.clean_castling_rights())
+        if self.ep_square:
+            state_hash ^= self._ep_zobrist_hash(POLYGLOT_RANDOM_ARRAY)
+        self._push_zobrist_hash(state_hash)
+
+    def _push_zobrist_hash(self, state_hash):
+        # Completes the hash of the position after a move and remembers it
+        # for repetition detection.
+        self._zobrist_hash = state_hash ^ self.incremental_zobrist_hash
+        self._zobrist_key = self._position_key()
+        self.hash_stack.append(self.zobrist_hash())
 
     def pop(self):
         """
         Restores the previous position and returns the last move from the stack.
         """
         stack_move = self.move_stack.pop()
-        state = self.stack.pop()
+        self.hash_stack.pop()
 
-        # Update transposition table.
-        self.transpositions.subtract((self.zobrist_hash(), ))
-
-        self.pawns = state.pawns
-        self.knights = state.knights
-        self.bishops = state.bishops
-        self.rooks = state.rooks
-        self.queens = state.queens
-        self.kings = state.kings
-
-        self.occupied_co[WHITE] = state.occupied_w
-        self.occupied_co[BLACK] = state.occupied_b
-        self.occupied = state.occupied
-
-        self.promoted = state.promoted
-
-        self.incremental_zobrist_hash = state.incremental_zobrist_hash
-
-        self.turn = state.turn
-        self.castling_rights = state.castling_rights
-        self.ep_square = state.ep_square
-        self.halfmove_clock = state.halfmove_clock
-        self.fullmove_number = state.fullmove_number
+        (self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+         self.occupied_co[WHITE], self.occupied_co[BLACK], self.occupied, self.promoted,
+         self.incremental_zobrist_hash,
+         self.turn, self.castling_rights, self.ep_square, self.halfmove_clock, self.fullmove_number,
+         self._zobrist_hash, self._zobrist_key, self._info, self._info_key) = self.stack.pop()
 
         return stack_move
 
@@ -3331,6 +3658,10 @@ class Board(BaseBoard):
             if not self.is_into_check(move):
                 yield move
 
+    def generate_legal_move_codes(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        """Gets the :func:`codes <chess.Move.code()>` of the legal moves as an ``array('H')``."""
+        return array.array("H", [move.code() for move in self.generate_legal_moves(from_mask, to_mask)])
+
     def generate_legal_captures(self, from_mask=BB_ALL, to_mask=BB_ALL):
         return itertools.chain(
             self.generate_legal_moves(from_mask, to_mask & self.occupied_co[not self.turn]),
@@ -3347,15 +3678,12 @@ class Board(BaseBoard):
 
             mask = self.pin_mask(self.turn, from_square)
             moves = self.attacks_mask(from_square) & ~our_pieces & mask & to_mask
-            to_square = bit_scan(moves)
-            while to_square != -1 and to_square is not None:
+            for to_square in scan_forward(moves):
                 if from_bb & self.kings and self.attackers_mask(not self.turn, to_square):
                     # Do not move the king into check.
                     pass
                 else:
-                    yield Move(from_square, to_square)
-
-                to_square = bit_scan(moves, to_square + 1)
+                    yield MOVES[from_square | to_square << 6]
 
             non_pawns = non_pawns & (non_pawns - 1)
 
@@ -3370,26 +3698,20 @@ class Board(BaseBoard):
             return
 
         # Generate pawn captures.
-        from_square = bit_scan(pawns)
-        while from_square != -1 and from_square is not None:
+        for from_square in scan_forward(pawns):
             targets = (
                 BB_PAWN_ATTACKS[self.turn][from_square] &
                 self.occupied_co[not self.turn] & to_mask &
                 self.pin_mask(self.turn, from_square))
 
-            to_square = bit_scan(targets)
-            while to_square != -1 and to_square is not None:
+            for to_square in scan_forward(targets):
                 if rank_index(to_square) in [0, 7]:
-                    yield Move(from_square, to_square, QUEEN)
-                    yield Move(from_square, to_square, ROOK)
-                    yield Move(from_square, to_square, BISHOP)
-                    yield Move(from_square, to_square, KNIGHT)
+                    yield MOVES[from_square | to_square << 6 | QUEEN << 12]
+                    yield MOVES[from_square | to_square << 6 | ROOK << 12]
+                    yield MOVES[from_square | to_square << 6 | BISHOP << 12]
+                    yield MOVES[from_square | to_square << 6 | KNIGHT << 12]
                 else:
-                    yield Move(from_square, to_square)
-
-                to_square = bit_scan(targets, to_square + 1)
-
-            from_square = bit_scan(pawns, from_square + 1)
+                    yield MOVES[from_square | to_square << 6]
 
         # Generate en passant captures.
         ep_square_mask = BB_SQUARES[self.ep_square] if self.ep_square else BB_VOID
@@ -3403,7 +3725,7 @@ class Board(BaseBoard):
                     if self._ep_skewered(capturer_bb):
                         break
                     else:
-                        yield Move(capturer, self.ep_square)
+                        yield MOVES[capturer | self.ep_square << 6]
 
                 capturers = capturers & (capturers - 1)
 
@@ -3427,12 +3749,12 @@ class Board(BaseBoard):
             mask = self.pin_mask(self.turn, from_square)
             if mask & to_bb:
                 if BB_BACKRANKS & to_bb:
-                    yield Move(from_square, to_square, QUEEN)
-                    yield Move(from_square, to_square, ROOK)
-                    yield Move(from_square, to_square, BISHOP)
-                    yield Move(from_square, to_square, KNIGHT)
+                    yield MOVES[from_square | to_square << 6 | QUEEN << 12]
+                    yield MOVES[from_square | to_square << 6 | ROOK << 12]
+                    yield MOVES[from_square | to_square << 6 | BISHOP << 12]
+                    yield MOVES[from_square | to_square << 6 | KNIGHT << 12]
                 else:
-                    yield Move(from_square, to_square)
+                    yield MOVES[from_square | to_square << 6]
 
             single_moves = single_moves & (single_moves - 1)
 
@@ -3444,16 +3766,14 @@ class Board(BaseBoard):
 
             mask = self.pin_mask(self.turn, from_square)
             if mask & to_bb:
-                yield Move(from_square, to_square)
+                yield MOVES[from_square | to_square << 6]
 
             double_moves = double_moves & (double_moves - 1)
 
     def _attacked_for_king(self, path):
-        test_square = bit_scan(path)
-        while test_square != -1 and test_square is not None:
+        for test_square in scan_forward(path):
             if self.attackers_mask(not self.turn, test_square):
                 return True
-            test_square = bit_scan(path, test_square + 1)
         return False
 
     def generate_castling_moves(self, from_mask=BB_ALL, to_mask=BB_ALL):
@@ -3553,7 +3873,7 @@ class Board(BaseBoard):
             ep_capturers = BB_PAWN_ATTACKS[not self.turn][self.ep_square] & our_pawns
 
         # Look up all pieces giving check.
-        king_attackers = self.attackers_mask(not self.turn, king_square)
+        king_attackers = self.checkers_mask()
         assert king_attackers
         num_attackers = pop_count(king_attackers)
 
@@ -3578,16 +3898,16 @@ class Board(BaseBoard):
                     if ep_square_mask & mask & to_mask:
                         # Capture the attacking pawn en passant.
                         if not self._ep_skewered(attacker):
-                            yield Move(from_square, self.ep_square)
+                            yield MOVES[from_square | self.ep_square << 6]
                 elif king_attackers & mask & to_mask:
                     if attacker & our_pawns and king_attackers & BB_BACKRANKS:
                         # Capture the attacker with a pawn and promote.
-                        yield Move(from_square, to_square, QUEEN)
-                        yield Move(from_square, to_square, ROOK)
-                        yield Move(from_square, to_square, BISHOP)
-                        yield Move(from_square, to_square, KNIGHT)
+                        yield MOVES[from_square | to_square << 6 | QUEEN << 12]
+                        yield MOVES[from_square | to_square << 6 | ROOK << 12]
+                        yield MOVES[from_square | to_square << 6 | BISHOP << 12]
+                        yield MOVES[from_square | to_square << 6 | KNIGHT << 12]
                     else:
-                        yield Move(from_square, to_square)
+                        yield MOVES[from_square | to_square << 6]
 
                 attacker_attackers = attacker_attackers & (attacker_attackers - 1)
 
@@ -3628,9 +3948,9 @@ class Board(BaseBoard):
                 any_capture = to_bb & ~attacker_masks
 
                 if to_bb & their_pieces and not attacked_square and (capture_attacker or any_capture):
-                    yield Move(king_square, to_square)
+                    yield MOVES[king_square | to_square << 6]
                 elif to_bb and not attacked_square and not (to_bb & attacker_masks):
-                    yield Move(king_square, to_square)
+                    yield MOVES[king_square | to_square << 6]
 
                 moves = moves & (moves - 1)
 
@@ -3662,13 +3982,10 @@ class Board(BaseBoard):
 
                 # Blocking piece moves (excluding pawns and the king).
                 blockers = self.attackers_mask(self.turn, empty_square) & ~our_pawns & ~our_king & from_mask
-                blocker = bit_scan(blockers)
-                while blocker != -1 and blocker is not None:
+                for blocker in scan_forward(blockers):
                     mask = self.pin_mask(self.turn, blocker)
                     if mask & empty_bb:
-                        yield Move(blocker, empty_square)
-
-                    blocker = bit_scan(blockers, blocker + 1)
+                        yield MOVES[blocker | empty_square << 6]
 
                 # Generate pawn advances to the empty square.
                 blocking_pawn = empty_bb & forward_pawns
@@ -3678,12 +3995,12 @@ class Board(BaseBoard):
 
                     if from_bb & from_mask and self.pin_mask(self.turn, from_square) & empty_bb:
                         if empty_bb & BB_BACKRANKS:
-                            yield Move(from_square, empty_square, QUEEN)
-                            yield Move(from_square, empty_square, ROOK)
-                            yield Move(from_square, empty_square, BISHOP)
-                            yield Move(from_square, empty_square, KNIGHT)
+                            yield MOVES[from_square | empty_square << 6 | QUEEN << 12]
+                            yield MOVES[from_square | empty_square << 6 | ROOK << 12]
+                            yield MOVES[from_square | empty_square << 6 | BISHOP << 12]
+                            yield MOVES[from_square | empty_square << 6 | KNIGHT << 12]
                         else:
-                            yield Move(from_square, empty_square)
+                            yield MOVES[from_square | empty_square << 6]
                 else:
                     # Generate double pawn advances to the empty square.
                     # Make sure the square inbetween is not occupied.
@@ -3701,7 +4018,7 @@ class Board(BaseBoard):
                         if from_bb & from_mask and middle_bb & ~self.occupied:
                             mask = self.pin_mask(self.turn, from_square)
                             if mask & empty_bb:
-                                yield Move(from_square, empty_square)
+                                yield MOVES[from_square | empty_square << 6]
 
                 moves = moves & (moves - 1)
 
@@ -3709,29 +4026,29 @@ class Board(BaseBoard):
         if not self.chess960 and from_square in [E1, E8] and to_square in [A1, H1, A8, H8] and self.piece_type_at(from_square) == KING:
             if from_square == E1:
                 if to_square == H1:
-                    return Move(E1, G1)
+                    return MOVES[E1 | G1 << 6]
                 elif to_square == A1:
-                    return Move(E1, C1)
+                    return MOVES[E1 | C1 << 6]
             elif from_square == E8:
                 if to_square == H8:
-                    return Move(E8, G8)
+                    return MOVES[E8 | G8 << 6]
                 elif to_square == A8:
-                    return Move(E8, C8)
+                    return MOVES[E8 | C8 << 6]
 
-        return Move(from_square, to_square, promotion)
+        return Move.from_code(from_square | to_square << 6 | (promotion or 0) << 12)
 
     def _to_chess960(self, move):
         if move.from_square in [E1, E8] and move.to_square in [C1, G1, C8, G8] and self.piece_type_at(move.from_square) == KING and self.piece_type_at(move.to_square) != ROOK:
             if move.from_square == E1:
                 if move.to_square == G1:
-                    return Move(E1, H1)
+                    return MOVES[E1 | H1 << 6]
                 elif move.to_square == C1:
-                    return Move(E1, A1)
+                    return MOVES[E1 | A1 << 6]
             elif move.from_square == E8:
                 if move.to_square == G8:
-                    return Move(E8, H8)
+                    return MOVES[E8 | H8 << 6]
                 elif move.to_square == C8:
-                    return Move(E8, A8)
+                    return MOVES[E8 | A8 << 6]
 
         return move
 
@@ -3779,6 +4096,18 @@ class Board(BaseBoard):
         except AttributeError:
             return NotImplemented
 
+    def _position_key(self):
+        # Identifies the position for the cached zobrist hash and position
+        # info. The pieces are covered by their incremental hash.
+        return (self.incremental_zobrist_hash, self.turn, self.castling_rights, self.ep_square, self.chess960)
+
+    def _position_info(self):
+        key = self._position_key()
+        if key != self._info_key:
+            self._info = _PositionInfo()
+            self._info_key = key
+        return self._info
+
     def zobrist_hash(self, array=None):
         """
         Returns a Zobrist hash of the current position.
@@ -3791,36 +4120,33 @@ class Board(BaseBoard):
         The default behaviour is to use values from
         :data:`~chess.POLYGLOT_RANDOM_ARRAY`, which makes for hashes compatible
         with polyglot opening books.
-        """
-        # Hash in the board setup.
-        zobrist_hash = self.board_zobrist_hash(array)
 
-        # Default random array is polyglot compatible.
+        With the default array the hash is updated by
+        :func:`~chess.Board.push()` and restored by :func:`~chess.Board.pop()`.
+        It is only computed from scratch, from the incremental hash of the
+        pieces, when the position was changed some other way.
+        """
         if array is None:
-            array = POLYGLOT_RANDOM_ARRAY
+            return self._polyglot_zobrist_hash()
+
+        return self._compute_zobrist_hash(array, self.board_zobrist_hash(array))
+
+    def _polyglot_zobrist_hash(self):
+        # The hash with the default array, which variants can not extend.
+        key = self._position_key()
+        if key != self._zobrist_key:
+            self._zobrist_hash = self._compute_zobrist_hash(POLYGLOT_RANDOM_ARRAY, self.incremental_zobrist_hash)
+            self._zobrist_key = key
+        return self._zobrist_hash
 
+    def _compute_zobrist_hash(self, array, zobrist_hash):
         # Hash in the castling flags.
-        if self.has_kingside_castling_rights(WHITE):
-            zobrist_hash ^= array[768]
-        if self.has_queenside_castling_rights(WHITE):
-            zobrist_hash ^= array[768 + 1]
-        if self.has_kingside_castling_rights(BLACK):
-            zobrist_hash ^= array[768 + 2]
-        if self.has_queenside_castling_rights(BLACK):
-            zobrist_hash ^= array[768 + 3]
+        if self.castling_rights:
+            zobrist_hash ^= self._castling_zobrist_hash(array, self.clean_castling_rights())
 
         # Hash in the en passant file.
         if self.ep_square:
-            # But only if theres actually a pawn ready to capture it. Legality
-            # of the potential capture is irrelevant.
-            if self.turn == WHITE:
-                ep_mask = shift_down(BB_SQUARES[self.ep_square])
-            else:
-                ep_mask = shift_up(BB_SQUARES[self.ep_square])
-            ep_mask = shift_left(ep_mask) | shift_right(ep_mask)
-
-            if ep_mask & self.pawns & self.occupied_co[self.turn]:
-                zobrist_hash ^= array[772 + file_index(self.ep_square)]
+            zobrist_hash ^= self._ep_zobrist_hash(array)
 
         # Hash in the turn.
         if self.turn == WHITE:
@@ -3828,6 +4154,48 @@ class Board(BaseBoard):
 
         return zobrist_hash
 
+    def _ep_zobrist_hash(self, array):
+        # Only if theres actually a pawn ready to capture en passant. Legality
+        # of the potential capture is irrelevant.
+        if self.turn == WHITE:
+            ep_mask = shift_down(BB_SQUARES[self.ep_square])
+        else:
+            ep_mask = shift_up(BB_SQUARES[self.ep_square])
+        ep_mask = shift_left(ep_mask) | shift_right(ep_mask)
+
+        if ep_mask & self.pawns & self.occupied_co[self.turn]:
+            return array[772 + file_index(self.ep_square)]
+        return 0
+
+    def _castling_zobrist_hash(self, array, castling_rights):
+        # Same as hashing in has_kingside_castling_rights() and
+        # has_queenside_castling_rights() of both sides, given the clean
+        # castling rights.
+        zobrist_hash = 0
+
+        for color, backrank, offset in [(WHITE, BB_RANK_1, 768), (BLACK, BB_RANK_8, 768 + 2)]:
+            king_mask = self.kings & self.occupied_co[color]
+            rooks = castling_rights & backrank
+            if not king_mask or not rooks:
+                continue
+
+            king_file = file_index(bit_scan(king_mask))
+            kingside = queenside = False
+            while rooks:
+                rook_file = file_index(bit_scan(rooks & -rooks))
+                if rook_file > king_file:
+                    kingside = True
+                elif rook_file < king_file:
+                    queenside = True
+                rooks = rooks & (rooks - 1)
+
+            if kingside:
+                zobrist_hash ^= array[offset]
+            if queenside:
+                zobrist_hash ^= array[offset + 1]
+
+        return zobrist_hash
+
     def copy(self, stack=True):
         board = super(Board, self).copy()
 
@@ -3842,9 +4210,10 @@ class Board(BaseBoard):
         if stack:
             board.move_stack = copy.deepcopy(self.move_stack)
             board.stack = copy.copy(self.stack)
-            board.transpositions = copy.copy(self.transpositions)
+            board.hash_stack = copy.copy(self.hash_stack)
         else:
-            board.transpositions.update((self.zobrist_hash(), ))
+            board.hash_stack.clear()
+            board.hash_stack.append(self.zobrist_hash())
 
         return board
 
@@ -3910,7 +4279,7 @@ class LegalMoveGenerator(object):
         self.board = board
 
     def __bool__(self):
-        return any(self.board.generate_legal_moves())
+        return self.board.has_legal_move()
 
     __nonzero__ = __bool__
 
@@ -4080,10 +4449,7 @@ class SquareSet(object):
         return pop_count(self.mask)
 
     def __iter__(self):
-        square = bit_scan(self.mask)
-        while square != -1 and square is not None:
-            yield square
-            square = bit_scan(self.mask, square + 1)
+        return scan_forward(self.mask)
 
     def __reversed__(self):
         string = bin(self.mask)
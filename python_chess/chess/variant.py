@@ -16,9 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import chess
 import copy
 import itertools
+import sys
+
+# The package of this module, also when it is imported as
+# python_chess.chess rather than as chess.
+chess = sys.modules[__name__.rpartition(".")[0]]
 
 
 class SuicideBoard(chess.Board):
@@ -252,6 +256,14 @@ class AtomicBoard(chess.Board):
 
         # Explode all non pawns around.
         explosion_radius = chess.BB_KING_ATTACKS[capture_square] & ~self.pawns
+
+        # Exploded rooks and kings lose their castling rights, like captured
+        # ones, which keeps the hash updated by push() right.
+        self.castling_rights &= ~explosion_radius
+        if explosion_radius & self.kings & self.occupied_co[chess.WHITE]:
+            self.castling_rights &= ~chess.BB_RANK_1
+        if explosion_radius & self.kings & self.occupied_co[chess.BLACK]:
+            self.castling_rights &= ~chess.BB_RANK_8
         explosion = chess.bit_scan(explosion_radius)
         while explosion != -1 and explosion is not None:
             self._remove_piece_at(explosion)
@@ -463,12 +475,15 @@ class ThreeCheckBoard(chess.Board):
         super(ThreeCheckBoard, self).push(move)
         if self.is_check():
             self.remaining_checks[not self.turn] -= 1
+            # The remaining checks are part of the position.
+            self.hash_stack[-1] = self.zobrist_hash()
 
     def pop(self):
         was_in_check = self.is_check()
         move = super(ThreeCheckBoard, self).pop()
         if was_in_check:
             self.remaining_checks[self.turn] += 1
+        return move
 
     def is_insufficient_material(self):
         return self.occupied == self.kings
@@ -483,9 +498,9 @@ class ThreeCheckBoard(chess.Board):
         black_count = min(3, 3 - self.remaining_checks[chess.BLACK])
 
         if white_count > 0:
-            zobrist_hash ^= three_check_array[black_count - 1]
+            zobrist_hash ^= three_check_array[white_count - 1]
         if black_count > 0:
-            zobrist_hash ^= three_check_array[white_count + 2]
+            zobrist_hash ^= three_check_array[black_count + 2]
 
         return zobrist_hash
 
@@ -625,7 +640,7 @@ class CrazyhouseBoard(chess.Board):
         if move.drop:
             self.pockets[self.turn].add(move.drop)
         elif self.is_capture(move):
-            if chess.BB_SQUARES[move.to_square] & self.promoted:
+            if chess.BB_SQUARES[move.to_square] & self.promoted or self.is_en_passant(move):
                 self.pockets[self.turn].remove(chess.PAWN)
             else:
                 self.pockets[self.turn].remove(self.piece_type_at(move.to_square))
@@ -645,6 +660,11 @@ class CrazyhouseBoard(chess.Board):
     def is_zeroing(self, move):
         return False
 
+    def _position_key(self):
+        # Legal drops depend on the pockets.
+        key = super(CrazyhouseBoard, self)._position_key()
+        return key + (str(self.pockets[chess.WHITE]), str(self.pockets[chess.BLACK]))
+
     def legal_drop_squares_mask(self):
         king_bb = self.kings & self.occupied_co[self.turn]
         king_square = chess.bit_scan(king_bb)
@@ -49,6 +49,25 @@ def into_check_perft(board, depth):
         return 1
 
 
+def zobrist_perft(board, depth, test_case):
+    # Compares the incrementally updated hash with one computed from scratch
+    # at every node.
+    test_case.assertEqual(board.zobrist_hash(), board.zobrist_hash(chess.POLYGLOT_RANDOM_ARRAY), board.fen())
+
+    if depth >= 1:
+        count = 0
+
+        for move in board.legal_moves:
+            board.push(move)
+            count += zobrist_perft(board, depth - 1, test_case)
+            board.pop()
+
+        test_case.assertEqual(board.zobrist_hash(), board.zobrist_hash(chess.POLYGLOT_RANDOM_ARRAY), board.fen())
+        return count
+    else:
+        return 1
+
+
 def debug_perft(board, depth):
     assert board.is_valid()
 
@@ -103,6 +122,21 @@ class PerftTestCase(unittest.TestCase):
     def test_into_check(self):
         self.execute_test(into_check_perft, 1000)
 
+    def test_zobrist(self):
+        self.execute_test(lambda board, depth: zobrist_perft(board, depth, self), 1000)
+
+        # Castling rights in Chess960.
+        board = chess.Board("r1k1r2q/p1ppp1pp/8/8/8/8/P1PPP1PP/R1K1R2Q w KQkq - 0 1", chess960=True)
+        self.assertEqual(zobrist_perft(board, 3, self), 12333)
+
+        # Explosions take castling rights, three-check adds to the hash.
+        fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+        self.assertEqual(zobrist_perft(chess.variant.AtomicBoard(fen), 2, self), 1939)
+        board = chess.variant.ThreeCheckBoard(fen.replace(" 0 1", " 3+3 0 1"))
+        self.assertEqual(zobrist_perft(board, 3, self), 97862)
+        sys.stdout.write(".\n")
+        sys.stdout.flush()
+
     def test_debug(self):
         self.execute_test(debug_perft, 100)
 
@@ -25,6 +25,8 @@ import chess.syzygy
 import chess.gaviota
 import chess.variant
 import os.path
+import shutil
+import tempfile
 import textwrap
 import sys
 import time
@@ -101,6 +103,26 @@ class MoveTestCase(unittest.TestCase):
         self.assertEqual(chess.Move.from_uci("e7e8q").uci(), "e7e8q")
         self.assertEqual(chess.Move.from_uci("P@e4").uci(), "P@e4")
 
+    def test_code(self):
+        move = chess.Move.from_uci("e7e8q")
+        self.assertEqual(move.code(), chess.E7 | chess.E8 << 6 | chess.QUEEN << 12)
+        self.assertEqual(chess.Move.from_code(move.code()), move)
+        self.assertTrue(chess.Move.from_code(move.code()) is chess.MOVES[move.code()])
+        self.assertEqual(chess.Move.from_code(0), chess.Move.null())
+        self.assertRaises(ValueError, chess.Move.from_uci("P@e4").code)
+
+        # Codes of moves that can not be played still decode.
+        self.assertEqual(chess.Move.from_code(chess.E4 | chess.E5 << 6 | chess.QUEEN << 12).uci(), "e4e5q")
+
+    def test_move_table(self):
+        board = chess.Board("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        for move in board.legal_moves:
+            self.assertTrue(move is chess.MOVES[move.code()])
+
+        codes = board.generate_legal_move_codes()
+        self.assertEqual(codes.typecode, "H")
+        self.assertEqual([chess.Move.from_code(code) for code in codes], list(board.legal_moves))
+
 
 class PieceTestCase(unittest.TestCase):
 
@@ -874,6 +896,42 @@ class BoardTestCase(unittest.TestCase):
 
         self.assertFalse(board.attacks(chess.G1))
 
+    def test_slider_attack_tables(self):
+        for square, bb_square in enumerate(chess.BB_SQUARES):
+            for occupied in [chess.BB_VOID, chess.BB_ALL, chess.BB_DARK_SQUARES, 0x00ff00000000ff00, 0x8142241818244281]:
+                occupied &= ~bb_square
+
+                rook_attacks = (
+                    chess.RANK_ATTACKS[bb_square][chess.RANK_MASK[bb_square] & occupied] |
+                    chess.FILE_ATTACKS[bb_square][chess.FILE_MASK[bb_square] & occupied])
+                self.assertEqual(chess.BB_ROOK_ATTACKS[square][chess.BB_ROOK_MASKS[square] & occupied], rook_attacks)
+
+                bishop_attacks = (
+                    chess.DIAG_ATTACKS_NE[bb_square][chess.DIAG_MASK_NE[bb_square] & occupied] |
+                    chess.DIAG_ATTACKS_NW[bb_square][chess.DIAG_MASK_NW[bb_square] & occupied])
+                self.assertEqual(chess.BB_BISHOP_ATTACKS[square][chess.BB_BISHOP_MASKS[square] & occupied], bishop_attacks)
+
+    def test_attack_table_cache(self):
+        tables = (chess.DIAG_ATTACKS_NE, chess.DIAG_ATTACKS_NW, chess.FILE_ATTACKS, chess.RANK_ATTACKS,
+                  chess.BB_ROOK_ATTACKS, chess.BB_BISHOP_ATTACKS)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "attack_tables.bin")
+            self.assertEqual(chess._read_attack_tables(path), None)
+
+            chess._write_attack_tables(path, tables)
+            self.assertEqual(tuple(chess._read_attack_tables(path)), tables)
+
+            # Corrupted caches are ignored.
+            with open(path, "rb") as f:
+                data = bytearray(f.read())
+            data[-1] ^= 0xff
+            with open(path, "wb") as f:
+                f.write(data)
+            self.assertEqual(chess._read_attack_tables(path), None)
+        finally:
+            shutil.rmtree(directory)
+
     def test_clear(self):
         board = chess.Board()
         board.clear()
@@ -930,6 +988,35 @@ class BoardTestCase(unittest.TestCase):
             board.pop()
             self.assertFalse(board.can_claim_threefold_repetition())
 
+    def test_is_repetition(self):
+        board = chess.Board()
+        self.assertTrue(board.is_repetition(1))
+        self.assertFalse(board.is_repetition(2))
+
+        for san in ["Nf3", "Nf6", "Ng1", "Ng8"] * 2:
+            board.push_san(san)
+        self.assertTrue(board.is_repetition(3))
+        self.assertFalse(board.is_repetition(4))
+
+        # Positions with the other side to move do not count.
+        board.push_san("Nf3")
+        self.assertTrue(board.is_repetition(3))
+        board.push_san("Nc6")
+        self.assertFalse(board.is_repetition(2))
+
+        # Nothing before a pawn move can repeat.
+        board.push_san("e4")
+        board.push_san("Nb8")
+        board.push_san("Ng1")
+        self.assertFalse(board.is_repetition(2))
+
+        # The history is copied with the stack.
+        for _ in range(4):
+            board.pop()
+        self.assertTrue(board.copy().is_repetition(2))
+        self.assertFalse(board.copy(stack=False).is_repetition(2))
+        self.assertEqual(len(board.hash_stack), len(board.move_stack) + 1)
+
     def test_fivefold_repetition(self):
         fen = "rnbq1rk1/ppp3pp/3bpn2/3p1p2/2PP4/2NBPN2/PP3PPP/R1BQK2R w KQ - 3 7"
         board = chess.Board(fen)
@@ -1156,6 +1243,32 @@ class BoardTestCase(unittest.TestCase):
 
         self.assertEqual(board.pin(chess.WHITE, chess.D2), chess.BB_E1 | chess.BB_D2 | chess.BB_C3 | chess.BB_B4 | chess.BB_A5)
 
+    def test_position_info(self):
+        board = chess.Board("4k3/8/8/8/1b6/8/3N4/4K2r w - - 0 1")
+        self.assertEqual(board.checkers_mask(), chess.BB_H1)
+        self.assertTrue(board.is_pinned(chess.WHITE, chess.D2))
+        self.assertTrue(board.has_legal_move())
+        self.assertTrue(board.attacked_mask(chess.BLACK) & chess.BB_E1)
+        self.assertTrue(board.is_attacked_by(chess.BLACK, chess.G1))
+        self.assertFalse(board.is_attacked_by(chess.BLACK, chess.E2))
+
+        # Changes without push() and pop() are noticed as well.
+        board.remove_piece_at(chess.H1)
+        self.assertFalse(board.is_check())
+        self.assertTrue(board.is_pinned(chess.WHITE, chess.D2))
+        self.assertFalse(board.is_attacked_by(chess.BLACK, chess.G1))
+
+        board.push_san("Kf2")
+        self.assertFalse(board.is_check())
+        self.assertFalse(board.is_pinned(chess.WHITE, chess.D2))
+        board.pop()
+        self.assertTrue(board.is_pinned(chess.WHITE, chess.D2))
+
+        board = chess.Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertFalse(board.has_legal_move())
+        self.assertTrue(board.is_stalemate())
+        self.assertFalse(board.legal_moves)
+
     def test_impossible_en_passant(self):
         # Not a pawn there.
         board = chess.Board("1b1b4/8/b1P5/2kP4/8/2b4K/8/8 w - c6 0 1")
@@ -1319,6 +1432,15 @@ class SquareSetTestCase(unittest.TestCase):
         self.assertEqual(chess.SquareSet(chess.BB_ALL), chess.BB_ALL)
         self.assertEqual(chess.BB_ALL, chess.SquareSet(chess.BB_ALL))
 
+    def test_bit_operations(self):
+        for mask in [chess.BB_VOID, chess.BB_ALL, chess.BB_A1 | chess.BB_H8, chess.BB_LIGHT_SQUARES, 0x8000000000000001 >> 1]:
+            squares = [square for square in chess.SQUARES if mask & chess.BB_SQUARES[square]]
+            self.assertEqual(list(chess.scan_forward(mask)), squares)
+            self.assertEqual(chess.pop_count(mask), len(squares))
+            self.assertEqual(chess.bit_scan(mask) if squares else -1, squares[0] if squares else -1)
+            for square in squares[1:]:
+                self.assertEqual(chess.bit_scan(mask, square), square)
+
     def test_string_conversion(self):
         expected = textwrap.dedent("""\
             . . . . . . . 1
@@ -2899,6 +3021,39 @@ class ThreeCheckTestCase(unittest.TestCase):
         # Check count differs.
         self.assertNotEqual(board_a.zobrist_hash(), board_b.zobrist_hash())
 
+        # All check counts differ.
+        hashes = set()
+        for white in range(4):
+            for black in range(4):
+                board_a.remaining_checks = [black, white]
+                hashes.add(board_a.zobrist_hash())
+        self.assertEqual(len(hashes), 16)
+
+    def test_push_pop(self):
+        fen = "4k3/8/8/8/8/8/8/R3K3 w - - 3+3 0 1"
+        board = chess.variant.ThreeCheckBoard(fen)
+
+        for san in ["Ra8+", "Kf7", "Ra1", "Ke8"] * 2:
+            board.push_san(san)
+        self.assertEqual(board.epd(), "4k3/8/8/8/8/8/8/R3K3 w - - 1+3")
+        self.assertEqual(board.hash_stack[-1], board.zobrist_hash())
+
+        # The pieces are back, but with fewer checks left.
+        self.assertFalse(board.is_repetition(2))
+
+        self.assertEqual(board.pop(), chess.Move.from_uci("f7e8"))
+        self.assertEqual(board.pop(), chess.Move.from_uci("a8a1"))
+        self.assertEqual(board.pop(), chess.Move.from_uci("e8f7"))
+        self.assertEqual(board.remaining_checks, [3, 1])
+        self.assertEqual(board.pop(), chess.Move.from_uci("a1a8"))
+        self.assertEqual(board.remaining_checks, [3, 2])
+        self.assertEqual(board.epd(), "4k3/8/8/8/8/8/8/R3K3 w - - 2+3")
+        self.assertEqual(board.hash_stack[-1], board.zobrist_hash())
+
+        while board.move_stack:
+            board.pop()
+        self.assertEqual(board.fen(), fen)
+
 
 class CrazyhouseTestCase(unittest.TestCase):
 
@@ -2941,6 +3096,13 @@ class CrazyhouseTestCase(unittest.TestCase):
         board.pop()
         self.assertEqual(board.fen(), "4k3/8/8/8/8/8/1p6/2R1K3[] b - - 0 1")
 
+    def test_en_passant_pop(self):
+        board = chess.variant.CrazyhouseBoard("4k3/8/8/3pP3/8/8/8/4K3[] w - d6 0 2")
+        board.push_san("exd6")
+        self.assertEqual(board.fen(), "4k3/8/3P4/8/8/8/8/4K3[P] b - - 1 2")
+        board.pop()
+        self.assertEqual(board.fen(), "4k3/8/8/3pP3/8/8/8/4K3[] w - d6 0 2")
+
 
 if __name__ == "__main__":
     if "-v" in sys.argv or "--verbose" in sys.argv:
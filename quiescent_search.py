@@ -1,36 +1,125 @@
+from python_chess import chess
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Captures followed at most from a leaf of the main search.
+MAX_QUIESCENCE_DEPTH = 8
+
+# Depth of quiescence results in the transposition table. Low enough that
+# the main search never takes them for its own results.
+QUIESCENCE_TT_DEPTH = -100
+
+# Material won by capturing a piece, in evaluation units, indexed by piece
+# type. A capture that can not bring the score up to alpha even with
+# DELTA_MARGIN on top is not searched.
+DELTA_VALUES = [0, 20, 64, 66, 100, 180, 0]
+DELTA_MARGIN = 40
+
+
 def is_quiet_position(board):
     # Not quiet if currently in check
-    if board.is_check:
+    if board.is_check():
         return False
 
-    # Not quiet if last move was a capture move
-    last_move = board.pop()
-    if board.is_capture(last_move):
-        board.push(last_move)
+    # Not quiet if last move was a capture move.
+    if board.was_capture():
         return False
 
-    board.push(last_move)
     return True
 
 
-def quiescent_search(board, alpha, beta, eval_func):
-    stand_pat = eval_func(board)
+class QuiescenceSearch(object):
+    """
+    Searches captures from the leaves of the main search until the position
+    is quiet. Runs on a :class:`~search_board.SearchBoard`.
+
+    Scores are from the point of view of the side to move. Captures are
+    ordered by *orderer* and searched at most *max_depth* plies deep.
+    *tt* is probed and filled if given. *on_node* is called for every node,
+    which is also counted in *nodes*. The deepest ply searched is kept in
+    *max_depth_reached*. *ply* is the distance of the position from the
+    root of the main search, which the table needs for mate scores.
+    """
 
-    if stand_pat >= beta:
-        return beta
+    def __init__(self, eval_func, orderer=None, tt=None, max_depth=MAX_QUIESCENCE_DEPTH, on_node=None):
+        self.eval_func = eval_func
+        self.orderer = orderer
+        self.tt = tt
+        self.max_depth = max_depth
+        self.on_node = on_node
+        self.nodes = 0
+        self.max_depth_reached = 0
 
-    if alpha < stand_pat:
-        alpha = stand_pat
+    def search(self, board, alpha, beta, depth=0, ply=0):
+        self.nodes += 1
+        if depth > self.max_depth_reached:
+            self.max_depth_reached = depth
+        if self.on_node is not None:
+            self.on_node()
 
-    for capture_move in board.generate_legal_captures():
-        board.push(capture_move)
-        score = -quiescent_search(board, -beta, -alpha, eval_func)
-        board.pop()
+        entry = None
+        hash_move = None
+        if self.tt is not None:
+            key = board.zobrist_hash()
+            entry = self.tt.probe(key, ply + depth)
+            if entry is not None:
+                if entry.flag == EXACT:
+                    return min(max(entry.score, alpha), beta)
+                elif entry.flag == LOWER_BOUND and entry.score >= beta:
+                    return beta
+                elif entry.flag == UPPER_BOUND and entry.score <= alpha:
+                    return alpha
+                hash_move = entry.move
 
-        if score >= beta:
+        stand_pat = self.eval_func(board)
+
+        if stand_pat >= beta:
             return beta
 
-        if score > alpha:
-            alpha = score
+        if depth >= self.max_depth:
+            return max(alpha, stand_pat)
+
+        alpha_orig = alpha
+        if alpha < stand_pat:
+            alpha = stand_pat
+
+        captures = board.generate_captures()
+        if self.orderer is not None:
+            captures = self.orderer.order_captures(board, captures)
+        if hash_move is not None and hash_move in captures:
+            captures.remove(hash_move)
+            captures.insert(0, hash_move)
+
+        best_move = None
+        for capture_move in captures:
+            # Delta pruning.
+            if not capture_move >> 12:
+                if board.is_en_passant(capture_move):
+                    victim = chess.PAWN
+                else:
+                    victim = board.piece_type_at(capture_move >> 6 & 63)
+                if stand_pat + DELTA_VALUES[victim] + DELTA_MARGIN <= alpha:
+                    continue
+
+            board.push(capture_move)
+            score = -self.search(board, -beta, -alpha, depth + 1, ply)
+            board.pop()
+
+            if score >= beta:
+                self._store(board, entry, beta, LOWER_BOUND, capture_move, ply + depth)
+                return beta
+
+            if score > alpha:
+                alpha = score
+                best_move = capture_move
+
+        self._store(board, entry, alpha, EXACT if alpha > alpha_orig else UPPER_BOUND, best_move, ply + depth)
+        return alpha
+
+    def _store(self, board, entry, score, flag, move, ply):
+        # Results of the main search are worth more, so keep them.
+        if self.tt is not None and (entry is None or entry.depth <= QUIESCENCE_TT_DEPTH):
+            self.tt.store(board.zobrist_hash(), QUIESCENCE_TT_DEPTH, score, flag, move, ply)
+
 
-    return alpha
+def quiescent_search(board, alpha, beta, eval_func, orderer=None):
+    return QuiescenceSearch(eval_func, orderer).search(board, alpha, beta)
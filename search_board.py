@@ -0,0 +1,665 @@
+from python_chess import chess
+from python_chess.chess import BB_SQUARES, BB_KNIGHT_ATTACKS, BB_KING_ATTACKS, BB_PAWN_ATTACKS
+from python_chess.chess import BB_RANK_1, BB_RANK_3, BB_RANK_6, BB_RANK_8, BB_BACKRANKS
+from python_chess.chess import BB_A1, BB_H1, BB_A8, BB_H8
+from python_chess.chess import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK
+from python_chess.chess import POLYGLOT_RANDOM_ARRAY
+from antichess_board import AntichessBoard
+
+# Most plies that can be pushed onto a SearchBoard. The search replays up
+# to 150 plies since the last capture or pawn move before it starts.
+MAX_PLY = 512
+
+# Words per undo record: move, captured piece, castling rights, en passant
+# square, halfmove clock, hash and zobrist key of the position.
+UNDO_SIZE = 7
+
+# Promotions in the order python_chess generates them.
+PROMOTIONS = [QUEEN, ROOK, BISHOP, KNIGHT]
+
+
+def encode_move(move):
+    """Gets the :func:`code <chess.Move.code()>` of a :class:`chess.Move`."""
+    return move.code()
+
+
+def decode_move(move):
+    return chess.Move.from_code(move)
+
+
+# Every square a piece pinned to a king on the square can stand on.
+_KING_LINES = [chess.RANK_MASK[bb] | chess.FILE_MASK[bb] | chess.DIAG_MASK_NE[bb] | chess.DIAG_MASK_NW[bb]
+               for bb in BB_SQUARES]
+
+_ROOK_MASKS = chess.BB_ROOK_MASKS
+_ROOK_ATTACKS = chess.BB_ROOK_ATTACKS
+_BISHOP_MASKS = chess.BB_BISHOP_MASKS
+_BISHOP_ATTACKS = chess.BB_BISHOP_ATTACKS
+
+# Polyglot keys by piece code (piece type | 8 for white) * 64 + square.
+_PIECE_KEYS = [0] * 16 * 64
+for _piece_type in chess.PIECE_TYPES:
+    for _color in chess.COLORS:
+        for _square in range(64):
+            _PIECE_KEYS[(_piece_type | _color << 3) * 64 + _square] = \
+                POLYGLOT_RANDOM_ARRAY[64 * ((_piece_type - 1) * 2 + _color) + _square]
+
+_TURN_KEY = POLYGLOT_RANDOM_ARRAY[780]
+
+
+def _castling_key(castling_rights):
+    key = 0
+    for i, rook in enumerate([BB_H1, BB_A1, BB_H8, BB_A8]):
+        if castling_rights & rook:
+            key ^= POLYGLOT_RANDOM_ARRAY[768 + i]
+    return key
+
+
+def _bishop_attacks(square, occupied):
+    return _BISHOP_ATTACKS[square][_BISHOP_MASKS[square] & occupied]
+
+
+def _rook_attacks(square, occupied):
+    return _ROOK_ATTACKS[square][_ROOK_MASKS[square] & occupied]
+
+
+class SearchBoard(object):
+    """
+    Compact antichess position for the search.
+
+    Holds bitboards, a mailbox of piece codes (piece type | 8 for white) and
+    plain int state. Moves are ints as given by :func:`chess.Move.code()` and
+    castling is encoded as the king move, as in UCI. Push and pop keep undo
+    records in a preallocated array, so at most :data:`MAX_PLY` plies can be
+    pushed.
+
+    Follows the rules of :class:`~antichess_board.AntichessBoard`: moves
+    must be legal in standard chess and captures are forced. Chess960 is
+    not supported. Repetitions are only found among the pushed positions.
+    """
+
+    __slots__ = ["pieces", "occupied_co", "occupied", "squares", "turn", "castling_rights", "ep_square",
+                 "halfmove_clock", "fullmove_number", "hash", "ply", "undo", "evaluator", "evaluator_stack"]
+
+    def __init__(self):
+        # Indexed by piece type.
+        self.pieces = [0] * 7
+        self.occupied_co = [0, 0]
+        self.occupied = 0
+        self.squares = [0] * 64
+        self.turn = WHITE
+        self.castling_rights = 0
+        self.ep_square = 0
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Polyglot key without the en passant file, see zobrist_hash().
+        self.hash = _TURN_KEY
+        self.ply = 0
+        self.undo = [0] * (MAX_PLY * UNDO_SIZE)
+        self.evaluator = None
+        self.evaluator_stack = []
+
+    @classmethod
+    def from_board(cls, board):
+        """Sets up the position of a python_chess board. The move stack is not copied."""
+        if board.chess960:
+            raise ValueError("chess960 is not supported")
+
+        self = cls()
+        for square in range(64):
+            piece_type = board.piece_type_at(square)
+            if piece_type:
+                self._put(square, piece_type | bool(board.occupied_co[WHITE] & BB_SQUARES[square]) << 3)
+
+        self.turn = board.turn
+        self.castling_rights = board.clean_castling_rights()
+        self.ep_square = board.ep_square or 0
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+        self.hash ^= _castling_key(self.castling_rights)
+        if self.turn == BLACK:
+            self.hash ^= _TURN_KEY
+        return self
+
+    def to_board(self, board_class=AntichessBoard):
+        return board_class(self.fen())
+
+    def set_evaluator(self, evaluator):
+        """
+        Attaches an incremental evaluator, as
+        :func:`antichess_board.AntichessBoard.set_evaluator()`.
+        """
+        self.evaluator = evaluator
+        self.evaluator_stack = []
+
+    def _put(self, square, piece):
+        bb = BB_SQUARES[square]
+        self.squares[square] = piece
+        self.pieces[piece & 7] |= bb
+        self.occupied_co[piece >> 3] |= bb
+        self.occupied |= bb
+        self.hash ^= _PIECE_KEYS[piece * 64 + square]
+
+    def piece_type_at(self, square):
+        return self.squares[square] & 7
+
+    @property
+    def pawns(self):
+        return self.pieces[PAWN]
+
+    @property
+    def knights(self):
+        return self.pieces[KNIGHT]
+
+    @property
+    def bishops(self):
+        return self.pieces[BISHOP]
+
+    @property
+    def rooks(self):
+        return self.pieces[ROOK]
+
+    @property
+    def queens(self):
+        return self.pieces[QUEEN]
+
+    @property
+    def kings(self):
+        return self.pieces[KING]
+
+    def zobrist_hash(self):
+        """Gets the polyglot key of the position, as :func:`chess.Board.zobrist_hash()`."""
+        ep_square = self.ep_square
+        if ep_square and self.pieces[PAWN] & self.occupied_co[self.turn] & \
+                BB_PAWN_ATTACKS[not self.turn][ep_square]:
+            return self.hash ^ POLYGLOT_RANDOM_ARRAY[772 + (ep_square & 7)]
+        return self.hash
+
+    def _attacked(self, square, occupied, their_pieces):
+        # Checks if *their_pieces* attack *square* given *occupied*.
+        pieces = self.pieces
+        if BB_KNIGHT_ATTACKS[square] & pieces[KNIGHT] & their_pieces:
+            return True
+        if BB_KING_ATTACKS[square] & pieces[KING] & their_pieces:
+            return True
+        if BB_PAWN_ATTACKS[self.turn][square] & pieces[PAWN] & their_pieces:
+            return True
+
+        queens = pieces[QUEEN]
+        sliders = (pieces[ROOK] | queens) & their_pieces
+        if sliders and _rook_attacks(square, occupied) & sliders:
+            return True
+        sliders = (pieces[BISHOP] | queens) & their_pieces
+        if sliders and _bishop_attacks(square, occupied) & sliders:
+            return True
+        return False
+
+    def _king_square(self):
+        king = self.pieces[KING] & self.occupied_co[self.turn]
+        return (king & -king).bit_length() - 1 if king else None
+
+    def is_check(self):
+        king_square = self._king_square()
+        if king_square is None:
+            return False
+        return self._attacked(king_square, self.occupied, self.occupied_co[not self.turn])
+
+    def is_attacked_by(self, color, square):
+        their_pieces = self.occupied_co[color]
+        if BB_PAWN_ATTACKS[not color][square] & self.pieces[PAWN] & their_pieces:
+            return True
+        return self._attacked(square, self.occupied, their_pieces & ~self.pieces[PAWN])
+
+    def is_capture(self, move):
+        to_square = move >> 6 & 63
+        if self.squares[to_square]:
+            return True
+        return to_square == self.ep_square and self.squares[move & 63] & 7 == PAWN and \
+            ((move & 63) - to_square) & 7 != 0
+
+    def is_en_passant(self, move):
+        to_square = move >> 6 & 63
+        return bool(self.ep_square) and to_square == self.ep_square and not self.squares[to_square] and \
+            self.squares[move & 63] & 7 == PAWN and ((move & 63) - to_square) & 7 != 0
+
+    def was_capture(self):
+        """Checks if the last pushed move took a piece."""
+        if not self.ply:
+            return False
+        i = (self.ply - 1) * UNDO_SIZE
+        move = self.undo[i]
+        # Pawns only move diagonally to capture, also en passant.
+        return bool(self.undo[i + 1]) or \
+            (self.squares[move >> 6 & 63] & 7 == PAWN and ((move & 63) - (move >> 6 & 63)) & 7 != 0)
+
+    def _is_legal(self, move, king_square, in_check):
+        # Checks a pseudo-legal move for leaving our king attacked.
+        if king_square is None:
+            return True
+
+        from_square = move & 63
+        to_square = move >> 6 & 63
+        from_bb = BB_SQUARES[from_square]
+        piece_type = self.squares[from_square] & 7
+        en_passant = piece_type == PAWN and to_square == self.ep_square and (from_square - to_square) & 7 != 0
+
+        if piece_type == KING:
+            king_square = to_square
+        elif not in_check and not en_passant and not from_bb & _KING_LINES[king_square]:
+            # Not pinned.
+            return True
+
+        to_bb = BB_SQUARES[to_square]
+        occupied = self.occupied & ~from_bb | to_bb
+        their_pieces = self.occupied_co[not self.turn] & ~to_bb
+        if en_passant:
+            captured = BB_SQUARES[to_square - 8 if self.turn == WHITE else to_square + 8]
+            occupied &= ~captured
+            their_pieces &= ~captured
+        return not self._attacked(king_square, occupied, their_pieces)
+
+    def _attacks(self, square, piece_type):
+        if piece_type == KNIGHT:
+            return BB_KNIGHT_ATTACKS[square]
+        elif piece_type == KING:
+            return BB_KING_ATTACKS[square]
+        elif piece_type == BISHOP:
+            return _bishop_attacks(square, self.occupied)
+        elif piece_type == ROOK:
+            return _rook_attacks(square, self.occupied)
+        else:
+            return _bishop_attacks(square, self.occupied) | _rook_attacks(square, self.occupied)
+
+    def _generate(self, moves, targets, pawn_targets):
+        # Appends pseudo-legal piece moves to *targets* and pawn captures to
+        # *pawn_targets*.
+        squares = self.squares
+        our_pieces = self.occupied_co[self.turn]
+
+        pieces = our_pieces & ~self.pieces[PAWN]
+        while pieces:
+            bb = pieces & -pieces
+            from_square = bb.bit_length() - 1
+            attacks = self._attacks(from_square, squares[from_square] & 7) & targets
+            while attacks:
+                to_bb = attacks & -attacks
+                moves.append(from_square | (to_bb.bit_length() - 1) << 6)
+                attacks ^= to_bb
+            pieces ^= bb
+
+        pawns = our_pieces & self.pieces[PAWN]
+        pawn_attacks = BB_PAWN_ATTACKS[self.turn]
+        while pawns:
+            bb = pawns & -pawns
+            from_square = bb.bit_length() - 1
+            attacks = pawn_attacks[from_square] & pawn_targets
+            while attacks:
+                to_bb = attacks & -attacks
+                self._append_pawn_move(moves, from_square | (to_bb.bit_length() - 1) << 6, to_bb)
+                attacks ^= to_bb
+            pawns ^= bb
+
+    def _append_pawn_move(self, moves, move, to_bb):
+        if to_bb & BB_BACKRANKS:
+            for promotion in PROMOTIONS:
+                moves.append(move | promotion << 12)
+        else:
+            moves.append(move)
+
+    def _generate_captures(self):
+        moves = []
+        their_pieces = self.occupied_co[not self.turn]
+        self._generate(moves, their_pieces, their_pieces)
+
+        ep_square = self.ep_square
+        if ep_square:
+            capturers = self.pieces[PAWN] & self.occupied_co[self.turn] & BB_PAWN_ATTACKS[not self.turn][ep_square]
+            while capturers:
+                bb = capturers & -capturers
+                moves.append(bb.bit_length() - 1 | ep_square << 6)
+                capturers ^= bb
+        return moves
+
+    def _generate_quiet(self, in_check):
+        moves = []
+        empty = ~self.occupied & chess.BB_ALL
+        self._generate(moves, empty, 0)
+
+        pawns = self.pieces[PAWN] & self.occupied_co[self.turn]
+        if self.turn == WHITE:
+            single = pawns << 8 & empty
+            double = (single & BB_RANK_3) << 8 & empty
+            step = 8
+        else:
+            single = pawns >> 8 & empty
+            double = (single & BB_RANK_6) >> 8 & empty
+            step = -8
+        while single:
+            bb = single & -single
+            to_square = bb.bit_length() - 1
+            self._append_pawn_move(moves, to_square - step | to_square << 6, bb)
+            single ^= bb
+        while double:
+            bb = double & -double
+            to_square = bb.bit_length() - 1
+            moves.append(to_square - 2 * step | to_square << 6)
+            double ^= bb
+
+        if self.castling_rights and not in_check:
+            self._generate_castling(moves)
+        return moves
+
+    def _generate_castling(self, moves):
+        if self.turn == WHITE:
+            backrank, king_square, kingside, queenside = BB_RANK_1, chess.E1, BB_H1, BB_A1
+        else:
+            backrank, king_square, kingside, queenside = BB_RANK_8, chess.E8, BB_H8, BB_A8
+
+        rights = self.castling_rights & backrank
+        occupied = self.occupied
+        their_pieces = self.occupied_co[not self.turn]
+        if rights & kingside and not occupied & (BB_SQUARES[king_square + 1] | BB_SQUARES[king_square + 2]):
+            if not self._attacked(king_square + 1, occupied, their_pieces) and \
+                    not self._attacked(king_square + 2, occupied, their_pieces):
+                moves.append(king_square | (king_square + 2) << 6)
+        if rights & queenside and not occupied & (
+                BB_SQUARES[king_square - 1] | BB_SQUARES[king_square - 2] | BB_SQUARES[king_square - 3]):
+            if not self._attacked(king_square - 1, occupied, their_pieces) and \
+                    not self._attacked(king_square - 2, occupied, their_pieces):
+                moves.append(king_square | (king_square - 2) << 6)
+
+    def generate_captures(self):
+        """Gets the legal captures as a list of move ints."""
+        king_square = self._king_square()
+        in_check = king_square is not None and \
+            self._attacked(king_square, self.occupied, self.occupied_co[not self.turn])
+        return [move for move in self._generate_captures() if self._is_legal(move, king_square, in_check)]
+
+    def generate_moves(self):
+        """
+        Gets the legal moves as a list of move ints. These are the captures,
+        if there are any.
+        """
+        king_square = self._king_square()
+        in_check = king_square is not None and \
+            self._attacked(king_square, self.occupied, self.occupied_co[not self.turn])
+
+        moves = [move for move in self._generate_captures() if self._is_legal(move, king_square, in_check)]
+        if moves:
+            return moves
+        return [move for move in self._generate_quiet(in_check) if self._is_legal(move, king_square, in_check)]
+
+    @property
+    def legal_moves(self):
+        return self.generate_moves()
+
+    def has_capture(self):
+        return bool(self.generate_captures())
+
+    def _key(self, plies):
+        # Zobrist key of the position *plies* plies back, if pushed.
+        return self.undo[(self.ply - plies) * UNDO_SIZE + 6] if plies <= self.ply else None
+
+    def is_repetition(self, count=3):
+        """
+        Checks if the current position occurred at least *count* times
+        among the pushed positions, counting the current one.
+        """
+        key = self.zobrist_hash()
+        found = 1
+        for plies in range(2, min(self.halfmove_clock, self.ply) + 1, 2):
+            if found >= count:
+                break
+            if self._key(plies) == key:
+                found += 1
+        return found >= count
+
+    def is_fivefold_repetition(self):
+        if self.halfmove_clock < 16:
+            return False
+        key = self.zobrist_hash()
+        return all(self._key(plies) == key for plies in [4, 8, 12, 16])
+
+    def is_seventyfive_moves(self):
+        return self.halfmove_clock >= 150 and bool(self.generate_moves())
+
+    def is_stalemate(self):
+        return not self.is_check() and not self.generate_moves()
+
+    def is_insufficient_material(self):
+        """Checks for a draw due to insufficient mating material."""
+        pieces = self.pieces
+        if pieces[PAWN] or pieces[ROOK] or pieces[QUEEN]:
+            return False
+        if chess.pop_count(self.occupied) <= 3:
+            return True
+        if pieces[KNIGHT]:
+            return False
+        bishops = pieces[BISHOP]
+        return not bishops & chess.BB_DARK_SQUARES or not bishops & chess.BB_LIGHT_SQUARES
+
+    def push(self, move):
+        from_square = move & 63
+        to_square = move >> 6 & 63
+        promotion = move >> 12
+        squares = self.squares
+        pieces = self.pieces
+        occupied_co = self.occupied_co
+        turn = self.turn
+        us = turn << 3
+
+        piece = squares[from_square]
+        piece_type = piece & 7
+        captured = squares[to_square]
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+        h = self.hash
+
+        i = self.ply * UNDO_SIZE
+        undo = self.undo
+        undo[i] = move
+        undo[i + 1] = captured
+        undo[i + 2] = self.castling_rights
+        undo[i + 3] = self.ep_square
+        undo[i + 4] = self.halfmove_clock
+        undo[i + 5] = h
+        undo[i + 6] = self.zobrist_hash()
+        self.ply += 1
+
+        evaluator = self.evaluator
+        if evaluator is not None:
+            self.evaluator_stack.append(evaluator.state[:])
+
+        if captured:
+            pieces[captured & 7] ^= to_bb
+            occupied_co[not turn] ^= to_bb
+            h ^= _PIECE_KEYS[captured * 64 + to_square]
+            if evaluator is not None:
+                evaluator.remove(to_square, captured & 7, captured >> 3)
+
+        # Move the piece.
+        pieces[piece_type] ^= from_bb
+        occupied_co[turn] ^= from_bb | to_bb
+        squares[from_square] = 0
+        h ^= _PIECE_KEYS[piece * 64 + from_square]
+        if promotion:
+            piece = promotion | us
+        pieces[piece & 7] |= to_bb
+        squares[to_square] = piece
+        h ^= _PIECE_KEYS[piece * 64 + to_square]
+        if evaluator is not None:
+            evaluator.remove(from_square, piece_type, turn)
+            evaluator.add(to_square, piece & 7, turn)
+
+        ep_square = 0
+        if piece_type == PAWN:
+            if to_square == self.ep_square and not captured and (from_square - to_square) & 7:
+                captured_square = to_square - 8 if turn == WHITE else to_square + 8
+                captured_bb = BB_SQUARES[captured_square]
+                pieces[PAWN] ^= captured_bb
+                occupied_co[not turn] ^= captured_bb
+                squares[captured_square] = 0
+                h ^= _PIECE_KEYS[(PAWN | (not turn) << 3) * 64 + captured_square]
+                if evaluator is not None:
+                    evaluator.remove(captured_square, PAWN, not turn)
+            elif to_square - from_square == 16 or from_square - to_square == 16:
+                ep_square = (from_square + to_square) >> 1
+        elif piece_type == KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            # Castling. Move the rook.
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook = ROOK | us
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            pieces[ROOK] ^= rook_bb
+            occupied_co[turn] ^= rook_bb
+            squares[rook_from] = 0
+            squares[rook_to] = rook
+            h ^= _PIECE_KEYS[rook * 64 + rook_from] ^ _PIECE_KEYS[rook * 64 + rook_to]
+            if evaluator is not None:
+                evaluator.remove(rook_from, ROOK, turn)
+                evaluator.add(rook_to, ROOK, turn)
+
+        self.occupied = occupied_co[WHITE] | occupied_co[BLACK]
+
+        castling_rights = self.castling_rights
+        if castling_rights:
+            castling_rights &= ~(from_bb | to_bb)
+            if piece_type == KING:
+                castling_rights &= ~(BB_RANK_1 if turn == WHITE else BB_RANK_8)
+            if castling_rights != self.castling_rights:
+                h ^= _castling_key(self.castling_rights) ^ _castling_key(castling_rights)
+                self.castling_rights = castling_rights
+
+        if piece_type == PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if turn == BLACK:
+            self.fullmove_number += 1
+
+        self.ep_square = ep_square
+        self.turn = not turn
+        self.hash = h ^ _TURN_KEY
+
+    def pop(self):
+        """Takes back the last move and returns it."""
+        self.ply -= 1
+        i = self.ply * UNDO_SIZE
+        undo = self.undo
+        move = undo[i]
+        captured = undo[i + 1]
+        self.castling_rights = undo[i + 2]
+        self.ep_square = undo[i + 3]
+        self.halfmove_clock = undo[i + 4]
+        self.hash = undo[i + 5]
+
+        turn = self.turn = not self.turn
+        if turn == BLACK:
+            self.fullmove_number -= 1
+
+        from_square = move & 63
+        to_square = move >> 6 & 63
+        squares = self.squares
+        pieces = self.pieces
+        occupied_co = self.occupied_co
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+
+        piece = squares[to_square]
+        pieces[piece & 7] ^= to_bb
+        occupied_co[turn] ^= from_bb | to_bb
+        if move >> 12:
+            piece = PAWN | turn << 3
+        piece_type = piece & 7
+        pieces[piece_type] |= from_bb
+        squares[from_square] = piece
+        squares[to_square] = captured
+
+        if captured:
+            pieces[captured & 7] |= to_bb
+            occupied_co[not turn] |= to_bb
+        elif piece_type == PAWN and to_square == self.ep_square and (from_square - to_square) & 7:
+            captured_square = to_square - 8 if turn == WHITE else to_square + 8
+            captured_bb = BB_SQUARES[captured_square]
+            pieces[PAWN] |= captured_bb
+            occupied_co[not turn] |= captured_bb
+            squares[captured_square] = PAWN | (not turn) << 3
+        elif piece_type == KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            pieces[ROOK] ^= rook_bb
+            occupied_co[turn] ^= rook_bb
+            squares[rook_to] = 0
+            squares[rook_from] = ROOK | turn << 3
+
+        self.occupied = occupied_co[WHITE] | occupied_co[BLACK]
+        if self.evaluator is not None:
+            if self.evaluator_stack:
+                self.evaluator.state = self.evaluator_stack.pop()
+            else:
+                # Pushed before the evaluator was attached.
+                self.evaluator.reset(self)
+        return move
+
+    def has_legal_en_passant(self):
+        king_square = self._king_square()
+        in_check = king_square is not None and \
+            self._attacked(king_square, self.occupied, self.occupied_co[not self.turn])
+        return any(move >> 6 & 63 == self.ep_square and self.squares[move & 63] & 7 == PAWN and
+                   self._is_legal(move, king_square, in_check)
+                   for move in self._generate_captures())
+
+    def board_fen(self):
+        builder = []
+        for rank in range(7, -1, -1):
+            empty = 0
+            for square in range(rank * 8, rank * 8 + 8):
+                piece = self.squares[square]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    builder.append(str(empty))
+                    empty = 0
+                symbol = chess.PIECE_SYMBOLS[piece & 7]
+                builder.append(symbol.upper() if piece >> 3 else symbol)
+            if empty:
+                builder.append(str(empty))
+            if rank:
+                builder.append("/")
+        return "".join(builder)
+
+    def fen(self):
+        castling = "".join(flag for flag, rook in zip("KQkq", [BB_H1, BB_A1, BB_H8, BB_A8])
+                           if self.castling_rights & rook)
+        if self.ep_square and self.has_legal_en_passant():
+            ep_square = chess.SQUARE_NAMES[self.ep_square]
+        else:
+            ep_square = "-"
+        return " ".join([
+            self.board_fen(),
+            "w" if self.turn == WHITE else "b",
+            castling or "-",
+            ep_square,
+            str(self.halfmove_clock),
+            str(self.fullmove_number)])
+
+    def perft(self, depth):
+        """Counts the leaves of the legal move tree *depth* plies deep."""
+        if depth < 1:
+            return 1
+        moves = self.generate_moves()
+        if depth == 1:
+            return len(moves)
+
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
@@ -0,0 +1,108 @@
+class SearchStats(object):
+    """
+    Counters of one search.
+
+    Pool workers send their counters back as dicts, which are merged into
+    the stats of the search that started them.
+    """
+
+    FIELDS = (
+        # Nodes of the main search and of the quiescence search.
+        "nodes",
+        "qnodes",
+        # Static evaluations, in both searches.
+        "evals",
+        # Transposition table probes of the main search, and those that
+        # found an entry.
+        "tt_probes",
+        "tt_hits",
+        # Tablebase probes of the main search, and those that found the
+        # position.
+        "tb_probes",
+        "tb_hits",
+        # Null window searches that failed high and were searched again.
+        "pvs_researches",
+        # Aspiration windows that had to be widened.
+        "aspiration_fail_lows",
+        "aspiration_fail_highs",
+        # Beta cutoffs, and those caused by the first move searched.
+        "cutoffs",
+        "first_move_cutoffs",
+        # Seconds spent generating the moves of the main search, evaluating
+        # and in the quiescence search. The quiescence search time includes
+        # its evaluations.
+        "movegen_time",
+        "eval_time",
+        "qsearch_time",
+        # Seconds the pool workers spent on their tasks, summed over them.
+        "worker_time",
+    )
+
+    # Merged by taking the largest.
+    MAX_FIELDS = (
+        # Deepest ply reached by the quiescence search.
+        "qsearch_max_depth",
+    )
+
+    # Lists, merged element by element.
+    LIST_FIELDS = (
+        # Beta cutoffs by the index of the move that caused them. The last
+        # entry counts the moves from there on.
+        "cutoffs_by_index",
+        # Nodes of both searches by the depth of the iteration.
+        "iteration_nodes",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        for field in self.FIELDS + self.MAX_FIELDS:
+            setattr(self, field, 0)
+        for field in self.LIST_FIELDS:
+            setattr(self, field, [])
+
+    def merge(self, other):
+        if isinstance(other, SearchStats):
+            other = other.as_dict()
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + other.get(field, 0))
+        for field in self.MAX_FIELDS:
+            setattr(self, field, max(getattr(self, field), other.get(field, 0)))
+        for field in self.LIST_FIELDS:
+            values = getattr(self, field)
+            for i, value in enumerate(other.get(field, [])):
+                if i < len(values):
+                    values[i] += value
+                else:
+                    values.append(value)
+
+    def add_iteration(self, depth, nodes):
+        """Counts the *nodes* of a completed iteration to *depth*."""
+        while len(self.iteration_nodes) < depth:
+            self.iteration_nodes.append(0)
+        self.iteration_nodes[depth - 1] += nodes
+
+    def branching_factors(self):
+        """Ratios of the nodes of every iteration to those of the one before."""
+        return [float(nodes) / previous if previous else 0.0
+                for previous, nodes in zip(self.iteration_nodes, self.iteration_nodes[1:])]
+
+    def effective_branching_factor(self):
+        """Branching factor of the last iteration, 0 with less than two."""
+        factors = self.branching_factors()
+        return factors[-1] if factors else 0.0
+
+    def first_move_cutoff_rate(self):
+        return float(self.first_move_cutoffs) / self.cutoffs if self.cutoffs else 0.0
+
+    def as_dict(self):
+        stats = dict((field, getattr(self, field)) for field in self.FIELDS + self.MAX_FIELDS)
+        for field in self.LIST_FIELDS:
+            stats[field] = list(getattr(self, field))
+        return stats
+
+    def __repr__(self):
+        return "SearchStats({0})".format(", ".join(
+            "{0}={1}".format(field, getattr(self, field))
+            for field in self.FIELDS + self.MAX_FIELDS + self.LIST_FIELDS))
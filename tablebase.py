@@ -0,0 +1,835 @@
+"""
+Endgame tablebases for the rules of AntichessBoard: captures are forced,
+and otherwise the rules of chess apply, mate wins and the game is drawn by
+stalemate and insufficient material.
+
+    python tablebase.py generate DIR [--pieces N] [--processes N] [--force] [SIGNATURE ...]
+    python tablebase.py probe DIR FEN
+
+generate builds the table of every material signature with up to --pieces
+pieces, kings included, or of the given signatures (like KRvK or KQvKP)
+and the tables they depend on, by retrograde analysis. Tables that are
+found in DIR are kept, unless --force is given. The signatures with the
+same number of pieces and pawns do not depend on each other and are
+generated in parallel, one per process. In pure Python the 4 piece tables
+take hours, 5 pieces need more memory than is practical.
+
+Every table stores the result of every position with both sides to move
+as one byte, the number of half moves to mate with the best play of both
+sides, which is odd for wins and even for losses. The 75 move rule and
+repetitions are not taken into account, and positions with castling
+rights are not in the tables. The files are memory-mapped by Tablebases,
+which answers probes of any position of the search with a few lookups.
+"""
+import argparse
+import array
+import itertools
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import time
+
+from python_chess import chess
+from python_chess.chess import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK
+
+MAGIC = b"ACTB"
+VERSION = 1
+SUFFIX = ".atb"
+
+# Magic, version, pieces, king squares, reserved, signature, positions
+# per side to move.
+HEADER = struct.Struct("<4sBBBB12sI")
+
+# Values of the positions. Otherwise 1 + the half moves to mate.
+DRAW = 0
+INVALID = 255
+_UNKNOWN = 254
+MAX_DTM = 252
+
+DEFAULT_PIECES = 4
+
+# Piece letters of a signature, strongest first.
+LETTERS = "KQRBNP"
+_LETTER_TYPES = dict((letter, chess.PIECE_SYMBOLS.index(letter.lower())) for letter in LETTERS)
+_TYPE_LETTERS = dict((piece_type, letter) for letter, piece_type in _LETTER_TYPES.items())
+
+# Ways a position changes signature.
+_PROMOTIONS = [QUEEN, ROOK, BISHOP, KNIGHT]
+
+# Flags of the positions during generation.
+_HAS_CAPTURE = 1
+_EXIT_WIN = 2
+_EXIT_DRAW = 4
+
+
+def _file(square):
+    return square & 7
+
+
+def _rank(square):
+    return square >> 3
+
+
+def _steps(deltas):
+    table = []
+    for square in range(64):
+        targets = []
+        for file_delta, rank_delta in deltas:
+            f, r = _file(square) + file_delta, _rank(square) + rank_delta
+            if 0 <= f < 8 and 0 <= r < 8:
+                targets.append(r * 8 + f)
+        table.append(targets)
+    return table
+
+
+def _rays(directions):
+    table = []
+    for square in range(64):
+        rays = []
+        for file_delta, rank_delta in directions:
+            ray = []
+            f, r = _file(square) + file_delta, _rank(square) + rank_delta
+            while 0 <= f < 8 and 0 <= r < 8:
+                ray.append(r * 8 + f)
+                f, r = f + file_delta, r + rank_delta
+            if ray:
+                rays.append(ray)
+        table.append(rays)
+    return table
+
+
+def _mask(squares):
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+
+def _between(rays):
+    # Squares strictly between two squares on a common ray, or -1.
+    table = [[-1] * 64 for _ in range(64)]
+    for square in range(64):
+        for ray in rays[square]:
+            for i, target in enumerate(ray):
+                table[square][target] = _mask(ray[:i])
+    return table
+
+
+_KING_STEPS = _steps([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+_KNIGHT_STEPS = _steps([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+_KING_MASKS = [_mask(targets) for targets in _KING_STEPS]
+_KNIGHT_MASKS = [_mask(targets) for targets in _KNIGHT_STEPS]
+# Squares attacked by a pawn of a colour, indexed by the colour.
+_PAWN_STEPS = _steps([(1, -1), (-1, -1)]), _steps([(1, 1), (-1, 1)])
+_PAWN_MASKS = [[_mask(targets) for targets in steps] for steps in _PAWN_STEPS]
+
+_ROOK_RAYS = _rays([(1, 0), (0, 1), (-1, 0), (0, -1)])
+_BISHOP_RAYS = _rays([(1, 1), (-1, 1), (-1, -1), (1, -1)])
+_QUEEN_RAYS = [rook + bishop for rook, bishop in zip(_ROOK_RAYS, _BISHOP_RAYS)]
+_ROOK_BETWEEN = _between(_ROOK_RAYS)
+_BISHOP_BETWEEN = _between(_BISHOP_RAYS)
+
+_RAYS = {BISHOP: _BISHOP_RAYS, ROOK: _ROOK_RAYS, QUEEN: _QUEEN_RAYS}
+_STEPS = {KNIGHT: _KNIGHT_STEPS, KING: _KING_STEPS}
+
+
+def _attacks(piece_type, color, square, target, occupied):
+    if piece_type == KING:
+        return _KING_MASKS[square] >> target & 1
+    elif piece_type == KNIGHT:
+        return _KNIGHT_MASKS[square] >> target & 1
+    elif piece_type == PAWN:
+        return _PAWN_MASKS[color][square] >> target & 1
+    if piece_type != BISHOP:
+        between = _ROOK_BETWEEN[square][target]
+        if between >= 0 and not between & occupied:
+            return True
+    if piece_type != ROOK:
+        between = _BISHOP_BETWEEN[square][target]
+        if between >= 0 and not between & occupied:
+            return True
+    return False
+
+
+def _insufficient(types, squares):
+    # Same as chess.Board.is_insufficient_material().
+    if PAWN in types or ROOK in types or QUEEN in types:
+        return False
+    elif len(types) <= 3:
+        return True
+    elif KNIGHT in types:
+        return False
+    colors = set((_file(square) + _rank(square)) & 1
+                 for piece_type, square in zip(types, squares) if piece_type == BISHOP)
+    return len(colors) <= 1
+
+
+def _side_key(letters):
+    # Orders the sides of a signature, the stronger one is white.
+    return len(letters), [-LETTERS.index(letter) for letter in letters]
+
+
+def signature_name(white, black):
+    """
+    Returns the name of the signature of the pieces of both sides, given as
+    letters, and whether the colours are swapped in it.
+    """
+    white = "".join(sorted(white, key=LETTERS.index))
+    black = "".join(sorted(black, key=LETTERS.index))
+    if _side_key(black) > _side_key(white):
+        return black + "v" + white, True
+    return white + "v" + black, False
+
+
+def _always_insufficient(signature):
+    # Kings and a knight or a bishop, which need no table.
+    return len(signature) <= 4 and not any(letter in signature for letter in "QRP")
+
+
+def dependencies(signature):
+    """Signatures a capture or a promotion leads to, with a table."""
+    white, black = signature.split("v")
+    result = set()
+    for side, other in [(white, black), (black, white)]:
+        for i, letter in enumerate(side):
+            if letter == "K":
+                continue
+            rest = side[:i] + side[i + 1:]
+            result.add(signature_name(rest, other)[0])
+            if letter == "P":
+                for promotion in "QRBN":
+                    result.add(signature_name(rest + promotion, other)[0])
+    return sorted(name for name in result if not _always_insufficient(name))
+
+
+def all_signatures(pieces=DEFAULT_PIECES):
+    """Signatures with a table of up to *pieces* pieces, kings included."""
+    result = set()
+    for count in range(pieces - 1):
+        for white_count in range(count + 1):
+            for white in itertools.combinations_with_replacement(LETTERS[1:], white_count):
+                for black in itertools.combinations_with_replacement(LETTERS[1:], count - white_count):
+                    result.add(signature_name("K" + "".join(white), "K" + "".join(black))[0])
+    return sorted((name for name in result if not _always_insufficient(name)), key=_level)
+
+
+def _level(signature):
+    # Tables only depend on tables of lower levels.
+    return len(signature) - 1, signature.count("P"), signature
+
+
+class _Layout(object):
+    """
+    Maps the positions of a signature to indexes. The pieces are in the
+    order of the signature, white king first. The white king is kept in
+    the a1-d4 quadrant, or on the a-d files with pawns, by mirroring the
+    board, and every other piece adds a factor of 64.
+    """
+
+    def __init__(self, signature):
+        self.signature = signature
+        white, black = signature.split("v")
+        self.types = [_LETTER_TYPES[letter] for letter in white + black]
+        self.colors = [WHITE] * len(white) + [BLACK] * len(black)
+        self.pieces = len(self.types)
+        self.pawns = PAWN in self.types
+
+        if self.pawns:
+            self.king_squares = [square for square in range(64) if _file(square) < 4]
+        else:
+            self.king_squares = [square for square in range(64) if _file(square) < 4 and _rank(square) < 4]
+        self.king_index = [-1] * 64
+        for i, square in enumerate(self.king_squares):
+            self.king_index[square] = i
+        self.mirror = [(7 if _file(square) > 3 else 0) | (56 if not self.pawns and _rank(square) > 3 else 0)
+                       for square in range(64)]
+
+        self.size = len(self.king_squares) * 64 ** (self.pieces - 1)
+
+    def index(self, squares, turn):
+        mirror = self.mirror[squares[0]]
+        index = self.king_index[squares[0] ^ mirror]
+        for square in squares[1:]:
+            index = index << 6 | square ^ mirror
+        return index if turn else index + self.size
+
+    def squares(self, index):
+        turn = index < self.size
+        index %= self.size
+        squares = [0] * self.pieces
+        for i in range(self.pieces - 1, 0, -1):
+            squares[i] = index & 63
+            index >>= 6
+        squares[0] = self.king_squares[index]
+        return squares, turn
+
+
+class _Table(object):
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, _, _, signature, size = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("{0} is not a version {1} tablebase".format(path, VERSION))
+        self.layout = _Layout(signature.rstrip(b"\0").decode("ascii"))
+        if self.layout.size != size or len(self.data) != HEADER.size + 2 * size:
+            self.data.close()
+            raise ValueError("{0} is truncated or has a different layout".format(path))
+
+    def value(self, index):
+        return ord(self.data[HEADER.size + index])
+
+    def close(self):
+        self.data.close()
+
+
+class Tablebases(object):
+    """
+    Probes the tables in *directory*. The tables are opened when first
+    needed and stay memory-mapped until close().
+
+    Positions of AntichessBoard are looked up with probe_dtm() and
+    probe_wdl(), which return None if a position is not in the tables.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(SUFFIX):
+                    self.max_pieces = max(self.max_pieces, len(name) - len(SUFFIX) - 1)
+
+    def _table(self, signature):
+        try:
+            return self.tables[signature]
+        except KeyError:
+            path = os.path.join(self.directory, signature + SUFFIX)
+            table = self.tables[signature] = _Table(path) if os.path.exists(path) else None
+            return table
+
+    def _probe_pieces(self, types, colors, squares, turn):
+        # Value of the position of the pieces, given as lists, or None.
+        if _insufficient(types, squares):
+            return DRAW
+        white = "".join(_TYPE_LETTERS[t] for t, color in zip(types, colors) if color)
+        black = "".join(_TYPE_LETTERS[t] for t, color in zip(types, colors) if not color)
+        if white.count("K") != 1 or black.count("K") != 1:
+            return None
+        signature, swap = signature_name(white, black)
+        table = self._table(signature)
+        if table is None:
+            return None
+
+        if swap:
+            colors = [not color for color in colors]
+            squares = [square ^ 56 for square in squares]
+            turn = not turn
+        order = sorted(range(len(types)), key=lambda i: (not colors[i], LETTERS.index(_TYPE_LETTERS[types[i]])))
+        return table.value(table.layout.index([squares[i] for i in order], turn))
+
+    def _probe(self, board):
+        if board.castling_rights or chess.pop_count(board.occupied) > self.max_pieces:
+            return None
+
+        if board.ep_square and board.has_legal_en_passant():
+            # Not in the tables, but captures are forced, so every move
+            # leads to a position with fewer pieces.
+            values = []
+            for move in board.legal_moves:
+                board.push(move)
+                try:
+                    values.append(self._probe(board))
+                finally:
+                    board.pop()
+            return None if None in values else _best(values)
+
+        types, colors, squares = [], [], []
+        # Also works with a search_board.SearchBoard.
+        for square in chess.SquareSet(board.occupied):
+            types.append(board.piece_type_at(square))
+            colors.append(bool(board.occupied_co[chess.WHITE] & chess.BB_SQUARES[square]))
+            squares.append(square)
+        value = self._probe_pieces(types, colors, squares, board.turn)
+        return None if value == INVALID else value
+
+    def probe_dtm(self, board):
+        """
+        Returns the number of half moves to mate, positive if the side to
+        move wins and negative if it loses, 0 for a draw or if the side to
+        move is mated. None if the position is not in the tables.
+        """
+        value = self._probe(board)
+        if value is None or value == DRAW:
+            return None if value is None else 0
+        dtm = value - 1
+        return dtm if dtm & 1 else -dtm
+
+    def probe_wdl(self, board):
+        """
+        Returns 1 if the side to move wins, 0 for a draw and -1 if it loses,
+        None if the position is not in the tables.
+        """
+        value = self._probe(board)
+        if value is None or value == DRAW:
+            return value
+        return 1 if (value - 1) & 1 else -1
+
+    def best_move(self, board):
+        """
+        Returns the move that mates the fastest, or holds the draw, or is
+        mated the slowest. None if the position is not in the tables.
+        """
+        if board.castling_rights or chess.pop_count(board.occupied) > self.max_pieces:
+            return None
+
+        best = None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                value = self._probe(board)
+            finally:
+                board.pop()
+            if value is None:
+                return None
+            key = _move_key(value)
+            if best is None or key > best[0]:
+                best = key, move
+        return best[1] if best is not None else None
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_tablebases(directory):
+    return Tablebases(directory)
+
+
+def _move_key(value):
+    # Orders moves by the value of the position after them, for the side
+    # that made them.
+    if value == DRAW:
+        return 1, 0
+    dtm = value - 1
+    return (0, dtm) if dtm & 1 else (2, -dtm)
+
+
+def _best(values):
+    # Value of a position from the values of the positions after its moves.
+    win = loss = None
+    draw = False
+    for value in values:
+        if value == DRAW:
+            draw = True
+            continue
+        dtm = value - 1
+        if dtm & 1:
+            loss = max(loss, dtm + 1)
+        elif win is None or dtm + 1 < win:
+            win = dtm + 1
+    if win is not None:
+        return 1 + win
+    elif draw:
+        return DRAW
+    return 1 + loss
+
+
+class _Generator(_Layout):
+    """Builds the table of a signature by retrograde analysis."""
+
+    def __init__(self, signature, tablebases):
+        super(_Generator, self).__init__(signature)
+        self.tablebases = tablebases
+        self.slots = [[i for i, color in enumerate(self.colors) if color == side] for side in (BLACK, WHITE)]
+        self.king_slots = [self.colors.index(BLACK), self.colors.index(WHITE)]
+        self.maybe_insufficient = not (self.pawns or ROOK in self.types or QUEEN in self.types)
+
+    def _attacked(self, target, color, squares, occupied, skip=-1):
+        types = self.types
+        for j in self.slots[color]:
+            if j != skip and _attacks(types[j], color, squares[j], target, occupied):
+                return True
+        return False
+
+    def _valid(self, squares, turn):
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        if chess.pop_count(occupied) != self.pieces:
+            return False
+        for piece_type, square in zip(self.types, squares):
+            if piece_type == PAWN and not 8 <= square < 56:
+                return False
+        return not self._attacked(squares[self.king_slots[not turn]], turn, squares, occupied)
+
+    def _moves(self, squares, turn, ep_square=0):
+        """
+        Returns the legal moves as (piece, to square, captured piece or -1,
+        promotion or 0).
+        """
+        types = self.types
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        ours = 0
+        for j in self.slots[turn]:
+            ours |= 1 << squares[j]
+
+        pseudo = []
+        for j in self.slots[turn]:
+            piece_type = types[j]
+            square = squares[j]
+            if piece_type == PAWN:
+                forward = 8 if turn else -8
+                target = square + forward
+                promotions = _PROMOTIONS if target < 8 or target >= 56 else [0]
+                if not occupied >> target & 1:
+                    for promotion in promotions:
+                        pseudo.append((j, target, -1, promotion))
+                    if _rank(square) == (1 if turn else 6) and not occupied >> target + forward & 1:
+                        pseudo.append((j, target + forward, -1, 0))
+                for target in _PAWN_STEPS[turn][square]:
+                    if occupied >> target & 1 and not ours >> target & 1:
+                        for promotion in promotions:
+                            pseudo.append((j, target, squares.index(target), promotion))
+                    elif ep_square and target == ep_square:
+                        pseudo.append((j, target, squares.index(target - forward), 0))
+            elif piece_type in _STEPS:
+                for target in _STEPS[piece_type][square]:
+                    if not ours >> target & 1:
+                        pseudo.append((j, target, squares.index(target) if occupied >> target & 1 else -1, 0))
+            else:
+                for ray in _RAYS[piece_type][square]:
+                    for target in ray:
+                        if occupied >> target & 1:
+                            if not ours >> target & 1:
+                                pseudo.append((j, target, squares.index(target), 0))
+                            break
+                        pseudo.append((j, target, -1, 0))
+
+        king = self.king_slots[turn]
+        moves = []
+        has_capture = False
+        for move in pseudo:
+            j, target, captured, _ = move
+            after = list(squares)
+            after[j] = target
+            after_occupied = occupied & ~(1 << squares[j]) | 1 << target
+            if captured >= 0:
+                after_occupied &= ~(1 << squares[captured]) | 1 << target
+            if not self._attacked(after[king], not turn, after, after_occupied, captured):
+                moves.append(move)
+                has_capture = has_capture or captured >= 0
+
+        if has_capture:
+            return [move for move in moves if move[2] >= 0]
+        return moves
+
+    def _ep_capture(self, squares, turn, pawn):
+        # Whether the side to move can capture *pawn*, which just moved two
+        # squares, en passant.
+        square = squares[pawn]
+        for j in self.slots[turn]:
+            if self.types[j] == PAWN and _rank(squares[j]) == _rank(square) and \
+                    abs(_file(squares[j]) - _file(square)) == 1:
+                ep_square = square + (-8 if turn else 8)
+                for move in self._moves(squares, turn, ep_square):
+                    if move[0] == j and move[1] == ep_square:
+                        return ep_square
+        return 0
+
+    def _after(self, squares, move):
+        # Pieces of the position after a move, as lists.
+        j, target, captured, promotion = move
+        types, colors, after = [], [], []
+        for i, (piece_type, color, square) in enumerate(zip(self.types, self.colors, squares)):
+            if i == captured:
+                continue
+            types.append(promotion if i == j and promotion else piece_type)
+            colors.append(color)
+            after.append(target if i == j else square)
+        return types, colors, after
+
+    def _exit_value(self, squares, turn, move):
+        # Value of the position after a move that leaves the table, or None
+        # if the move stays in it.
+        j, target, captured, promotion = move
+        if captured >= 0 or promotion:
+            types, colors, after = self._after(squares, move)
+            value = self.tablebases._probe_pieces(types, colors, after, not turn)
+            if value is None or value == INVALID:
+                raise ValueError("{0}: no value after a move, is the table of {1} missing?".format(
+                    self.signature, signature_name(
+                        "".join(_TYPE_LETTERS[t] for t, c in zip(types, colors) if c),
+                        "".join(_TYPE_LETTERS[t] for t, c in zip(types, colors) if not c))[0]))
+            return value
+
+        if self.types[j] == PAWN and abs(target - squares[j]) == 16:
+            after = list(squares)
+            after[j] = target
+            ep_square = self._ep_capture(after, not turn, j)
+            if ep_square:
+                # Captures are forced, so all moves leave the table.
+                return _best([self._exit_value(after, not turn, reply)
+                              for reply in self._moves(after, not turn, ep_square)])
+        return None
+
+    def _predecessors(self, squares, turn):
+        # Indexes of the positions a quiet move of the other side led from.
+        mover = not turn
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+
+        for j in self.slots[mover]:
+            piece_type = self.types[j]
+            square = squares[j]
+            if piece_type == PAWN:
+                back = -8 if mover else 8
+                origin = square + back
+                if occupied >> origin & 1 or not 8 <= origin < 56:
+                    continue
+                origins = [origin]
+                if _rank(square) == (3 if mover else 4) and not occupied >> origin + back & 1:
+                    # Only a move within the table if no en passant capture
+                    # followed.
+                    if not self._ep_capture(squares, turn, j):
+                        origins.append(origin + back)
+            elif piece_type in _STEPS:
+                origins = [origin for origin in _STEPS[piece_type][square] if not occupied >> origin & 1]
+            else:
+                origins = []
+                for ray in _RAYS[piece_type][square]:
+                    for origin in ray:
+                        if occupied >> origin & 1:
+                            break
+                        origins.append(origin)
+
+            before = list(squares)
+            for origin in origins:
+                before[j] = origin
+                yield self.index(before, mover)
+
+    def generate(self):
+        """Returns the values of all positions, white to move first."""
+        total = 2 * self.size
+        values = bytearray([_UNKNOWN]) * total
+        counts = bytearray(total)
+        flags = bytearray(total)
+        floors = bytearray(total)
+        buckets = [array.array("I")]
+
+        def schedule(index, dtm):
+            if dtm > MAX_DTM:
+                raise ValueError("{0}: mate in more than {1} half moves".format(self.signature, MAX_DTM))
+            while len(buckets) <= dtm:
+                buckets.append(array.array("I"))
+            buckets[dtm].append(index)
+
+        for index in range(total):
+            squares, turn = self.squares(index)
+            if not self._valid(squares, turn):
+                values[index] = INVALID
+                continue
+            if self.maybe_insufficient and _insufficient(self.types, squares):
+                values[index] = DRAW
+                continue
+
+            moves = self._moves(squares, turn)
+            if not moves:
+                king = squares[self.king_slots[turn]]
+                if self._attacked(king, not turn, squares, sum(1 << square for square in squares)):
+                    schedule(index, 0)
+                else:
+                    values[index] = DRAW
+                continue
+
+            internal = 0
+            win = loss = 0
+            draw = False
+            for move in moves:
+                value = self._exit_value(squares, turn, move)
+                if value is None:
+                    internal += 1
+                elif value == DRAW:
+                    draw = True
+                elif (value - 1) & 1:
+                    loss = max(loss, value)
+                elif not win or value < win:
+                    win = value
+
+            counts[index] = internal
+            floors[index] = loss
+            flags[index] = (moves[0][2] >= 0 and _HAS_CAPTURE) | (win and _EXIT_WIN) | (draw and _EXIT_DRAW)
+            if win:
+                schedule(index, win)
+            elif not internal:
+                if draw:
+                    values[index] = DRAW
+                else:
+                    schedule(index, loss)
+
+        dtm = 0
+        while dtm < len(buckets):
+            for index in buckets[dtm]:
+                if values[index] != _UNKNOWN:
+                    continue
+                values[index] = 1 + dtm
+                squares, turn = self.squares(index)
+                for previous in self._predecessors(squares, turn):
+                    if values[previous] != _UNKNOWN or flags[previous] & _HAS_CAPTURE:
+                        continue
+                    if dtm & 1 == 0:
+                        schedule(previous, dtm + 1)
+                    else:
+                        counts[previous] -= 1
+                        if not counts[previous] and not flags[previous] & (_EXIT_WIN | _EXIT_DRAW):
+                            schedule(previous, max(dtm + 1, floors[previous]))
+            buckets[dtm] = None
+            dtm += 1
+
+        # Neither side can force mate from the rest.
+        return values.translate(bytearray(range(_UNKNOWN)) + bytearray([DRAW, INVALID]))
+
+
+def write_table(path, signature, values):
+    """Writes the values of a table, replacing the file atomically."""
+    layout = _Layout(signature)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=SUFFIX + ".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, layout.pieces, len(layout.king_squares), 0,
+                                signature.encode("ascii"), layout.size))
+            f.write(values)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def generate_table(directory, signature):
+    """
+    Generates the table of *signature* into *directory*, where the tables
+    it depends on must be. Returns the number of wins, draws and losses of
+    the side to move, and the longest mate.
+    """
+    start = time.time()
+    with Tablebases(directory) as tablebases:
+        values = _Generator(signature, tablebases).generate()
+    write_table(os.path.join(directory, signature + SUFFIX), signature, values)
+
+    report = {"signature": signature, "wins": 0, "draws": 0, "losses": 0, "max_dtm": 0}
+    for value in set(values):
+        if value == INVALID:
+            continue
+        count = values.count(bytearray([value]))
+        if value == DRAW:
+            report["draws"] += count
+        else:
+            report["wins" if (value - 1) & 1 else "losses"] += count
+            report["max_dtm"] = max(report["max_dtm"], value - 1)
+    report["seconds"] = round(time.time() - start, 3)
+    return report
+
+
+def _generate_task(task):
+    return generate_table(*task)
+
+
+def generate(directory, pieces=DEFAULT_PIECES, signatures=None, processes=1, force=False, out=None):
+    """
+    Generates the tables of *signatures*, by default of all signatures with
+    up to *pieces* pieces, and the tables they depend on. Returns the
+    reports of generate_table(). Progress is written to *out*, if given.
+    """
+    if signatures is None:
+        signatures = all_signatures(pieces)
+
+    needed = set()
+    todo = [signature_name(*name.split("v"))[0] for name in signatures]
+    while todo:
+        name = todo.pop()
+        if name not in needed and not _always_insufficient(name):
+            needed.add(name)
+            todo.extend(dependencies(name))
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    if not force:
+        needed = [name for name in needed if not os.path.exists(os.path.join(directory, name + SUFFIX))]
+
+    reports = []
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        for _, level in itertools.groupby(sorted(needed, key=_level), key=lambda name: _level(name)[:2]):
+            tasks = [(directory, name) for name in level]
+            if pool is None:
+                results = (_generate_task(task) for task in tasks)
+            else:
+                results = pool.imap(_generate_task, tasks)
+            for report in results:
+                reports.append(report)
+                if out is not None:
+                    out.write("%-8s %9d wins %9d draws %9d losses, longest mate %3d plies, %.1fs\n" % (
+                        report["signature"], report["wins"], report["draws"], report["losses"],
+                        report["max_dtm"], report["seconds"]))
+                    out.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return reports
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Antichess endgame tablebases.")
+    commands = parser.add_subparsers(dest="command")
+
+    generate_parser = commands.add_parser("generate", help="generate tables")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("signatures", nargs="*", help="like KRvK, by default all")
+    generate_parser.add_argument("--pieces", type=int, default=DEFAULT_PIECES, help="most pieces, kings included")
+    generate_parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    generate_parser.add_argument("--force", action="store_true", help="generate tables that exist again")
+
+    probe_parser = commands.add_parser("probe", help="probe a position")
+    probe_parser.add_argument("directory")
+    probe_parser.add_argument("fen")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.directory, args.pieces, args.signatures or None, args.processes, args.force, sys.stdout)
+        return 0
+
+    import antichess_board
+    board = antichess_board.AntichessBoard(args.fen)
+    with Tablebases(args.directory) as tablebases:
+        dtm = tablebases.probe_dtm(board)
+        if dtm is None:
+            print "not in the tables"
+            return 1
+        move = tablebases.best_move(board)
+        print "wdl %d, dtm %d, best move %s" % (tablebases.probe_wdl(board), dtm, move.uci() if move else "-")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,225 @@
+"""
+Per-move telemetry of the engine.
+
+Every move becomes one JSON object on its own line of a JSON-lines file.
+The same moves are summed up in histograms, which a background thread
+writes to a file in the Prometheus text format, for the textfile collector
+of the node exporter. The file is replaced atomically, so the collector
+never reads half of it. Nothing is written to stdout.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Upper bounds of the histogram buckets.
+SECONDS_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+NODES_BUCKETS = [100, 1000, 10000, 100000, 1000000, 10000000]
+NPS_BUCKETS = [1000, 2500, 5000, 10000, 25000, 50000, 100000]
+DEPTH_BUCKETS = [1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 15, 20]
+UTILISATION_BUCKETS = [0.1, 0.25, 0.5, 0.75, 0.9, 1]
+
+# Ways a move is chosen.
+PATH_OPENING = "opening"
+PATH_ENDGAME = "endgame"
+PATH_TABLEBASE = "tablebase"
+PATH_SEARCH = "search"
+
+
+def move_record(board, move, path, seconds, endgame_type=0, search=None, time_limit=None):
+    """
+    Builds the record of *move*, chosen in *seconds* on *board* before it is
+    pushed. *search* is the AlphaBeta that found it, if any.
+    """
+    record = {
+        "time": time.time(),
+        "fen": board.fen(),
+        "ply": len(board.move_stack),
+        "move": str(move),
+        "path": path,
+        "endgame_type": endgame_type,
+        "seconds": seconds,
+        "time_limit": time_limit,
+    }
+
+    if search is not None:
+        stats = search.stats
+        nodes = stats.nodes + stats.qnodes
+        processes = search.pool.processes if search.pool is not None else None
+        record.update({
+            "depth": search.completed_depth,
+            "score": search.best_score,
+            "pv": [m.uci() for m in search.best_line],
+            "nodes": nodes,
+            "nps": int(nodes / seconds) if seconds else None,
+            "processes": processes,
+            "pool_utilisation": stats.worker_time / (processes * seconds) if processes and seconds else None,
+            "stats": stats.as_dict(),
+        })
+
+    return record
+
+
+class Histogram(object):
+    """Cumulative Prometheus histogram."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self):
+        yield "# HELP {0} {1}".format(self.name, self.documentation)
+        yield "# TYPE {0} histogram".format(self.name)
+        cumulative = 0
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            yield '{0}_bucket{{le="{1}"}} {2}'.format(self.name, bound, cumulative)
+        yield "{0}_sum {1}".format(self.name, self.sum)
+        yield "{0}_count {1}".format(self.name, self.count)
+
+
+class Telemetry(object):
+    """
+    Writes move records to *jsonl_path* and the histograms of all moves so
+    far to *metrics_path*. Either can be None.
+
+    record() only appends a line and updates the histograms. The metrics
+    file is written by a daemon thread after every *interval* seconds in
+    which moves were recorded, and on close(). Errors writing either file
+    are reported on stderr once and otherwise ignored, so they never cost
+    a game.
+    """
+
+    def __init__(self, jsonl_path=None, metrics_path=None, interval=1.0):
+        self.jsonl_path = jsonl_path
+        self.metrics_path = metrics_path
+        self.interval = interval
+
+        self.moves = {}
+        self.seconds = Histogram("antichess_move_seconds", "Time used to choose a move.", SECONDS_BUCKETS)
+        self.nodes = Histogram("antichess_search_nodes", "Nodes searched for a move.", NODES_BUCKETS)
+        self.nps = Histogram("antichess_search_nps", "Nodes per second of the search for a move.", NPS_BUCKETS)
+        self.depth = Histogram("antichess_search_depth", "Depth completed by the search for a move.", DEPTH_BUCKETS)
+        self.utilisation = Histogram("antichess_pool_utilisation",
+                                     "Share of the time of the search the pool workers were busy.",
+                                     UTILISATION_BUCKETS)
+        self.last_move = None
+
+        self._jsonl = None
+        self._errors = set()
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if metrics_path is not None:
+            self._thread = threading.Thread(target=self._run, name="telemetry")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def record(self, record):
+        if self.jsonl_path is not None:
+            try:
+                if self._jsonl is None:
+                    self._jsonl = open(self.jsonl_path, "a")
+                self._jsonl.write(json.dumps(record, sort_keys=True) + "\n")
+                self._jsonl.flush()
+            except (IOError, OSError) as error:
+                self._error(self.jsonl_path, error)
+
+        with self._lock:
+            path = record.get("path")
+            self.moves[path] = self.moves.get(path, 0) + 1
+            self.seconds.observe(record["seconds"])
+            if record.get("nodes") is not None:
+                self.nodes.observe(record["nodes"])
+            if record.get("nps") is not None:
+                self.nps.observe(record["nps"])
+            if record.get("depth") is not None:
+                self.depth.observe(record["depth"])
+            if record.get("pool_utilisation") is not None:
+                self.utilisation.observe(record["pool_utilisation"])
+            self.last_move = record.get("time")
+        self._dirty.set()
+
+    def metrics(self):
+        """Returns the metrics in the Prometheus text format."""
+        with self._lock:
+            lines = [
+                "# HELP antichess_moves_total Moves played, by the way they were chosen.",
+                "# TYPE antichess_moves_total counter",
+            ]
+            for path in sorted(self.moves):
+                lines.append('antichess_moves_total{{path="{0}"}} {1}'.format(path, self.moves[path]))
+            for histogram in [self.seconds, self.nodes, self.nps, self.depth, self.utilisation]:
+                lines.extend(histogram.lines())
+            if self.last_move is not None:
+                lines.append("# HELP antichess_last_move_timestamp_seconds Time of the last move.")
+                lines.append("# TYPE antichess_last_move_timestamp_seconds gauge")
+                lines.append("antichess_last_move_timestamp_seconds {0}".format(self.last_move))
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """Replaces the metrics file with the current metrics."""
+        directory = os.path.dirname(os.path.abspath(self.metrics_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".antichess-", suffix=".prom.tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(self.metrics())
+                os.chmod(tmp_path, 0o644)
+                os.rename(tmp_path, self.metrics_path)
+            except:
+                os.remove(tmp_path)
+                raise
+        except (IOError, OSError) as error:
+            self._error(self.metrics_path, error)
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            if self._stop.is_set():
+                return
+            self.write_metrics()
+            # At most one write per interval.
+            self._stop.wait(self.interval)
+
+    def _error(self, path, error):
+        if path not in self._errors:
+            self._errors.add(path)
+            sys.stderr.write("telemetry: can not write {0}: {1}\n".format(path, error))
+
+    def close(self):
+        """Writes the metrics a last time and closes the files."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._dirty.set()
+            self._thread.join()
+            self.write_metrics()
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
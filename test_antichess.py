@@ -0,0 +1,838 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import antichess_board
+import bench
+import minmax
+import move_ordering
+import perft_antichess
+import quiescent_search
+import search_board
+import search_stats
+import tablebase
+import telemetry
+import transposition
+
+import StringIO
+import json
+import multiprocessing
+import os
+import pstats
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+
+class AntichessBoardTestCase(unittest.TestCase):
+
+    def test_forced_captures(self):
+        board = antichess_board.AntichessBoard()
+        self.assertFalse(board.has_capture())
+        self.assertEqual(len(list(board.legal_moves)), 20)
+
+        board.push_uci("e2e4")
+        board.push_uci("d7d5")
+        self.assertTrue(board.has_capture())
+        self.assertEqual([str(move) for move in board.legal_moves], ["e4d5"])
+        self.assertFalse(board.is_legal(minmax.chess.Move.from_uci("g1f3")))
+        self.assertEqual(list(board.generate_legal_moves(minmax.chess.BB_G1)), [])
+
+    def test_en_passant(self):
+        board = antichess_board.AntichessBoard("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        self.assertTrue(board.has_capture())
+        self.assertEqual([str(move) for move in board.legal_moves], ["e5d6"])
+        self.assertEqual([str(move) for move in board.generate_legal_captures()], ["e5d6"])
+
+        # Only an en passant capture counts, not other moves to the square.
+        board = antichess_board.AntichessBoard("4k3/8/8/3p4/8/8/8/4K3 w - d6 0 1")
+        self.assertFalse(board.has_capture())
+        self.assertEqual(list(board.generate_legal_captures()), [])
+
+    def test_check(self):
+        # The checking rook can be taken, so the king may not step aside.
+        board = antichess_board.AntichessBoard("4k3/8/8/8/8/8/3P3R/4K2r w - - 0 1")
+        self.assertTrue(board.has_capture())
+        self.assertEqual([str(move) for move in board.legal_moves], ["h2h1"])
+
+
+class AlphaBetaTestCase(unittest.TestCase):
+
+    def test_best_move_regression(self):
+        # Best moves of the copy based search at depth 3.
+        for fen, best_move in [
+            ("rnbqkbnr/ppp2ppp/8/3pp3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 3", "e4d5"),
+            ("r3k2r/ppp2ppp/2n5/3q4/8/2N5/PPP2PPP/R1BQK2R b KQkq - 0 9", "d5d1"),
+            ("8/8/8/P1P5/8/4K1k1/8/R1N5 w - - 9 61", "c1d3"),
+        ]:
+            board = antichess_board.AntichessBoard(fen)
+            ab = minmax.AlphaBeta(3, 100, board)
+            self.assertEqual(str(ab.get_best_move(board)), best_move, fen)
+
+    def test_iterative_deepening(self):
+        board = antichess_board.AntichessBoard("r3k2r/ppp2ppp/2n5/3q4/8/2N5/PPP2PPP/R1BQK2R b KQkq - 0 9")
+        ab = minmax.AlphaBeta(4, 100, board)
+
+        move = ab.get_best_move(board, time_limit=60, max_depth=2)
+        self.assertEqual(ab.completed_depth, 2)
+        self.assertEqual(str(move), "d5d1")
+        self.assertEqual(ab.best_line[0], move)
+        self.assertEqual(ab.depth, 4)
+
+        # Out of time before the first iteration completes.
+        move = ab.get_best_move(board, time_limit=0, max_depth=2)
+        self.assertEqual(ab.completed_depth, 0)
+        self.assertIn(move, board.legal_moves)
+
+    def test_next_iteration_fits(self):
+        board = antichess_board.AntichessBoard()
+        ab = minmax.AlphaBeta(4, 100, board)
+        now = time.time()
+        self.assertTrue(ab._next_iteration_fits(now - 100, now - 100))
+
+        # The last iteration took about 1 and 3 seconds, with 4 times the
+        # nodes of the one before.
+        ab.deadline = now + 10
+        ab.stats.iteration_nodes = [100, 400]
+        self.assertTrue(ab._next_iteration_fits(now - 5, now - 1))
+        self.assertFalse(ab._next_iteration_fits(now - 5, now - 3))
+
+        # Without a branching factor the next iteration takes as long as
+        # the search so far.
+        ab.stats.iteration_nodes = [100]
+        self.assertTrue(ab._next_iteration_fits(now - 4, now - 1))
+        self.assertFalse(ab._next_iteration_fits(now - 12, now - 1))
+
+    def test_partial_iteration(self):
+        board = antichess_board.AntichessBoard()
+        ab = minmax.AlphaBeta(4, 100, board)
+        a, b, c = [board.parse_uci(uci) for uci in ["e2e3", "e2e4", "g1f3"]]
+        reply = minmax.chess.Move.from_uci("e7e6")
+
+        # The best move of the last iteration did not finish, a better one
+        # did.
+        children = [(a, []), (b, []), (c, [])]
+        utilities = ab._keep_partial_iteration(children, [10, 5, 0], [None, (12, ["e7e6"]), None])
+        self.assertEqual([move for move, _ in children], [b, a, c])
+        self.assertEqual(utilities, [12, 10, 0])
+        self.assertEqual((ab.best_score, ab.best_line), (12, [b, reply]))
+
+        # Moves that finished but do not beat it are not taken.
+        ab.best_line = []
+        children = [(a, []), (b, []), (c, [])]
+        self.assertEqual(ab._keep_partial_iteration(children, [10, 5, 0], [None, (8, []), (10, [])]), [10, 5, 0])
+        self.assertEqual([move for move, _ in children], [a, b, c])
+        self.assertEqual(ab.best_line, [])
+
+        # The best move finished, so the best finished move is taken.
+        utilities = ab._keep_partial_iteration(children, [10, 5, 0], [(4, []), (6, []), None])
+        self.assertEqual([move for move, _ in children], [b, a, c])
+        self.assertEqual(utilities, [6, 10, 0])
+
+        # Without a completed iteration any finished move is taken.
+        children = [(a, []), (b, []), (c, [])]
+        utilities = ab._keep_partial_iteration(children, None, [None, None, (-3, [])])
+        self.assertEqual(children[0][0], c)
+        self.assertEqual(utilities, [-3, float("-inf"), float("-inf")])
+        self.assertEqual(ab._keep_partial_iteration(children, None, [None, None, None]), None)
+
+    def test_search_pool(self):
+        board = antichess_board.AntichessBoard()
+        for uci in ["g1f3", "e7e5", "f3e5", "d8g5"]:
+            board.push_uci(uci)
+
+        with minmax.SearchPool(2) as pool:
+            for _ in range(2):
+                ab = minmax.AlphaBeta(3, 100, board, pool=pool)
+                self.assertEqual(str(ab.get_best_move(board)), "e5d7")
+                self.assertEqual(ab.completed_depth, 3)
+
+    def test_stats(self):
+        board = antichess_board.AntichessBoard("r3k2r/ppp2ppp/2n5/3q4/8/2N5/PPP2PPP/R1BQK2R b KQkq - 0 9")
+
+        with minmax.SearchPool(2) as pool:
+            ab = minmax.AlphaBeta(3, 100, board, pool=pool)
+            ab.get_best_move(board)
+
+        stats = ab.stats
+        self.assertTrue(stats.nodes > 0 and stats.qnodes > 0 and stats.evals > 0)
+        self.assertTrue(0 < stats.tt_hits <= stats.tt_probes)
+        self.assertEqual(sum(stats.cutoffs_by_index), stats.cutoffs)
+        self.assertEqual(stats.cutoffs_by_index[0], stats.first_move_cutoffs)
+        self.assertEqual(len(stats.iteration_nodes), 3)
+        self.assertEqual(sum(stats.iteration_nodes), stats.nodes + stats.qnodes)
+        self.assertEqual(len(stats.branching_factors()), 2)
+        self.assertTrue(stats.qsearch_max_depth > 0)
+        self.assertTrue(stats.movegen_time > 0)
+
+    def test_worker_move_orderer(self):
+        # One orderer per worker, kept over the tasks of a search.
+        board = antichess_board.AntichessBoard("r3k2r/ppp2ppp/2n5/3q4/8/2N5/PPP2PPP/R1BQK2R b KQkq - 0 9")
+        self.addCleanup(setattr, minmax, "_worker_orderer", None)
+        orderer = minmax._worker_move_orderer(1)
+        self.assertIs(minmax._worker_move_orderer(1), orderer)
+
+        search = minmax.to_search_board(board)
+        ab = minmax.AlphaBeta(2, 100, board, orderer=orderer)
+        ab._get_move_utility(search)
+        self.assertTrue(ab.stats.cutoffs > 0)
+
+        # Only the cutoffs of its own search count in the stats.
+        cutoffs = orderer.cutoffs
+        ab = minmax.AlphaBeta(2, 100, board, orderer=orderer)
+        ab._get_move_utility(search)
+        self.assertEqual(ab.stats.cutoffs, orderer.cutoffs - cutoffs)
+
+        self.assertIs(minmax._worker_move_orderer(2), orderer)
+        self.assertEqual(orderer.cutoffs, 0)
+        self.assertEqual(orderer.killers, [])
+        self.assertTrue(any(orderer.history))
+
+    def test_profile(self):
+        board = antichess_board.AntichessBoard("rnbqkbnr/ppp2ppp/8/3pp3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 3")
+        profile_dir = tempfile.mkdtemp()
+        stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            with minmax.SearchPool(1) as pool:
+                ab = minmax.AlphaBeta(2, 100, board, pool=pool, profile_dir=profile_dir)
+                self.assertEqual(str(ab.get_best_move(board)), "e4d5")
+            summary = sys.stderr.getvalue()
+
+            paths = os.listdir(profile_dir)
+            self.assertEqual(len(paths), 1)
+            stats = pstats.Stats(os.path.join(profile_dir, paths[0]))
+        finally:
+            sys.stderr = stderr
+            shutil.rmtree(profile_dir)
+
+        self.assertIn(paths[0], summary)
+        # The work done in the pool worker is included.
+        self.assertTrue(any(function == "min_alpha_beta" for _, _, function in stats.stats))
+
+    def test_lazy_smp(self):
+        board = antichess_board.AntichessBoard("rnbqkbnr/ppp2ppp/8/3pp3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 3")
+
+        with minmax.SearchPool(2, shared_tt=True) as pool:
+            ab = minmax.AlphaBeta(3, 100, board, pool=pool, parallel=minmax.LAZY_SMP)
+            self.assertEqual(str(ab.get_best_move(board)), "e4d5")
+            self.assertEqual(ab.completed_depth, 3)
+            self.assertEqual(str(ab.best_line[0]), "e4d5")
+
+        with minmax.SearchPool(1) as pool:
+            ab = minmax.AlphaBeta(3, 100, board, pool=pool, parallel=minmax.LAZY_SMP)
+            self.assertRaises(ValueError, ab.get_best_move, board)
+
+    def test_aspiration_window(self):
+        board = antichess_board.AntichessBoard("rnbqkbnr/ppp2ppp/8/3pp3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 3")
+        root = minmax.to_search_board(board)
+        search = lambda ab: lambda alpha, beta: ab.search_root(root, alpha, beta)
+
+        ab = minmax.AlphaBeta(3, 100, board)
+        score, move = ab._aspiration_search(search(ab), None)
+        self.assertEqual(move, board.parse_uci("e4d5").code())
+
+        # A bad guess fails and is searched again with a wider window.
+        for guess, fail_lows, fail_highs in [(score + 300, 2, 0), (score - 30, 0, 1)]:
+            ab = minmax.AlphaBeta(3, 100, board)
+            self.assertEqual(ab._aspiration_search(search(ab), guess), (score, move))
+            self.assertEqual(ab.stats.aspiration_fail_lows, fail_lows)
+            self.assertEqual(ab.stats.aspiration_fail_highs, fail_highs)
+
+    def test_null_window(self):
+        for x in [-1e9, -104.00000000000003, -0.5, 0.0, 1e-300, 2.5, 1e300]:
+            self.assertTrue(x < minmax._next_float(x))
+            self.assertTrue(minmax._prev_float(x) < x)
+            self.assertEqual(minmax._prev_float(minmax._next_float(x)), x)
+
+    def test_search_restores_board(self):
+        board = antichess_board.AntichessBoard()
+        for uci in ["e2e3", "b7b5", "f1b5", "b8c6"]:
+            board.push_uci(uci)
+        search = minmax.to_search_board(board)
+        ply = search.ply
+
+        ab = minmax.AlphaBeta(3, 100, board)
+        ab.max_alpha_beta(search, 0, 1, float("-inf"), float("inf"))
+
+        self.assertEqual(search.fen(), board.fen())
+        self.assertEqual(search.ply, ply)
+        self.assertEqual(minmax.evaluate(search), minmax.evaluate_full(search))
+
+    def test_mate_score_from_earlier_search(self):
+        # Mate in 2 after d5c6 a6a7, which the first search already saw
+        # 2 plies further from its root.
+        board = antichess_board.AntichessBoard("8/8/k7/3K1R2/8/8/8/8 w - - 0 1")
+        search = minmax.to_search_board(board)
+        tt = transposition.TranspositionTable(1)
+        ab = minmax.AlphaBeta(6, 1, board, tt=tt)
+        self.assertEqual(ab.search_root(search), (minmax.CHECK_SCORE - 5, board.parse_uci("d5c6").code()))
+
+        board.push_uci("d5c6")
+        board.push_uci("a6a7")
+        search = minmax.to_search_board(board)
+        tt.new_search()
+        ab = minmax.AlphaBeta(3, 100, board, tt=tt)
+        self.assertEqual(ab.search_root(search)[0], minmax.CHECK_SCORE - 3)
+        ab = minmax.AlphaBeta(3, 100, board, tt=transposition.TranspositionTable(1))
+        self.assertEqual(ab.search_root(search)[0], minmax.CHECK_SCORE - 3)
+
+    def test_repetition_is_draw(self):
+        board = antichess_board.AntichessBoard()
+        for uci in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+            board.push_uci(uci)
+
+        search = minmax.to_search_board(board)
+        ab = minmax.AlphaBeta(3, 100, board)
+        self.assertEqual(ab.max_alpha_beta(search, 1, 1, float("-inf"), float("inf")), -minmax.DRAW_SCORE)
+        self.assertEqual(ab.min_alpha_beta(search, 1, 1, float("-inf"), float("inf")), minmax.DRAW_SCORE)
+
+
+class IncrementalEvaluatorTestCase(unittest.TestCase):
+
+    def test_random_games(self):
+        rng = random.Random(2017)
+        positions = 0
+        while positions < 3000:
+            board = antichess_board.AntichessBoard()
+            board.set_evaluator(minmax.IncrementalEvaluator(board))
+            for _ in range(120):
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+                if len(board.move_stack) > 2 and rng.random() < 0.2:
+                    board.pop()
+
+                self.assertEqual(minmax.evaluate(board), minmax.evaluate_full(board), board.fen())
+                positions += 1
+
+        board.set_fen("8/8/8/P1P5/8/4K1k1/8/R1N5 w - - 9 61")
+        self.assertEqual(minmax.evaluate(board), minmax.evaluate_full(board))
+
+        # Pushed before the evaluator was attached.
+        board.push_uci("c1d3")
+        board.set_evaluator(minmax.IncrementalEvaluator(board))
+        board.pop()
+        self.assertEqual(minmax.evaluate(board), minmax.evaluate_full(board))
+
+    def test_piece_tables(self):
+        c = minmax.chess
+        for table, piece_type, color, source in [
+                (minmax.PIECE_TABLES_MIDDLE, c.PAWN, c.WHITE, minmax.PAWN_TABLE_W),
+                (minmax.PIECE_TABLES_END, c.QUEEN, c.BLACK, minmax.QUEEN_TABLE_B),
+                (minmax.PIECE_TABLES_MIDDLE, c.KING, c.WHITE, minmax.KING_TABLE_W_MIDDLE),
+                (minmax.PIECE_TABLES_END, c.KING, c.BLACK, minmax.KING_TABLE_B_END)]:
+            offset = minmax.piece_table_offset(piece_type, color)
+            self.assertEqual(list(table[offset:offset + 64]), source[::-1])
+
+        board = antichess_board.AntichessBoard("8/8/8/P1P5/8/4K1k1/8/R1N5 w - - 9 61")
+        self.assertEqual(minmax.evaluate_piece_tables(board, 1), 25)
+
+
+class QuiescenceSearchTestCase(unittest.TestCase):
+
+    def test_is_quiet_position(self):
+        board = minmax.to_search_board(antichess_board.AntichessBoard())
+        self.assertTrue(quiescent_search.is_quiet_position(board))
+        for uci, quiet in [("e2e4", True), ("d7d5", True), ("e4d5", False), ("d8d5", False), ("e1e2", True)]:
+            board.push(minmax.chess.Move.from_uci(uci).code())
+            self.assertEqual(quiescent_search.is_quiet_position(board), quiet, uci)
+
+        # En passant.
+        board = minmax.to_search_board(antichess_board.AntichessBoard("4k3/8/8/8/1p6/8/P7/4K3 w - - 0 1"))
+        for uci, quiet in [("a2a4", True), ("b4a3", False)]:
+            board.push(minmax.chess.Move.from_uci(uci).code())
+            self.assertEqual(quiescent_search.is_quiet_position(board), quiet, uci)
+
+        board = minmax.to_search_board(antichess_board.AntichessBoard("4k3/8/8/8/8/8/8/4K2r w - - 0 1"))
+        self.assertFalse(quiescent_search.is_quiet_position(board))
+
+    def test_search(self):
+        # exd3+ Kxd3
+        board = minmax.to_search_board(antichess_board.AntichessBoard("4k3/8/8/8/4p3/3P4/4K3/8 b - - 0 1"))
+        fen = board.fen()
+        tt = transposition.TranspositionTable(1)
+
+        qsearch = quiescent_search.QuiescenceSearch(minmax.evaluate, move_ordering.MoveOrderer(), tt)
+        score = qsearch.search(board, float("-inf"), float("inf"))
+        self.assertEqual(board.fen(), fen)
+        self.assertEqual(qsearch.nodes, 3)
+        self.assertEqual(tt.probe(board.zobrist_hash()).depth, quiescent_search.QUIESCENCE_TT_DEPTH)
+
+        # Answered from the table.
+        nodes = qsearch.nodes
+        self.assertEqual(qsearch.search(board, float("-inf"), float("inf")), score)
+        self.assertEqual(qsearch.nodes, nodes + 1)
+
+        shallow = quiescent_search.QuiescenceSearch(minmax.evaluate, max_depth=0)
+        self.assertEqual(shallow.search(board, float("-inf"), float("inf")), minmax.evaluate(board))
+        self.assertEqual(shallow.nodes, 1)
+
+
+class MoveOrdererTestCase(unittest.TestCase):
+
+    def test_order(self):
+        # Captures are not forced on a chess.Board, so all moves are legal.
+        board = minmax.chess.Board("4k3/8/8/3q1p2/4P3/8/8/R3K3 w - - 0 1")
+        search = search_board.SearchBoard.from_board(board)
+        orderer = move_ordering.MoveOrderer()
+        moves = [move.code() for move in board.legal_moves]
+
+        ordered = orderer.order(search, moves)
+        self.assertEqual(sorted(ordered), sorted(moves))
+        self.assertEqual([str(minmax.chess.MOVES[move]) for move in ordered[:2]], ["e4d5", "e4f5"])
+
+        hash_move = board.parse_uci("a1a2").code()
+        self.assertEqual(orderer.order(search, moves, hash_move)[0], hash_move)
+
+        # Killers come right after the captures.
+        killer = board.parse_uci("e1f2").code()
+        orderer.cutoff(search, killer, 3, 2, 1)
+        self.assertEqual(orderer.order(search, moves, None, 3)[2], killer)
+        self.assertEqual(orderer.history[killer & 0xfff], 4)
+
+        orderer.cutoff(search, board.parse_uci("e4d5").code(), 3, 2, 0)
+        self.assertEqual(orderer.killers[3], [killer])
+        self.assertEqual(orderer.first_move_cutoff_rate(), 0.5)
+
+        orderer.new_search()
+        self.assertEqual(orderer.cutoffs, 0)
+        self.assertEqual(orderer.killers, [])
+        self.assertEqual(orderer.history[killer & 0xfff], 2)
+
+    def test_defended_victim(self):
+        # Both captures take a knight, but on d5 the queen is taken back.
+        search = search_board.SearchBoard.from_board(
+            antichess_board.AntichessBoard("4k3/7n/2p5/3n4/8/3Q4/8/4K3 w - - 0 1"))
+        orderer = move_ordering.MoveOrderer()
+        captures = orderer.order_captures(search, search.generate_captures())
+        self.assertEqual([str(minmax.chess.MOVES[move]) for move in captures], ["d3h7", "d3d5"])
+
+
+class TranspositionTableTestCase(unittest.TestCase):
+
+    def test_size(self):
+        # A full table stays within its memory cap.
+        tt = transposition.TranspositionTable(0.01)
+        rng = random.Random(5)
+        for i in range(tt.size):
+            tt.store(i + rng.getrandbits(64) // tt.size * tt.size, rng.randint(-3, 20),
+                     rng.uniform(-1000, 1000), transposition.EXACT, rng.randrange(1 << 15))
+        self.assertEqual(len(tt), tt.size)
+
+        used = sys.getsizeof(tt.entries)
+        for entry in tt.entries:
+            used += (sys.getsizeof(entry) + sys.getsizeof(entry.key) + sys.getsizeof(entry.score) +
+                     sys.getsizeof(entry.move))
+        self.assertLessEqual(used, 0.01 * 1024 * 1024)
+
+    def test_keep_move(self):
+        move = minmax.chess.Move.from_uci("e2e4").code()
+        for replacement in [transposition.REPLACE_DEPTH_PREFERRED, transposition.REPLACE_ALWAYS]:
+            for tt in [transposition.TranspositionTable(0.01, replacement),
+                       transposition.SharedTranspositionTable(0.01, replacement)]:
+                tt.store(1, 2, 1.0, transposition.EXACT, move)
+                tt.store(1, 3, 2.0, transposition.UPPER_BOUND, None)
+                entry = tt.probe(1)
+                self.assertEqual((entry.depth, entry.score, entry.move), (3, 2.0, move))
+
+
+class SharedTranspositionTableTestCase(unittest.TestCase):
+
+    def test_store_probe(self):
+        tt = transposition.SharedTranspositionTable(0.01)
+        move = minmax.chess.Move.from_uci("a7a8q").code()
+        tt.store(0xfedcba9876543210, -3, 104.00000000000003, transposition.LOWER_BOUND, move)
+
+        entry = tt.probe(0xfedcba9876543210)
+        self.assertEqual(entry.depth, -3)
+        self.assertEqual(entry.score, 104.00000000000003)
+        self.assertEqual(entry.flag, transposition.LOWER_BOUND)
+        self.assertEqual(entry.move, move)
+        self.assertEqual(tt.probe(0xfedcba9876543211), None)
+        self.assertEqual(len(tt), 1)
+
+        # Keeps the move of a result without one.
+        tt.store(0xfedcba9876543210, 2, -1.5, transposition.UPPER_BOUND, None)
+        self.assertEqual(tt.probe(0xfedcba9876543210).move, move)
+
+    def test_mate_scores(self):
+        # Mates are stored relative to the position and probed relative to
+        # the root of the probing search.
+        for tt in [transposition.TranspositionTable(0.01), transposition.SharedTranspositionTable(0.01)]:
+            tt.store(1, 3, transposition.MATE_SCORE - 7, transposition.EXACT, None, 2)
+            self.assertEqual(tt.probe(1, 2).score, transposition.MATE_SCORE - 7)
+            self.assertEqual(tt.probe(1).score, transposition.MATE_SCORE - 5)
+            tt.store(2, 3, 7 - transposition.MATE_SCORE, transposition.EXACT, None, 2)
+            self.assertEqual(tt.probe(2, 4).score, 9 - transposition.MATE_SCORE)
+            tt.store(3, 3, 104.5, transposition.EXACT, None, 2)
+            self.assertEqual(tt.probe(3).score, 104.5)
+
+    def test_torn_slot(self):
+        tt = transposition.SharedTranspositionTable(0.01)
+        tt.store(12345, 1, 1.0, transposition.EXACT, None)
+        index = 12345 % tt.size * transposition.SHARED_SLOT_WORDS
+        tt.array[index + 2] ^= 1
+        self.assertEqual(tt.probe(12345), None)
+
+
+class SearchStatsTestCase(unittest.TestCase):
+
+    def test_merge(self):
+        stats = search_stats.SearchStats()
+        stats.nodes = 10
+        stats.qsearch_max_depth = 3
+        stats.cutoffs_by_index = [4, 1]
+        stats.add_iteration(1, 20)
+        stats.add_iteration(2, 100)
+
+        other = search_stats.SearchStats()
+        other.nodes = 5
+        other.qsearch_max_depth = 2
+        other.cutoffs_by_index = [1, 0, 2]
+        other.add_iteration(2, 60)
+        other.add_iteration(3, 480)
+
+        stats.merge(other.as_dict())
+        self.assertEqual(stats.nodes, 15)
+        self.assertEqual(stats.qsearch_max_depth, 3)
+        self.assertEqual(stats.cutoffs_by_index, [5, 1, 2])
+        self.assertEqual(stats.iteration_nodes, [20, 160, 480])
+        self.assertEqual(stats.branching_factors(), [8.0, 3.0])
+        self.assertEqual(stats.effective_branching_factor(), 3.0)
+
+        stats.reset()
+        self.assertEqual(stats.iteration_nodes, [])
+        self.assertEqual(stats.effective_branching_factor(), 0.0)
+
+
+class BenchTestCase(unittest.TestCase):
+
+    def test_deterministic(self):
+        positions = [position for position in bench.read_positions()
+                     if position[0] in ["opening-captures", "endgame-rook"]]
+        self.assertEqual(len(positions), 2)
+
+        report = bench.run(positions, depth=2, factor=100)
+        self.assertEqual(len(report["time_to_depth"]), 2)
+        self.assertTrue(report["nodes"] > 0)
+        for _ in range(2):
+            other = bench.run(positions, depth=2, factor=100)
+            self.assertEqual([(r["move"], r["nodes"]) for r in other["positions"]],
+                             [(r["move"], r["nodes"]) for r in report["positions"]])
+
+        comparison = bench.compare(report, other)
+        self.assertEqual(comparison["best_move_agreement"], 1.0)
+        self.assertEqual(comparison["nodes_change"], 0)
+        self.assertFalse(comparison["drift"])
+
+        report["nps"] = other["nps"] // 2
+        self.assertTrue(bench.compare(report, other, threshold=0.1)["regression"])
+        self.assertFalse(bench.compare(report, other, threshold=0.6)["regression"])
+
+        # Speed only counts against a baseline of the same machine.
+        other["machine"] = report["machine"] + "-other"
+        comparison = bench.compare(report, other, threshold=0.1)
+        self.assertFalse(comparison["nps_compared"])
+        self.assertFalse(comparison["regression"])
+
+        other["nodes"] += 1
+        self.assertTrue(bench.compare(report, other)["drift"])
+        other["nodes"] -= 1
+        other["positions"][0]["move"] = "a1a2"
+        self.assertTrue(bench.compare(report, other)["drift"])
+
+        report["depth"] = 3
+        self.assertRaises(ValueError, bench.compare, report, other)
+
+
+class TablebaseTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        tablebase.generate(cls.directory, signatures=["KvKR"])
+        cls.tablebases = tablebase.open_tablebases(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebases.close()
+        shutil.rmtree(cls.directory)
+
+    def test_signatures(self):
+        self.assertEqual(tablebase.signature_name("KR", "K"), ("KRvK", False))
+        self.assertEqual(tablebase.signature_name("KP", "KRQ"), ("KQRvKP", True))
+        self.assertEqual(tablebase.dependencies("KPvKN"), ["KBvKN", "KNvKN", "KPvK", "KQvKN", "KRvKN"])
+        self.assertEqual(len(tablebase.all_signatures(4)), 33)
+        self.assertEqual(os.listdir(self.directory), ["KRvK.atb"])
+        self.assertEqual(self.tablebases.max_pieces, 3)
+
+    def test_probe(self):
+        board = antichess_board.AntichessBoard("7k/8/6K1/8/8/8/8/R7 w - - 0 1")
+        self.assertEqual(self.tablebases.probe_dtm(board), 1)
+        self.assertEqual(self.tablebases.probe_wdl(board), 1)
+        self.assertEqual(self.tablebases.best_move(board).uci(), "a1a8")
+
+        board.push_uci("a1a8")
+        self.assertEqual(self.tablebases.probe_dtm(board), 0)
+        self.assertEqual(self.tablebases.probe_wdl(board), -1)
+
+        # Colours swapped.
+        dtm = self.tablebases.probe_dtm(antichess_board.AntichessBoard("K6R/8/2k5/8/8/8/8/8 w - - 0 1"))
+        self.assertTrue(dtm > 1)
+        board = antichess_board.AntichessBoard("8/8/8/8/8/2K5/8/k6r b - - 0 1")
+        self.assertEqual(self.tablebases.probe_dtm(board), dtm)
+
+        # The king must take the undefended rook.
+        board = antichess_board.AntichessBoard("8/8/8/8/8/8/1r6/K2k4 w - - 0 1")
+        self.assertEqual(self.tablebases.probe_dtm(board), 0)
+        self.assertEqual(self.tablebases.best_move(board).uci(), "a1b2")
+
+        self.assertEqual(self.tablebases.probe_dtm(antichess_board.AntichessBoard("8/8/8/8/8/2k5/8/K6Q b - - 0 1")),
+                         None)
+        self.assertEqual(self.tablebases.probe_dtm(antichess_board.AntichessBoard()), None)
+
+    def test_agrees_with_board(self):
+        # Every value follows from the values after the legal moves of
+        # AntichessBoard.
+        rng = random.Random(2017)
+        checked = 0
+        while checked < 200:
+            board = antichess_board.AntichessBoard(None)
+            squares = rng.sample(range(64), 3)
+            board.set_piece_at(squares[0], minmax.chess.Piece(minmax.chess.KING, minmax.chess.WHITE))
+            board.set_piece_at(squares[1], minmax.chess.Piece(minmax.chess.ROOK, minmax.chess.WHITE))
+            board.set_piece_at(squares[2], minmax.chess.Piece(minmax.chess.KING, minmax.chess.BLACK))
+            board.turn = rng.random() < 0.5
+            if not board.is_valid():
+                continue
+            checked += 1
+
+            values = []
+            for move in list(board.legal_moves):
+                board.push(move)
+                values.append(self.tablebases._probe(board))
+                board.pop()
+            if board.is_checkmate():
+                expected = 1
+            elif not values:
+                expected = tablebase.DRAW
+            else:
+                expected = tablebase._best(values)
+            self.assertEqual(self.tablebases._probe(board), expected, board.fen())
+
+    def test_search(self):
+        board = antichess_board.AntichessBoard("8/8/8/3k4/8/8/8/R3K3 w - - 0 1")
+        dtm = self.tablebases.probe_dtm(board)
+        self.assertTrue(dtm > 0)
+
+        ab = minmax.AlphaBeta(1, 100, board, tablebases=self.tablebases)
+        score, move = ab.search_root(minmax.to_search_board(board))
+        self.assertEqual(score, minmax.CHECK_SCORE - dtm)
+        board.push(minmax.chess.MOVES[move])
+        self.assertEqual(self.tablebases.probe_dtm(board), 1 - dtm)
+        board.pop()
+
+        with minmax.SearchPool(1) as pool:
+            ab = minmax.AlphaBeta(2, 100, board, pool=pool, tablebases=self.tablebases)
+            ab.get_best_move(board)
+        self.assertEqual(ab.best_score, minmax.CHECK_SCORE - dtm)
+        self.assertTrue(ab.stats.tb_hits > 0)
+
+
+class TelemetryTestCase(unittest.TestCase):
+
+    def test_move_record(self):
+        board = antichess_board.AntichessBoard("rnbqkbnr/ppp2ppp/8/3pp3/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 3")
+        with minmax.SearchPool(1) as pool:
+            ab = minmax.AlphaBeta(2, 100, board, pool=pool)
+            move = ab.get_best_move(board)
+
+        record = telemetry.move_record(board, move, telemetry.PATH_SEARCH, 0.5, search=ab, time_limit=1.0)
+        self.assertEqual(record["fen"], board.fen())
+        self.assertEqual(record["move"], "e4d5")
+        self.assertEqual(record["depth"], 2)
+        self.assertEqual(record["pv"][0], "e4d5")
+        self.assertEqual(record["nodes"], ab.stats.nodes + ab.stats.qnodes)
+        self.assertEqual(record["nps"], record["nodes"] * 2)
+        self.assertEqual(record["processes"], 1)
+        self.assertTrue(0 < record["pool_utilisation"])
+
+        record = telemetry.move_record(board, "b1c3", telemetry.PATH_OPENING, 0.0)
+        self.assertNotIn("nodes", record)
+
+    def test_files(self):
+        directory = tempfile.mkdtemp()
+        jsonl_path = os.path.join(directory, "moves.jsonl")
+        metrics_path = os.path.join(directory, "antichess.prom")
+        try:
+            with telemetry.Telemetry(jsonl_path, metrics_path, interval=0.01) as moves:
+                moves.record({"time": 1.0, "path": telemetry.PATH_OPENING, "seconds": 0.0})
+                moves.record({"time": 2.0, "path": telemetry.PATH_SEARCH, "seconds": 0.3,
+                              "nodes": 5000, "nps": 16666, "depth": 4, "pool_utilisation": 0.8})
+                moves.record({"time": 3.0, "path": telemetry.PATH_SEARCH, "seconds": 0.7,
+                              "nodes": 20000, "nps": 28571, "depth": 5, "pool_utilisation": 0.95})
+
+            with open(jsonl_path) as f:
+                records = [json.loads(line) for line in f]
+            with open(metrics_path) as f:
+                metrics = f.read().splitlines()
+            # No temporary files are left behind.
+            self.assertEqual(sorted(os.listdir(directory)), ["antichess.prom", "moves.jsonl"])
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual([record["time"] for record in records], [1.0, 2.0, 3.0])
+        self.assertIn('antichess_moves_total{path="opening"} 1', metrics)
+        self.assertIn('antichess_moves_total{path="search"} 2', metrics)
+        # Buckets are cumulative.
+        self.assertIn('antichess_move_seconds_bucket{le="0.25"} 1', metrics)
+        self.assertIn('antichess_move_seconds_bucket{le="0.5"} 2', metrics)
+        self.assertIn('antichess_move_seconds_bucket{le="+Inf"} 3', metrics)
+        self.assertIn("antichess_move_seconds_count 3", metrics)
+        self.assertIn('antichess_search_nodes_bucket{le="10000"} 1', metrics)
+        self.assertIn("antichess_search_nodes_sum 25000", metrics)
+        self.assertIn("antichess_last_move_timestamp_seconds 3.0", metrics)
+
+    def test_unwritable(self):
+        stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            moves = telemetry.Telemetry("/nonexistent/moves.jsonl", "/nonexistent/antichess.prom")
+            for _ in range(2):
+                moves.record({"time": 1.0, "path": telemetry.PATH_OPENING, "seconds": 0.0})
+            moves.close()
+            errors = sys.stderr.getvalue().splitlines()
+        finally:
+            sys.stderr = stderr
+
+        # Reported once per file.
+        self.assertEqual(len(errors), 2)
+
+
+class PerftTestCase(unittest.TestCase):
+
+    def test_suite(self):
+        for kind in sorted(perft_antichess.BOARDS):
+            report = perft_antichess.run_suite(kind=kind, max_nodes=3000)
+            self.assertEqual(report["failures"], 0, kind)
+            self.assertTrue(len(report["positions"]) > 30)
+
+    def test_bulk(self):
+        board = antichess_board.AntichessBoard("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
+        self.assertEqual(perft_antichess.perft(board, 3, bulk=False), 87)
+        self.assertEqual(perft_antichess.perft(board, 3), 87)
+
+    def test_divide(self):
+        fen = "8/P1k5/8/8/8/8/1p4K1/8 w - - 0 1"
+        counts = perft_antichess.divide(fen, 3)
+        self.assertEqual(len(counts), 12)
+        self.assertEqual(sum(nodes for _, nodes in counts), 1392)
+        self.assertEqual(sorted(perft_antichess.divide(fen, 3, "search", bulk=False)), sorted(counts))
+
+        pool = multiprocessing.Pool(2)
+        try:
+            self.assertEqual(perft_antichess.divide(fen, 3, pool=pool), counts)
+        finally:
+            pool.terminate()
+
+
+class SearchBoardTestCase(unittest.TestCase):
+
+    def assertSameBoard(self, search, board):
+        self.assertEqual(search.fen(), board.fen())
+        self.assertEqual(search.zobrist_hash(), board.zobrist_hash(), board.fen())
+        self.assertEqual(search.is_check(), board.is_check())
+        self.assertEqual(
+            sorted(search.generate_moves()),
+            sorted(search_board.encode_move(move) for move in board.legal_moves), board.fen())
+
+    def test_random_games(self):
+        rng = random.Random(2018)
+        for _ in range(12):
+            board = antichess_board.AntichessBoard()
+            search = search_board.SearchBoard.from_board(board)
+            played = []
+            while search.ply < 200:
+                self.assertSameBoard(search, board)
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                code = search_board.encode_move(move)
+                capture = bool(board.is_capture(move))
+                self.assertEqual(search.is_capture(code), capture)
+                self.assertEqual(search.is_en_passant(code), bool(board.is_en_passant(move)))
+                self.assertEqual(search.is_attacked_by(not board.turn, move.to_square),
+                                 board.is_attacked_by(not board.turn, move.to_square))
+                board.push(move)
+                search.push(code)
+                played.append(move)
+                self.assertEqual(search.was_capture(), capture)
+
+            while search.ply:
+                self.assertEqual(search_board.decode_move(search.pop()), played.pop())
+                board.pop()
+            self.assertSameBoard(search, board)
+
+    def test_evaluator(self):
+        rng = random.Random(2019)
+        board = minmax.to_search_board(antichess_board.AntichessBoard())
+        for _ in range(300):
+            moves = board.generate_moves()
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            if board.ply > 2 and rng.random() < 0.2:
+                board.pop()
+            self.assertEqual(minmax.evaluate(board), minmax.evaluate_full(board), board.fen())
+
+    def test_repetition(self):
+        search = minmax.to_search_board(antichess_board.AntichessBoard())
+        for uci in ["g1f3", "g8f6", "f3g1"]:
+            search.push(minmax.chess.Move.from_uci(uci).code())
+            self.assertFalse(search.is_repetition(2))
+        for uci in ["f6g8"] + ["g1f3", "g8f6", "f3g1", "f6g8"] * 3:
+            search.push(minmax.chess.Move.from_uci(uci).code())
+            self.assertTrue(search.is_repetition(2))
+        self.assertTrue(search.is_repetition(5))
+        self.assertFalse(search.is_repetition(6))
+        self.assertTrue(search.is_fivefold_repetition())
+
+        # Moves played before the search are replayed.
+        board = antichess_board.AntichessBoard()
+        for uci in ["b1c3", "b8c6", "c3b1", "c6b8"]:
+            board.push_uci(uci)
+        self.assertTrue(minmax.to_search_board(board).is_repetition(2))
+        board.push_uci("e2e3")
+        self.assertFalse(minmax.to_search_board(board).is_repetition(2))
+
+    def test_perft(self):
+        search = search_board.SearchBoard.from_board(antichess_board.AntichessBoard())
+        self.assertEqual(search.perft(3), 8067)
+
+        search = search_board.SearchBoard.from_board(antichess_board.AntichessBoard(
+            "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"))
+        self.assertEqual(search.perft(3), 487)
+
+        search = search_board.SearchBoard.from_board(antichess_board.AntichessBoard(
+            "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"))
+        self.assertEqual(search.perft(4), 218)
+
+    def test_to_board(self):
+        fen = "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"
+        search = search_board.SearchBoard.from_board(antichess_board.AntichessBoard(fen))
+        board = search.to_board()
+        self.assertTrue(isinstance(board, antichess_board.AntichessBoard))
+        self.assertEqual(board.fen(), fen)
+        self.assertEqual([str(move) for move in board.legal_moves], ["e5f6"])
+
+        search.push(search_board.encode_move(minmax.chess.Move.from_uci("e5f6")))
+        self.assertEqual(search.to_board().fen(), "rnbqkbnr/ppp1p1pp/5P2/3p4/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+from collections import namedtuple
+import ctypes
+import multiprocessing
+import struct
+import sys
+
+# Bound types
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Replacement policies
+REPLACE_DEPTH_PREFERRED = "depth"
+REPLACE_ALWAYS = "always"
+
+DEFAULT_SIZE_MB = 16
+
+# Scores of mates, less the half moves to mate. Scores within MAX_MATE_PLY
+# of MATE_SCORE are mates.
+MATE_SCORE = 100000
+MAX_MATE_PLY = 1000
+
+TTEntry = namedtuple("TTEntry", ["key", "depth", "score", "flag", "move", "generation"])
+
+# Size of one stored entry in bytes: the list slot, the tuple and the key,
+# score and move code objects it holds. Depths, flags and generations are
+# small cached ints. Used to turn a memory cap into a number of slots.
+ENTRY_BYTES = (struct.calcsize("P") + sys.getsizeof(TTEntry(*[None] * 6)) +
+               sys.getsizeof(2 ** 64 - 1) + sys.getsizeof(float(MATE_SCORE)) + sys.getsizeof(1 << 14))
+
+
+def score_to_tt(score, ply):
+    # Mate scores of the search count the half moves from its root, the
+    # table counts them from the stored position, which can be reached
+    # from other roots.
+    if score > MATE_SCORE - MAX_MATE_PLY:
+        return score + ply
+    elif score < MAX_MATE_PLY - MATE_SCORE:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score > MATE_SCORE - MAX_MATE_PLY:
+        return score - ply
+    elif score < MAX_MATE_PLY - MATE_SCORE:
+        return score + ply
+    return score
+
+
+class TranspositionTable(object):
+    """
+    Fixed size hash table of search results keyed by zobrist hash.
+
+    Scores are stored from the point of view of the side to move in the
+    stored position. *depth* is the remaining search depth the score was
+    computed with. *ply* is the distance of the position from the root of
+    the search, mate scores are stored relative to the position. *move* is
+    the :func:`code <chess.Move.code()>` of the best move or ``None``.
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, replacement=REPLACE_DEPTH_PREFERRED):
+        if replacement not in (REPLACE_DEPTH_PREFERRED, REPLACE_ALWAYS):
+            raise ValueError("unknown replacement policy: {0}".format(repr(replacement)))
+
+        self.size_mb = size_mb
+        self.replacement = replacement
+        self.size = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.filled = 0
+
+    def new_search(self):
+        # Entries from older searches are always replaced.
+        self.generation += 1
+
+    def probe(self, key, ply=0):
+        entry = self.entries[key % self.size]
+        if entry is not None and entry.key == key:
+            score = score_from_tt(entry.score, ply)
+            return entry if score == entry.score else entry._replace(score=score)
+        return None
+
+    def store(self, key, depth, score, flag, move, ply=0):
+        index = key % self.size
+        score = score_to_tt(score, ply)
+        old = self.entries[index]
+
+        if old is None:
+            self.filled += 1
+        elif old.key == key:
+            # Keep the old best move if the new result has none.
+            if move is None:
+                move = old.move
+        elif (self.replacement == REPLACE_DEPTH_PREFERRED and
+              old.generation == self.generation and old.depth > depth):
+            return
+
+        self.entries[index] = TTEntry(key, depth, score, flag, move, self.generation)
+
+    def hashfull(self):
+        """Gets the fill rate of the table in permill."""
+        return self.filled * 1000 // self.size
+
+    def __len__(self):
+        return self.filled
+
+    def __getstate__(self):
+        # Only the configuration crosses process boundaries. Every process
+        # fills its own table.
+        return {"size_mb": self.size_mb, "replacement": self.replacement}
+
+    def __setstate__(self, state):
+        self.__init__(state["size_mb"], state["replacement"])
+
+
+# Words per slot of the shared table: key ^ meta ^ score, meta and score.
+SHARED_SLOT_WORDS = 3
+
+# Depths are stored with this offset in 8 bits.
+SHARED_DEPTH_OFFSET = 128
+
+
+class SharedTranspositionTable(object):
+    """
+    Transposition table in shared memory for searches running in several
+    processes at once.
+
+    Slots are packed into 64 bit words and written without locks. The first
+    word of a slot is the key xor the other two, so a slot that was torn by
+    concurrent writes no longer matches its key and reads as empty.
+
+    Pass the *array* of an existing table to use it from another process
+    (e.g. in a pool initializer after forking).
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, replacement=REPLACE_DEPTH_PREFERRED, array=None):
+        if replacement not in (REPLACE_DEPTH_PREFERRED, REPLACE_ALWAYS):
+            raise ValueError("unknown replacement policy: {0}".format(repr(replacement)))
+
+        self.size_mb = size_mb
+        self.replacement = replacement
+        self.size = max(1, int(size_mb * 1024 * 1024) // (8 * SHARED_SLOT_WORDS))
+        self.generation = 0
+
+        if array is None:
+            array = multiprocessing.RawArray(ctypes.c_uint64, SHARED_SLOT_WORDS * self.size)
+        elif len(array) != SHARED_SLOT_WORDS * self.size:
+            raise ValueError("shared array does not match table size")
+        self.array = array
+
+    def clear(self):
+        ctypes.memset(self.array, 0, ctypes.sizeof(self.array))
+
+    def new_search(self):
+        self.generation += 1
+
+    def _read(self, index):
+        array = self.array
+        i = index * SHARED_SLOT_WORDS
+        meta = array[i + 1]
+        if not meta:
+            return None, None
+        score_bits = array[i + 2]
+        return array[i] ^ meta ^ score_bits, (meta, score_bits)
+
+    def probe(self, key, ply=0):
+        slot_key, data = self._read(key % self.size)
+        if slot_key != key:
+            return None
+
+        meta, score_bits = data
+        score = struct.unpack("<d", struct.pack("<Q", score_bits))[0]
+        return TTEntry(
+            key,
+            (meta & 0xff) - SHARED_DEPTH_OFFSET,
+            score_from_tt(score, ply),
+            meta >> 8 & 3,
+            meta >> 10 & 0x7fff or None,
+            meta >> 25 & 0xff)
+
+    def store(self, key, depth, score, flag, move, ply=0):
+        index = key % self.size
+        generation = self.generation & 0xff
+        score = score_to_tt(score, ply)
+
+        old_key, data = self._read(index)
+        if data is not None:
+            old_meta = data[0]
+            if old_key == key:
+                if move is None:
+                    move = old_meta >> 10 & 0x7fff
+            elif (self.replacement == REPLACE_DEPTH_PREFERRED and
+                  (old_meta >> 25 & 0xff) == generation and (old_meta & 0xff) - SHARED_DEPTH_OFFSET > depth):
+                return
+
+        # The meta word is never zero, which marks empty slots.
+        meta = (
+            (depth + SHARED_DEPTH_OFFSET) & 0xff |
+            flag << 8 |
+            (move or 0) << 10 |
+            generation << 25 |
+            1 << 33)
+        score_bits = struct.unpack("<Q", struct.pack("<d", score))[0]
+
+        i = index * SHARED_SLOT_WORDS
+        self.array[i] = key ^ meta ^ score_bits
+        self.array[i + 1] = meta
+        self.array[i + 2] = score_bits
+
+    def hashfull(self):
+        """Estimates the fill rate of the table in permill."""
+        sample = min(1000, self.size)
+        filled = sum(1 for index in range(sample) if self.array[index * SHARED_SLOT_WORDS + 1])
+        return filled * 1000 // sample
+
+    def __len__(self):
+        return sum(1 for index in range(self.size) if self.array[index * SHARED_SLOT_WORDS + 1])